@@ -0,0 +1,459 @@
+"""Offline benchmarks: manager iteration, schema parsing, number and claims parsing, and import time
+
+Every case runs without the network. Manager cases replay the cassettes recorded by the tests (with
+the cache disabled and rate limits lifted, so each round sends its requests through the whole
+session stack and parses the responses), parse cases load the fixtures the schema tests use, and
+import cases time a fresh interpreter importing the package.
+
+    python benchmarks/suite.py                  # run every case and print the results
+    python benchmarks/suite.py -k parse         # only the cases with "parse" in their name
+    python benchmarks/suite.py --save           # ... and save the results as the baseline
+    python benchmarks/suite.py --check          # exit 1 if a case got slower or bigger than the baseline
+
+Times are the best of ``--rounds`` runs, after one warm-up run, and records/s is based on them. Cases
+quicker than 50ms are repeated within each round, and the time per run is reported. Peak memory is
+measured on a separate run with tracemalloc, which would otherwise slow the timed runs down.
+``--check`` fails if any case raises, or if a case's time or peak memory grew by more than
+``--threshold`` (20% by default) over the baseline. The baseline in benchmarks/baseline.json is checked
+in as a reference, but timings depend on the machine they were recorded on - save your own with
+``--save`` before comparing.
+
+A case that raises - a cassette that doesn't match the current requests, say - is reported and the
+rest still run, so one broken case doesn't hide the others.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack
+from dataclasses import asdict
+from dataclasses import dataclass
+from pathlib import Path
+
+import vcr
+
+ROOT = Path(__file__).parent.parent
+SRC = ROOT / "src" / "patent_client"
+BASELINE = Path(__file__).parent / "baseline.json"
+# Shortest a timed round may be - quicker cases are run several times a round
+MIN_ROUND = 0.05
+# Memory growth smaller than this is noise, whatever the threshold
+MIN_MEMORY_CHANGE = 64 * 1024
+
+NUMBERS = [
+    6013599,
+    "6013599",
+    "US6013599B2",
+    "US 6,013,599 B2",
+    "20150012345",
+    "US 2015/0012345 A1",
+    "14/123,456",
+    "US 14/123,456",
+    "14123456",
+    "RE43633",
+    "USD645062",
+    "CA2967774A1",
+    "PCT/US2017/036577",
+    "PCT/US17/36577",
+    "WO2009029879",
+]
+
+
+@dataclass
+class Result:
+    name: str
+    records: int = None
+    seconds: float = None
+    peak: int = None
+    error: str = None
+
+    @property
+    def rate(self):
+        return self.records / self.seconds if self.records and self.seconds else None
+
+
+class Case:
+    """``setup()`` does any one-off work and returns the function that is timed. That function returns
+    the number of records it handled"""
+
+    def __init__(self, name, setup, rounds):
+        self.name = name
+        self.setup = setup
+        self.rounds = rounds
+
+    def measure(self, rounds=None):
+        run = self.setup()
+        start = time.perf_counter()
+        records = run()
+        # Quick cases are repeated within each round, so the timer's resolution and one-off hiccups
+        # don't dominate
+        loops = max(1, int(MIN_ROUND / max(time.perf_counter() - start, 1e-6)))
+        times = list()
+        for _ in range(rounds or self.rounds):
+            start = time.perf_counter()
+            for _ in range(loops):
+                run()
+            times.append((time.perf_counter() - start) / loops)
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return Result(self.name, records, min(times), peak)
+
+
+class ImportCase(Case):
+    """Imports ``modules`` in a fresh interpreter, so nothing is already imported"""
+
+    CHILD = """
+import json, sys, time, tracemalloc
+if sys.argv[1] == "trace":
+    tracemalloc.start()
+start = time.perf_counter()
+for module in sys.argv[2:]:
+    __import__(module)
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "peak": tracemalloc.get_traced_memory()[1]}))
+"""
+
+    def __init__(self, name, modules, rounds=5):
+        super().__init__(name, None, rounds)
+        self.modules = modules
+
+    def child(self, mode):
+        output = subprocess.run(
+            [sys.executable, "-c", self.CHILD, mode, *self.modules],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=ROOT,
+        )
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+    def measure(self, rounds=None):
+        times = [self.child("time")["seconds"] for _ in range(rounds or self.rounds)]
+        return Result(self.name, len(self.modules), min(times), self.child("trace")["peak"])
+
+
+CASES = list()
+
+
+def case(name, rounds=10):
+    def decorator(setup):
+        CASES.append(Case(name, setup, rounds))
+        return setup
+
+    return decorator
+
+
+def replay(cassette, query):
+    """Iterate over ``query()`` with the test cassette answering every request"""
+    from patent_client import session
+    from patent_client.epo.ops import session as epo_session
+    from patent_client.uspto.global_dossier import session as gd_session
+    from patent_client.uspto.ptab import session as ptab_session
+    from patent_client.uspto.public_search import public_search_api
+
+    # Spacing requests out would only measure the rate limits - including the ones OPS asks for in the
+    # throttling headers of the recorded responses
+    session.rate_limiter.limits.clear()
+    session.rate_limiter.policies.clear()
+    session.rate_limiter.buckets.clear()
+    # The Public Search cassettes were recorded with a ppubs session already open
+    public_search_api.case_id = public_search_api.case_id or "benchmark"
+    recorder = vcr.VCR(record_mode="none", filter_headers=[("Authorization", "REDACTED")])
+    path = SRC / cassette
+
+    def run():
+        with recorder.use_cassette(str(path), allow_playback_repeats=True):
+            with ExitStack() as stack:
+                for cached in (session, epo_session, gd_session, ptab_session):
+                    stack.enter_context(cached.cache_disabled())
+                return sum(1 for _ in query())
+
+    return run
+
+
+@case("manager.public_search", rounds=5)
+def public_search_manager():
+    from patent_client.uspto.public_search.model import PublicSearch
+
+    return replay(
+        "uspto/public_search/cassettes/model_test/TestPatents.test_tennis_patents.yaml",
+        lambda: PublicSearch.objects.filter(title="tennis", assignee_name="wilson"),
+    )
+
+
+@case("manager.assignment", rounds=5)
+def assignment_manager():
+    from patent_client.uspto.assignment.model import Assignment
+
+    return replay(
+        "uspto/assignment/cassettes/manager_test/TestAssignment.test_iterate_assignments.yaml",
+        lambda: Assignment.objects.filter(assignee="US Well Services"),
+    )
+
+
+@case("manager.peds", rounds=5)
+def peds_manager():
+    from patent_client.uspto.peds.model import USApplication
+
+    return replay(
+        "uspto/peds/cassettes/manager_test/TestPatentExaminationData.test_iterator.yaml",
+        lambda: USApplication.objects.filter(first_named_applicant="Tesla").limit(68),
+    )
+
+
+@case("manager.ptab", rounds=5)
+def ptab_manager():
+    from patent_client.uspto.ptab.model import PtabProceeding
+
+    return replay(
+        "uspto/ptab/cassettes/manager_test/TestPtabProceeding.test_filter_with_limit.yaml",
+        lambda: PtabProceeding.objects.filter(party_name="Apple").limit(26),
+    )
+
+
+@case("manager.epo_ops", rounds=5)
+def epo_ops_manager():
+    from patent_client.epo.ops.published.model import Inpadoc
+
+    return replay(
+        "epo/ops/published/cassettes/manager_test/TestPublished.test_inpadoc_manager.yaml",
+        lambda: Inpadoc.objects.filter(applicant="Microsoft").limit(20),
+    )
+
+
+def parse(schema, fixture, count=lambda result: 1, batch=False):
+    """Load ``fixture`` with ``schema``. ``count`` says how many records the result holds"""
+    data = (SRC / fixture).read_bytes()
+
+    def run():
+        return count(schema.load_batch(data) if batch else schema.load(data))
+
+    return run
+
+
+@case("parse.public_search.biblio")
+def public_search_biblio():
+    from patent_client.uspto.public_search.schema import PublicSearchSchema
+
+    return parse(PublicSearchSchema(), "uspto/public_search/test/biblio.json", len, batch=True)
+
+
+@case("parse.public_search.document")
+def public_search_document():
+    from patent_client.uspto.public_search.schema import PublicSearchDocumentSchema
+
+    return parse(PublicSearchDocumentSchema(), "uspto/public_search/test/docs.json", len, batch=True)
+
+
+@case("parse.assignment")
+def assignment_page():
+    from patent_client.uspto.assignment.schema import AssignmentPageSchema
+
+    return parse(AssignmentPageSchema(), "uspto/assignment/test/assignment_3.xml", lambda page: len(page.docs))
+
+
+@case("parse.global_dossier.application")
+def global_dossier_application():
+    from patent_client.uspto.global_dossier.schema import GlobalDossierSchema
+
+    return parse(GlobalDossierSchema(), "uspto/global_dossier/test/app.json")
+
+
+@case("parse.global_dossier.documents")
+def global_dossier_documents():
+    from patent_client.uspto.global_dossier.schema import DocumentListSchema
+
+    return parse(DocumentListSchema(), "uspto/global_dossier/test/doc_list.json", lambda result: len(result.docs))
+
+
+@case("parse.epo_ops.biblio")
+def epo_ops_biblio():
+    from patent_client.epo.ops.published.schema import BiblioResultSchema
+
+    return parse(
+        BiblioResultSchema(), "epo/ops/published/test/biblio_example.xml", lambda result: len(result.documents)
+    )
+
+
+@case("parse.epo_ops.search")
+def epo_ops_search():
+    from patent_client.epo.ops.published.schema import SearchSchema
+
+    return parse(SearchSchema(), "epo/ops/published/test/search_example.xml", lambda result: len(result.results))
+
+
+@case("parse.epo_ops.claims")
+def epo_ops_claims():
+    from patent_client.epo.ops.published.schema import ClaimsSchema
+
+    return parse(ClaimsSchema(), "epo/ops/published/test/claims_example.xml")
+
+
+@case("parse.epo_ops.description")
+def epo_ops_description():
+    from patent_client.epo.ops.published.schema import DescriptionSchema
+
+    return parse(DescriptionSchema(), "epo/ops/published/test/description_example.xml")
+
+
+@case("numbers")
+def numbers():
+    from patent_client.parser import parse
+
+    values = NUMBERS * 20
+
+    def run():
+        for value in values:
+            parse(value)
+        return len(values)
+
+    return run
+
+
+@case("claims")
+def claims():
+    from patent_client.util.claims.parser import ClaimsParser
+
+    texts = [path.read_text() for path in sorted((SRC / "util" / "claims" / "examples").glob("*.txt"))]
+
+    def run():
+        return sum(len(ClaimsParser().parse(text)) for text in texts)
+
+    return run
+
+
+CASES.append(ImportCase("import", ["patent_client"]))
+CASES.append(
+    ImportCase(
+        "import.models",
+        [
+            "patent_client",
+            "patent_client.uspto.peds.model",
+            "patent_client.uspto.ptab.model",
+            "patent_client.uspto.assignment.model",
+            "patent_client.uspto.public_search.model",
+            "patent_client.uspto.global_dossier.model",
+            "patent_client.epo.ops.published.model",
+        ],
+    )
+)
+
+
+def run_cases(cases, rounds=None):
+    for benchmark in cases:
+        try:
+            yield benchmark.measure(rounds)
+        except Exception as e:
+            message = str(e).splitlines()[0] if str(e) else ""
+            yield Result(benchmark.name, error=f"{type(e).__name__}: {message}"[:100])
+
+
+def change(value, baseline):
+    return value / baseline - 1 if value is not None and baseline else None
+
+
+def regressions(results, baseline, threshold, memory_threshold):
+    """Why each case is worse than the baseline, if it is"""
+    problems = list()
+    for result in results:
+        # A case that fails is a problem whether or not it already failed in the baseline
+        if result.error:
+            problems.append(f"{result.name} fails: {result.error}")
+            continue
+        before = baseline.get(result.name)
+        if before is None or before.get("error"):
+            continue
+        slower = change(result.seconds, before["seconds"])
+        if slower is not None and slower > threshold:
+            problems.append(f"{result.name} is {slower:.0%} slower ({before['seconds']:.4f}s -> {result.seconds:.4f}s)")
+        bigger = change(result.peak, before["peak"])
+        if bigger is not None and bigger > memory_threshold and result.peak - before["peak"] > MIN_MEMORY_CHANGE:
+            problems.append(
+                f"{result.name} uses {bigger:.0%} more memory ({before['peak'] // 1024}KiB -> {result.peak // 1024}KiB)"
+            )
+    return problems
+
+
+HEADER = f"{'case':<34} {'records':>8} {'best ms':>9} {'records/s':>11} {'peak KiB':>9} {'time':>7} {'memory':>7}"
+
+
+def row(result, baseline):
+    """A line of the results table. The last two columns are the change from the baseline"""
+    if result.error:
+        return f"{result.name:<34} error: {result.error}"
+    before = baseline.get(result.name) or dict()
+    slower, bigger = change(result.seconds, before.get("seconds")), change(result.peak, before.get("peak"))
+    return (
+        f"{result.name:<34} {result.records or 0:>8} {result.seconds * 1000:>9.2f} {result.rate or 0:>11.0f} "
+        f"{result.peak // 1024:>9} {f'{slower:+.0%}' if slower is not None else '':>7} "
+        f"{f'{bigger:+.0%}' if bigger is not None else '':>7}"
+    )
+
+
+def load_baseline(path):
+    if not path.exists():
+        return dict()
+    return json.loads(path.read_text())["results"]
+
+
+def save_baseline(path, results):
+    data = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "saved": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": {result.name: asdict(result) for result in results},
+    }
+    path.write_text(json.dumps(data, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", dest="keyword", help="Only run cases with this in their name")
+    parser.add_argument("--rounds", type=int, help="Timed runs per case (default: depends on the case)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE, help=f"Baseline file (default: {BASELINE})")
+    parser.add_argument("--save", action="store_true", help="Save the results as the baseline")
+    parser.add_argument(
+        "--check", action="store_true", help="Exit 1 if a case failed or regressed against the baseline"
+    )
+    parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown that counts as a regression")
+    parser.add_argument(
+        "--memory-threshold", type=float, help="Peak memory growth that counts as a regression (default: --threshold)"
+    )
+    args = parser.parse_args()
+
+    cases = [c for c in CASES if not args.keyword or args.keyword in c.name]
+    baseline = load_baseline(args.baseline)
+    results = list()
+    print(HEADER)
+    for result in run_cases(cases, args.rounds):
+        results.append(result)
+        print(row(result, baseline), flush=True)
+    failed = sum(1 for r in results if r.error)
+    print(f"\n{len(results) - failed} cases measured, {failed} failed")
+
+    if args.save:
+        # Keep the baseline for cases that weren't run this time
+        saved = {**baseline, **{r.name: asdict(r) for r in results}}
+        save_baseline(args.baseline, [Result(**r) for r in saved.values()])
+        print(f"Baseline saved to {args.baseline}")
+    if args.check:
+        if not baseline:
+            sys.exit(f"No baseline at {args.baseline} - run with --save first")
+        memory_threshold = args.threshold if args.memory_threshold is None else args.memory_threshold
+        problems = regressions(results, baseline, args.threshold, memory_threshold)
+        for problem in problems:
+            print(f"REGRESSION: {problem}")
+        if problems:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
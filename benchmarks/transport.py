@@ -0,0 +1,173 @@
+"""Concurrent small-request throughput of the HTTP/1.1 and HTTP/2 transports
+
+Runs against local stand-in servers that answer every GET with a small JSON body after a fixed
+delay, so the numbers reflect how each transport handles concurrency rather than the network.
+Sessions are plain ``requests.Session`` objects with only the adapter swapped, so rate limits and
+caching stay out of the picture.
+
+    python benchmarks/transport.py --threads 32 --requests 2000 --latency 0.02
+
+The stand-ins speak plain HTTP (HTTP/2 by prior knowledge), so TLS handshakes - what a fresh
+connection to a real API costs most - aren't measured. Connections opened are reported for that
+reason: each one would be a TLS handshake against the real host.
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import h2.config
+import h2.connection
+import h2.events
+import requests
+from requests.adapters import HTTPAdapter
+
+from patent_client.transport import HTTPXAdapter
+from patent_client.transport import PooledAdapter
+from patent_client.transport import PoolPolicies
+from patent_client.transport import PoolPolicy
+
+BODY = json.dumps({"status": "ok", "results": list(range(20))}).encode()
+
+
+class Counter:
+    def __init__(self):
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def add(self):
+        with self._lock:
+            self.connections += 1
+
+
+class Http1Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.counter.add()
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_http1(latency):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Http1Handler)
+    server.daemon_threads = True
+    server.latency, server.counter = latency, Counter()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server.counter, server.shutdown
+
+
+class Http2Protocol(asyncio.Protocol):
+    def __init__(self, latency, counter):
+        self.latency = latency
+        self.counter = counter
+        self.conn = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False))
+
+    def connection_made(self, transport):
+        self.counter.add()
+        self.transport = transport
+        self.conn.initiate_connection()
+        self.transport.write(self.conn.data_to_send())
+
+    def data_received(self, data):
+        for event in self.conn.receive_data(data):
+            if isinstance(event, h2.events.RequestReceived):
+                asyncio.get_running_loop().call_later(self.latency, self.respond, event.stream_id)
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self.transport.close()
+        self.transport.write(self.conn.data_to_send())
+
+    def respond(self, stream_id):
+        if self.transport.is_closing():
+            return
+        headers = [(":status", "200"), ("content-type", "application/json"), ("content-length", str(len(BODY)))]
+        self.conn.send_headers(stream_id, headers)
+        self.conn.send_data(stream_id, BODY, end_stream=True)
+        self.transport.write(self.conn.data_to_send())
+
+
+def serve_http2(latency):
+    counter, started = Counter(), threading.Event()
+    loop = asyncio.new_event_loop()
+    address = dict()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        server = loop.run_until_complete(
+            loop.create_server(lambda: Http2Protocol(latency, counter), "127.0.0.1", 0)
+        )
+        address["port"] = server.sockets[0].getsockname()[1]
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    started.wait()
+    return f"http://127.0.0.1:{address['port']}", counter, lambda: loop.call_soon_threadsafe(loop.stop)
+
+
+def pools(size):
+    return PoolPolicies(PoolPolicy(size=size, block=True))
+
+
+def run(adapter, url, threads, requests_per_run):
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.get(f"{url}/warmup").raise_for_status()
+
+    def fetch(i):
+        response = session.get(f"{url}/item/{i}", timeout=(10, 30))
+        response.raise_for_status()
+        return len(response.content)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(fetch, range(requests_per_run)))
+    elapsed = time.perf_counter() - start
+    session.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02, help="server-side delay per request, in seconds")
+    parser.add_argument("--pool-size", type=int, default=16)
+    args = parser.parse_args()
+
+    n = args.pool_size
+    cases = [
+        ("requests, default pool (10)", serve_http1, lambda: HTTPAdapter()),
+        (f"requests, pool of {n}", serve_http1, lambda: HTTPAdapter(pool_maxsize=n)),
+        (f"pooled, {n} blocking", serve_http1, lambda: PooledAdapter(pools(n))),
+        (f"httpx HTTP/1.1, {n} blocking", serve_http1, lambda: HTTPXAdapter(pools(n), http2=False)),
+        ("httpx HTTP/2, 1 connection", serve_http2, lambda: HTTPXAdapter(pools(1), http1=False)),
+    ]
+    print(f"{args.requests} GETs from {args.threads} threads, {args.latency * 1000:.0f}ms server latency\n")
+    print(f"{'transport':<32} {'req/s':>8} {'req/conn':>8} {'connections':>12}")
+    for name, serve, make_adapter in cases:
+        url, counter, stop = serve(args.latency)
+        try:
+            elapsed = run(make_adapter(), url, args.threads, args.requests)
+        finally:
+            stop()
+        rate = args.requests / elapsed
+        print(f"{name:<32} {rate:>8.0f} {args.requests / counter.connections:>8.1f} {counter.connections:>12}")
+
+
+if __name__ == "__main__":
+    main()
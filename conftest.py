@@ -10,6 +10,26 @@ def use_test_session():
         yield
 
 
+@pytest.fixture(autouse=True, scope="session")
+def defer_vcr_connect():
+    # urllib3 2 connects HTTPS connections before sending the request, when vcrpy can't yet tell
+    # whether the cassette has it - so with new_episodes it opens a real connection even for recorded
+    # requests. Put connecting off until the request is known: if it has to be recorded, the real
+    # connection connects itself when it's sent
+    from vcr.stubs import VCRConnection
+
+    connect = VCRConnection.connect
+
+    def deferred_connect(self, *args, **kwargs):
+        if "_vcr_request" not in self.__dict__:
+            return None
+        return connect(self, *args, **kwargs)
+
+    VCRConnection.connect = deferred_connect
+    yield
+    VCRConnection.connect = connect
+
+
 @pytest.fixture(scope="module")
 def vcr_config():
     return {
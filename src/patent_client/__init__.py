@@ -1,75 +1,132 @@
 # flake8: noqa
 # nopycln: file
-import time
-
-from .version import __version__  # noqa
-
-start = time.time()
-from pathlib import Path
-from .settings import load_settings
-
-SETTINGS = load_settings()
+"""Patent Client
 
+Importing the package does almost nothing. Settings, logging and the default session are set up,
+and the model classes below imported, the first time they're used (PEP 562), so scripts and
+serverless functions only pay for the APIs they actually call.
+"""
+import importlib
 import logging
-import logging.handlers
-
-# Revert base directory to local if there's an access problem
+import sys
+import threading
+import types
 
-BASE_DIR = Path(SETTINGS.DEFAULT.BASE_DIR).expanduser()
-try:
-    BASE_DIR.mkdir(exist_ok=True, parents=True)
-except OSError:
-    BASE_DIR = Path(__file__).parent.parent.parent / "_build"
-    BASE_DIR.mkdir(exist_ok=True, parents=True)
-    SETTINGS.DEFAULT.BASE_DIR = str(BASE_DIR)
+from .version import __version__  # noqa
 
-LOG_FILENAME = BASE_DIR / SETTINGS.DEFAULT.LOG_FILE
+# Public name -> module it's imported from on first use
+LAZY_EXPORTS = {
+    "Inpadoc": "patent_client.epo.ops.published.model",
+    "Assignment": "patent_client.uspto.assignment.model",
+    "USApplication": "patent_client.uspto.peds.model",
+    "PtabDecision": "patent_client.uspto.ptab.model",
+    "PtabDocument": "patent_client.uspto.ptab.model",
+    "PtabProceeding": "patent_client.uspto.ptab.model",
+    "GlobalDossier": "patent_client.uspto.global_dossier.model",
+    "GlobalDossierApplication": "patent_client.uspto.global_dossier.model",
+    "PublicSearch": "patent_client.uspto.public_search.model",
+    "PublicSearchDocument": "patent_client.uspto.public_search.model",
+    "Patent": "patent_client.uspto.public_search.model",
+    "PatentBiblio": "patent_client.uspto.public_search.model",
+    "PublishedApplication": "patent_client.uspto.public_search.model",
+    "PublishedApplicationBiblio": "patent_client.uspto.public_search.model",
+    "PatentClientSession": "patent_client.session",
+    "health": "patent_client.session",
+    "deadline": "patent_client.deadlines",
+    "DeadlineExceeded": "patent_client.deadlines",
+}
+# Set up by _setup()
+SETUP_NAMES = ("SETTINGS", "BASE_DIR", "LOG_FILENAME")
 
-# Set up a specific logger with our desired output level
 logger = logging.getLogger(__name__)
-logger.setLevel(SETTINGS.DEFAULT.LOG_LEVEL)
-
-
-# Add the log message handler to the logger
-handler = logging.FileHandler(LOG_FILENAME)
-handler.setFormatter(logging.Formatter("%(asctime)s:%(levelname)s:%(name)s:%(message)s"))
-logger.addHandler(handler)
-
-logger.info(f"Starting Patent Client with log level {SETTINGS.DEFAULT.LOG_LEVEL}")
-
-from .session import PatentClientSession  # isort:skip
-
-session = PatentClientSession()
-# session.remove_expired_responses(expire_after=parse_duration(SETTINGS.CACHE.MAX_AGE))
-
-# Set up yankee
-import yankee
-
-yankee.use_model = True
-
-
-from patent_client.epo.ops.published.model import Inpadoc  # isort:skip
-
-# from patent_client.usitc.model import ITCAttachment
-# from patent_client.usitc.model import ITCDocument
-# from patent_client.usitc.model import ITCInvestigation
-from patent_client.uspto.assignment.model import Assignment  # isort:skip
-from patent_client.uspto.peds.model import USApplication  # isort:skip
-from patent_client.uspto.ptab.model import PtabDecision  # isort:skip
-from patent_client.uspto.ptab.model import PtabDocument  # isort:skip
-from patent_client.uspto.ptab.model import PtabProceeding  # isort:skip
-from patent_client.uspto.global_dossier.model import GlobalDossier, GlobalDossierApplication  # isort:skip
-from patent_client.uspto.public_search.model import (
-    PublicSearch,
-    PublicSearchDocument,
-    Patent,
-    PatentBiblio,
-    PublishedApplication,
-    PublishedApplicationBiblio,
-)  # isort:skip
-
-elapsed = time.time() - start
-logger.debug(f"Startup Complete!, took {elapsed:.3f} seconds")
+_setup_lock = threading.RLock()
+_session = None
+
+
+def _setup():
+    """Load the settings, create the base directory and start logging. Runs once, before any
+    API module is imported"""
+    with _setup_lock:
+        if "SETTINGS" in globals():
+            return
+        import time
+        from pathlib import Path
+
+        import yankee
+
+        from .log import setup_logging
+        from .settings import load_settings
+        from .settings import parse_bool
+
+        start = time.time()
+        settings = load_settings()
+
+        # Revert base directory to local if there's an access problem
+        base_dir = Path(settings.DEFAULT.BASE_DIR).expanduser()
+        try:
+            base_dir.mkdir(exist_ok=True, parents=True)
+        except OSError:
+            base_dir = Path(__file__).parent.parent.parent / "_build"
+            base_dir.mkdir(exist_ok=True, parents=True)
+            settings.DEFAULT.BASE_DIR = str(base_dir)
+        log_filename = None
+        if parse_bool(settings.DEFAULT.get("LOG_TO_FILE", True)) and settings.DEFAULT.get("LOG_FILE"):
+            log_filename = base_dir / settings.DEFAULT.LOG_FILE
+
+        # Set up a specific logger with our desired output level. The file is written from a background thread
+        setup_logging(logger, settings.DEFAULT.LOG_LEVEL, log_filename, settings.DEFAULT.get("LOG_FORMAT") or "text")
+        logger.info("Starting Patent Client with log level %s", settings.DEFAULT.LOG_LEVEL)
+
+        # Schemas check this when they're built, so it has to be set before any of them are imported
+        yankee.use_model = True
+
+        globals().update(SETTINGS=settings, BASE_DIR=base_dir, LOG_FILENAME=log_filename)
+        logger.debug("Startup Complete!, took %.3f seconds", time.time() - start)
+
+
+def _default_session():
+    global _session
+    with _setup_lock:
+        if _session is None:
+            _setup()
+            from .session import PatentClientSession
+
+            _session = PatentClientSession()
+        return _session
+
+
+def __getattr__(name):
+    if name in SETUP_NAMES:
+        _setup()
+        return globals()[name]
+    if name in LAZY_EXPORTS:
+        _setup()
+        value = getattr(importlib.import_module(LAZY_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted({*globals(), *LAZY_EXPORTS, *SETUP_NAMES, "session"})
+
+
+class PatentClientModule(types.ModuleType):
+    @property
+    def session(self):
+        """The session shared by the USPTO APIs, created on first use"""
+        return _default_session()
+
+    @session.setter
+    def session(self, value):
+        # The import system sets the patent_client.session module here the first time it's
+        # imported, which would hide the session
+        global _session
+        if not isinstance(value, types.ModuleType):
+            _session = value
+
+
+sys.modules[__name__].__class__ = PatentClientModule
 
 __all__ = [
     "Inpadoc",
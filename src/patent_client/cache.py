@@ -0,0 +1,468 @@
+"""SQLite cache backend used by all patent_client sessions.
+
+This extends the stock requests_cache SQLite backend with an access log that
+lives alongside the cached responses. The access log makes it possible to:
+
+- keep the cache under a maximum size by evicting the least recently (LRU) or
+  least frequently (LFU) used responses,
+- sweep expired responses out of the database in small batches on a
+  background thread, so request threads never pay for a full scan. Responses
+  are kept for ``stale_ttl`` seconds past expiry so they can still be served
+  stale or revalidated with a conditional request, and
+- compact the database file while the client is running (``vacuum``), and
+- report how many responses each source has cached, how big and how old they
+  are (``cache_stats``), without writing to the database.
+
+Access times are buffered in memory and written by the sweeper, so a cache hit
+costs a dictionary update rather than an SQLite write.
+"""
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime
+from datetime import timezone
+from pathlib import Path
+
+from requests.structures import CaseInsensitiveDict
+from requests_cache.backends.sqlite import SQLITE_MAX_VARIABLE_NUMBER
+from requests_cache.backends.sqlite import SQLiteCache
+from requests_cache.models import CachedRequest
+from requests_cache.models import CachedResponse
+
+from patent_client.metrics import source
+
+logger = logging.getLogger(__name__)
+
+SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3, "TB": 1024**4}
+SIZE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?B?)\s*$", re.IGNORECASE)
+
+# After evicting for size, bring the cache down to this fraction of the maximum
+# so that eviction doesn't run again on the very next write
+LOW_WATER_MARK = 0.9
+
+# Upper bounds (in seconds) and labels of the age buckets cached responses are counted in
+AGE_BUCKETS = ((3600, "<1h"), (86400, "<1d"), (7 * 86400, "<7d"), (30 * 86400, "<30d"), (None, ">=30d"))
+
+# Headers kept with the in-memory copies of "not found" responses
+NEGATIVE_HEADERS = ("Content-Type", "Date", "ETag", "Last-Modified")
+
+
+def parse_size(value):
+    """Convert a size setting (e.g. 2048, "500MB", "2 GB") to bytes. Empty values mean "no limit" """
+    if value in (None, "", 0, "0"):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = SIZE_RE.match(str(value))
+    if not match:
+        raise ValueError(f"{value} is not a valid cache size! Try something like '500MB' or '2 GB'")
+    number, unit = match.groups()
+    unit = unit.upper() or "B"
+    if not unit.endswith("B"):
+        unit += "B"
+    return int(float(number) * SIZE_UNITS[unit])
+
+
+def to_timestamp(value):
+    """Convert a naive UTC datetime (as used by requests_cache) to a POSIX timestamp"""
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def chunks(items, size=SQLITE_MAX_VARIABLE_NUMBER):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def cache_stats(path, now=None):
+    """Cached responses per source: how many there are, their size in bytes, how many have expired,
+    how often they've been served, and how many fall into each of the AGE_BUCKETS
+
+    The database is opened read-only and only queried, so this is safe to run against a cache
+    another process is using. Responses the access log doesn't know the source and age of yet
+    (they're filled in by the sweeper) are only counted, as ``untracked``.
+    """
+    stats = {"sources": dict(), "untracked": 0}
+    path = Path(path)
+    if not path.exists():
+        return stats
+    now = time.time() if now is None else now
+    with closing(sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True, timeout=30)) as con:
+        tables = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "responses" not in tables:
+            return stats
+        columns = {row[1] for row in con.execute("PRAGMA table_info(cache_access)")}
+        if not {"source", "created"} <= columns:
+            stats["untracked"] = con.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return stats
+        stats["untracked"] = con.execute(
+            """SELECT COUNT(*) FROM responses r LEFT JOIN cache_access a ON a.key = r.key
+            WHERE a.key IS NULL OR a.created IS NULL"""
+        ).fetchone()[0]
+        cases = " ".join(f"WHEN created >= {now - bound!r} THEN {i}" for i, (bound, _) in enumerate(AGE_BUCKETS[:-1]))
+        rows = con.execute(
+            f"""SELECT source, CASE {cases} ELSE {len(AGE_BUCKETS) - 1} END AS age, COUNT(*),
+            COALESCE(SUM(size), 0), SUM(expires IS NOT NULL AND expires < ?), SUM(hits)
+            FROM cache_access WHERE created IS NOT NULL GROUP BY source, age""",
+            (now,),
+        ).fetchall()
+    for name, age, entries, size, expired, hits in rows:
+        totals = stats["sources"].setdefault(
+            name or "unknown",
+            {"entries": 0, "bytes": 0, "expired": 0, "hits": 0, "ages": {label: 0 for _, label in AGE_BUCKETS}},
+        )
+        totals["entries"] += entries
+        totals["bytes"] += size
+        totals["expired"] += expired
+        totals["hits"] += hits
+        totals["ages"][AGE_BUCKETS[age][1]] += entries
+    return stats
+
+
+class PatentClientCache(SQLiteCache):
+    eviction_policies = {
+        "LRU": "last_access ASC",
+        "LFU": "hits ASC, last_access ASC",
+    }
+
+    def __init__(
+        self, db_path, max_size=None, eviction="LRU", sweep_interval=300, sweep_batch=500, stale_ttl=0, **kwargs
+    ):
+        kwargs.setdefault("timeout", 30)
+        super().__init__(db_path, **kwargs)
+        self.max_size = parse_size(max_size)
+        self.eviction = str(eviction).upper()
+        if self.eviction not in self.eviction_policies:
+            raise ValueError(f"Eviction policy must be one of {list(self.eviction_policies)}, not {eviction}")
+        self.sweep_interval = float(sweep_interval or 0)
+        self.sweep_batch = int(sweep_batch)
+        self.stale_ttl = float(stale_ttl or 0)
+
+        self._pending = dict()
+        self._pending_lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+        self._sweeper = None
+        self._stop = threading.Event()
+        self.init_access_log()
+
+    def init_access_log(self):
+        with self.responses.connection(commit=True) as con:
+            con.execute(
+                """CREATE TABLE IF NOT EXISTS cache_access (
+                key TEXT PRIMARY KEY,
+                last_access REAL,
+                hits INTEGER DEFAULT 0,
+                expires REAL,
+                size INTEGER,
+                source TEXT,
+                created REAL)"""
+            )
+            # Access logs from before source and created were kept get the columns, and are filled in by the sweeper
+            columns = {row[1] for row in con.execute("PRAGMA table_info(cache_access)")}
+            for column, kind in (("source", "TEXT"), ("created", "REAL")):
+                if column not in columns:
+                    con.execute(f"ALTER TABLE cache_access ADD COLUMN {column} {kind}")
+            con.execute("CREATE INDEX IF NOT EXISTS cache_access_expires ON cache_access (expires)")
+            con.execute("CREATE INDEX IF NOT EXISTS cache_access_last_access ON cache_access (last_access)")
+
+    # Request-path hooks - these only touch memory
+
+    def get_response(self, key, default=None):
+        response = super().get_response(key, default=default)
+        if response is not default:
+            self._record(key)
+        return response
+
+    def save_response(self, response, cache_key=None, expires=None):
+        cache_key = cache_key or self.create_key(response.request)
+        super().save_response(response, cache_key, expires)
+        self._record(cache_key, saved=True, expires=to_timestamp(expires), url=response.url)
+        self.start_sweeper()
+
+    def _record(self, key, saved=False, expires=None, url=None):
+        with self._pending_lock:
+            entry = self._pending.setdefault(key, {"saved": False, "hits": 0, "expires": None})
+            entry["last_access"] = time.time()
+            if saved:
+                entry["saved"] = True
+                entry["expires"] = expires
+                entry["source"] = source(url)
+                entry["created"] = entry["last_access"]
+            else:
+                entry["hits"] += 1
+
+    # Maintenance - run on the sweeper thread, or manually
+
+    def start_sweeper(self):
+        if self.sweep_interval <= 0 or (self._sweeper is not None and self._sweeper.is_alive()):
+            return
+        self._stop.clear()
+        self._sweeper = threading.Thread(target=self._run_sweeper, name="patent-client-cache-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+            self._sweeper = None
+
+    def _run_sweeper(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Cache sweep failed")
+
+    def sweep(self):
+        """Run one incremental maintenance pass over the cache
+
+        Flushes buffered access times, indexes up to ``sweep_batch`` responses that
+        predate the access log, removes up to ``sweep_batch`` expired responses, and
+        evicts responses until the cache is under ``max_size``.
+        Returns the number of responses removed.
+        """
+        with self._sweep_lock:
+            self.flush()
+            self._index_untracked()
+            removed = self._remove_expired()
+            removed += self._evict()
+        return removed
+
+    def flush(self):
+        with self._pending_lock:
+            pending, self._pending = self._pending, dict()
+        if not pending:
+            return
+        with self.responses.connection(commit=True) as con:
+            for key, entry in pending.items():
+                if entry["saved"]:
+                    con.execute(
+                        """INSERT INTO cache_access (key, last_access, hits, expires, size, source, created)
+                        VALUES (?, ?, ?, ?, (SELECT length(value) FROM responses WHERE key = ?), ?, ?)
+                        ON CONFLICT(key) DO UPDATE SET
+                            last_access = excluded.last_access,
+                            hits = hits + excluded.hits,
+                            expires = excluded.expires,
+                            size = excluded.size,
+                            source = excluded.source,
+                            created = excluded.created""",
+                        (
+                            key,
+                            entry["last_access"],
+                            entry["hits"],
+                            entry["expires"],
+                            key,
+                            entry["source"],
+                            entry["created"],
+                        ),
+                    )
+                else:
+                    con.execute(
+                        "UPDATE cache_access SET last_access = ?, hits = hits + ? WHERE key = ?",
+                        (entry["last_access"], entry["hits"], key),
+                    )
+
+    def _index_untracked(self):
+        """Add access log rows for responses written before the access log existed, and fill in the
+        source and creation time of rows written before those were kept. Returns the number of
+        responses looked at"""
+        with self.responses.connection() as con:
+            rows = con.execute(
+                """SELECT r.key, length(r.value) FROM responses r
+                LEFT JOIN cache_access a ON a.key = r.key
+                WHERE a.key IS NULL OR a.created IS NULL LIMIT ?""",
+                (self.sweep_batch,),
+            ).fetchall()
+        if not rows:
+            return 0
+        records, unreadable = list(), list()
+        for key, size in rows:
+            response = super().get_response(key)
+            if response is None:
+                unreadable.append(key)
+                continue
+            created = to_timestamp(response.created_at) or 0.0
+            records.append((key, created, to_timestamp(response.expires), size, source(response.url), created))
+        with self.responses.connection(commit=True) as con:
+            con.executemany(
+                """INSERT INTO cache_access (key, last_access, hits, expires, size, source, created)
+                VALUES (?, ?, 0, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET source = excluded.source, created = excluded.created""",
+                records,
+            )
+        self.delete_keys(unreadable)
+        logger.debug("Indexed %s untracked cache entries, dropped %s unreadable", len(records), len(unreadable))
+        return len(rows)
+
+    def _remove_expired(self):
+        with self.responses.connection() as con:
+            keys = [
+                row[0]
+                for row in con.execute(
+                    "SELECT key FROM cache_access WHERE expires IS NOT NULL AND expires < ? LIMIT ?",
+                    (time.time() - self.stale_ttl, self.sweep_batch),
+                )
+            ]
+        self.delete_keys(keys)
+        if keys:
+            logger.debug("Removed %s expired cache entries", len(keys))
+        return len(keys)
+
+    def _evict(self):
+        if not self.max_size:
+            return 0
+        total = self.total_size()
+        if total <= self.max_size:
+            return 0
+        target = self.max_size * LOW_WATER_MARK
+        order = self.eviction_policies[self.eviction]
+        victims = list()
+        with self.responses.connection() as con:
+            for key, size in con.execute(f"SELECT key, size FROM cache_access ORDER BY {order}"):
+                if total <= target:
+                    break
+                victims.append(key)
+                total -= size or 0
+        self.delete_keys(victims)
+        logger.info(
+            "Evicted %s cache entries (%s) to stay under %s bytes", len(victims), self.eviction, self.max_size
+        )
+        return len(victims)
+
+    def delete_keys(self, keys):
+        """Delete responses, their access log rows, and any redirects pointing at them"""
+        keys = list(keys)
+        if not keys:
+            return
+        with self.responses.connection(commit=True) as con:
+            for chunk in chunks(keys):
+                marks = ",".join("?" * len(chunk))
+                con.execute(f"DELETE FROM responses WHERE key IN ({marks})", chunk)
+                con.execute(f"DELETE FROM cache_access WHERE key IN ({marks})", chunk)
+        self.redirects.bulk_delete(values=keys)
+
+    def total_size(self):
+        """Total size of all tracked responses, in bytes"""
+        with self.responses.connection() as con:
+            return con.execute("SELECT COALESCE(SUM(size), 0) FROM cache_access").fetchone()[0]
+
+    def stats(self, now=None):
+        """``cache_stats`` for this cache. Accesses still buffered in memory show up after the next sweep"""
+        return cache_stats(self.db_path, now)
+
+    def vacuum(self):
+        """Compact the cache database file. Returns the number of bytes reclaimed
+
+        The cache remains usable while this runs, although writes from other threads
+        will wait on the SQLite lock until it finishes.
+        """
+        self.sweep()
+        path = Path(self.db_path)
+        before = path.stat().st_size if path.exists() else 0
+        with self._sweep_lock, self.responses.connection() as con:
+            con.execute("VACUUM")
+        after = path.stat().st_size if path.exists() else 0
+        logger.info("Vacuumed cache at %s, reclaimed %s bytes", path, before - after)
+        return before - after
+
+    def clear(self):
+        with self._pending_lock:
+            self._pending = dict()
+        super().clear()
+        self.init_access_log()
+        with self.responses.connection(commit=True) as con:
+            con.execute("DELETE FROM cache_access")
+
+
+@dataclass(frozen=True)
+class NegativeEntry:
+    """What ``NegativeCache`` keeps of a "not found" response"""
+
+    url: str
+    status_code: int
+    reason: str
+    encoding: str
+    headers: tuple
+    content: bytes
+    created_at: datetime
+    expires: datetime
+
+
+class NegativeCache:
+    """In-memory copies of responses known to be "not found"
+
+    Negative responses (404s and empty search results) are stored in SQLite like any
+    other response, but with a short expiration. This also keeps a compact copy of the
+    most recent ones - status, a few headers, body and expiration - in a bounded map keyed
+    by cache key, so repeated lookups of dead numbers are answered without a database read.
+    Every hit gets a new response built from the copy.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, request=None):
+        """A new response for ``key``, or None if it isn't known to be missing (or has expired)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires is not None and entry.expires <= datetime.utcnow():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        response = CachedResponse(
+            content=entry.content,
+            url=entry.url,
+            status_code=entry.status_code,
+            reason=entry.reason,
+            encoding=entry.encoding,
+            headers=CaseInsensitiveDict(entry.headers),
+            created_at=entry.created_at,
+            expires=entry.expires,
+        )
+        response.cache_key = key
+        if request is not None:
+            response.request = CachedRequest.from_request(request)
+        return response
+
+    def add(self, key, response, expires):
+        """Remember ``response`` as missing until ``expires`` - a naive UTC datetime, as used by requests_cache"""
+        entry = NegativeEntry(
+            url=response.url,
+            status_code=response.status_code,
+            reason=response.reason,
+            encoding=response.encoding,
+            headers=tuple((name, response.headers[name]) for name in NEGATIVE_HEADERS if name in response.headers),
+            content=response.content,
+            created_at=getattr(response, "created_at", None) or datetime.utcnow(),
+            expires=expires,
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._entries)
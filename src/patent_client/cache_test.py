@@ -0,0 +1,150 @@
+import datetime as dt
+import sqlite3
+import time
+
+import pytest
+from patent_client.util.test import make_response
+
+from .cache import PatentClientCache
+from .cache import cache_stats
+from .cache import parse_size
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = PatentClientCache(tmp_path / "cache.sqlite", max_size="20KB", sweep_interval=0)
+    yield cache
+    cache.stop_sweeper()
+
+
+def fill(cache, n, size=1000, expires=None):
+    keys = list()
+    for i in range(n):
+        key = f"key-{i}"
+        cache.save_response(make_response(url=f"https://example.com/{i}", content=b"x" * size), key, expires)
+        keys.append(key)
+        time.sleep(0.001)
+    return keys
+
+
+def test_parse_size():
+    assert parse_size(None) is None
+    assert parse_size("") is None
+    assert parse_size(2048) == 2048
+    assert parse_size("500MB") == 500 * 1024**2
+    assert parse_size("2 GB") == 2 * 1024**3
+    assert parse_size("1.5k") == 1536
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+
+def test_lru_eviction(cache):
+    keys = fill(cache, 30)
+    cache.get_response(keys[0])
+    cache.sweep()
+    assert cache.total_size() <= cache.max_size
+    assert cache.get_response(keys[0]) is not None
+    assert cache.get_response(keys[1]) is None
+    assert cache.get_response(keys[-1]) is not None
+
+
+def test_lfu_eviction(tmp_path):
+    cache = PatentClientCache(tmp_path / "cache.sqlite", max_size="20KB", eviction="LFU", sweep_interval=0)
+    keys = fill(cache, 30)
+    for key in keys[5:]:
+        cache.get_response(key)
+    cache.get_response(keys[0])
+    cache.sweep()
+    assert cache.total_size() <= cache.max_size
+    assert cache.get_response(keys[1]) is None
+    assert cache.get_response(keys[-1]) is not None
+
+
+def test_expired_entries_are_swept(cache):
+    expired = fill(cache, 3, expires=dt.datetime.utcnow() - dt.timedelta(seconds=1))
+    cache.save_response(make_response(url="https://example.com/fresh"), "fresh", None)
+    assert cache.sweep() == 3
+    assert all(cache.get_response(k) is None for k in expired)
+    assert cache.get_response("fresh") is not None
+
+
+def test_untracked_entries_are_indexed(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    cache = PatentClientCache(path, sweep_interval=0)
+    old = make_response(url="https://example.com/old")
+    super(PatentClientCache, cache).save_response(old, "old", dt.datetime.utcnow() - dt.timedelta(days=1))
+    assert cache.total_size() == 0
+    assert cache.sweep() == 1
+    assert cache.get_response("old") is None
+
+
+def test_vacuum(cache):
+    keys = fill(cache, 15)
+    cache.sweep()
+    cache.delete_keys(keys)
+    assert cache.vacuum() > 0
+
+
+def test_background_sweeper(tmp_path):
+    cache = PatentClientCache(tmp_path / "cache.sqlite", sweep_interval=0.05)
+    fill(cache, 2, expires=dt.datetime.utcnow() - dt.timedelta(seconds=1))
+    time.sleep(0.3)
+    cache.stop_sweeper()
+    assert len(cache.responses) == 0
+
+
+def test_stats_by_source_and_age(tmp_path):
+    cache = PatentClientCache(tmp_path / "cache.sqlite", sweep_interval=0)
+    cache.save_response(make_response(url="https://ped.uspto.gov/api/queries", content=b"x" * 100), "peds-1", None)
+    cache.save_response(make_response(url="https://ped.uspto.gov/api/queries?q=2", content=b"x" * 200), "peds-2", None)
+    expired = dt.datetime.utcnow() - dt.timedelta(seconds=1)
+    cache.save_response(make_response(url="https://ops.epo.org/3.2/rest-services", content=b"x" * 300), "ops", expired)
+    cache.get_response("peds-1")
+    cache.flush()
+    # Written before the access log kept sources and ages
+    legacy = make_response(url="https://assignment-api.uspto.gov/patent/lookup")
+    super(PatentClientCache, cache).save_response(legacy, "legacy", None)
+    stats = cache.stats(now=time.time() + 2 * 86400)
+    assert set(stats["sources"]) == {"peds", "epo_ops"}
+    assert stats["untracked"] == 1
+    peds = stats["sources"]["peds"]
+    assert (peds["entries"], peds["expired"], peds["hits"]) == (2, 0, 1)
+    assert peds["bytes"] > 300
+    assert peds["ages"] == {"<1h": 0, "<1d": 0, "<7d": 2, "<30d": 0, ">=30d": 0}
+    assert (stats["sources"]["epo_ops"]["entries"], stats["sources"]["epo_ops"]["expired"]) == (1, 1)
+    cache.sweep()
+    stats = cache.stats(now=time.time() + 2 * 86400)
+    assert (stats["sources"]["assignment"]["ages"]["<7d"], stats["untracked"]) == (1, 0)
+
+
+def test_stats_do_not_write(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    cache = PatentClientCache(path, sweep_interval=0)
+    cache.save_response(make_response(url="https://ped.uspto.gov/api/queries"), "peds", None)
+    cache.flush()
+    legacy = make_response(url="https://ped.uspto.gov/api/queries?q=2")
+    super(PatentClientCache, cache).save_response(legacy, "legacy", None)
+    with sqlite3.connect(path) as con:
+        con.execute("DROP TABLE cache_access")
+    before = path.read_bytes()
+    assert cache_stats(path) == {"sources": dict(), "untracked": 2}
+    assert path.read_bytes() == before
+    assert cache_stats(tmp_path / "missing.sqlite") == {"sources": dict(), "untracked": 0}
+    assert not (tmp_path / "missing.sqlite").exists()
+
+
+def test_old_access_log_is_upgraded(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    with sqlite3.connect(path) as con:
+        con.execute(
+            """CREATE TABLE cache_access (
+            key TEXT PRIMARY KEY, last_access REAL, hits INTEGER DEFAULT 0, expires REAL, size INTEGER)"""
+        )
+        con.execute("INSERT INTO cache_access VALUES ('old', 0, 3, NULL, 10)")
+    cache = PatentClientCache(path, sweep_interval=0)
+    super(PatentClientCache, cache).save_response(make_response(url="https://ped.uspto.gov/api/queries"), "old", None)
+    assert cache.stats() == {"sources": dict(), "untracked": 1}
+    cache.sweep()
+    stats = cache.stats()
+    assert list(stats["sources"]) == ["peds"]
+    assert (stats["sources"]["peds"]["hits"], stats["sources"]["peds"]["ages"]["<1h"]) == (3, 1)
@@ -0,0 +1,148 @@
+import datetime
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request to a host that is failing"""
+
+    def __init__(self, host, retry_in):
+        self.host = host
+        self.retry_in = retry_in
+        super().__init__(f"{host} is failing - not sending requests to it for another {retry_in:.0f}s")
+
+
+class CircuitBreaker:
+    """Stops sending requests to a host after ``failure_threshold`` consecutive failures
+
+    Once open, requests fail immediately with CircuitOpenError. After ``reset_timeout`` seconds a
+    single trial request is let through (half-open). If it succeeds the circuit closes; if it fails
+    the circuit opens again and the wait doubles, up to ``max_reset_timeout``.
+    """
+
+    def __init__(self, host, failure_threshold=5, reset_timeout=30, max_reset_timeout=600):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self.last_failure = None
+        self.last_success = None
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            retry_in = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == OPEN and retry_in <= 0:
+                logger.info("Sending a trial request to %s", self.host)
+                self.state = HALF_OPEN
+                return
+            raise CircuitOpenError(self.host, max(retry_in, 0))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("%s has recovered", self.host)
+            self.state = CLOSED
+            self.failures = 0
+            self.reset_timeout = self.base_reset_timeout
+            self.last_success = datetime.datetime.now()
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            self.last_failure = datetime.datetime.now()
+            if self.state == HALF_OPEN:
+                self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+            elif self.failures < self.failure_threshold:
+                return
+            logger.warning("%s is failing (%s) - pausing requests for %ss", self.host, error, self.reset_timeout)
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def abandon_trial(self):
+        """The trial request ended without telling us anything - let the next request try again"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = OPEN
+                self.opened_at = time.monotonic() - self.reset_timeout
+
+    def status(self):
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = max(self.opened_at + self.reset_timeout - time.monotonic(), 0)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "retry_in": retry_in,
+                "last_error": self.last_error,
+                "last_failure": self.last_failure,
+                "last_success": self.last_success,
+            }
+
+
+class CircuitBreakers:
+    """One CircuitBreaker per host, shared by every session"""
+
+    def __init__(self, hosts=tuple(), **settings):
+        self.settings = settings
+        self.breakers = {host: CircuitBreaker(host, **settings) for host in hosts}
+        self._lock = threading.Lock()
+
+    def get(self, host):
+        with self._lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(host, **self.settings)
+            return self.breakers[host]
+
+    @contextmanager
+    def guard(self, url, ignore=tuple()):
+        """Raise CircuitOpenError if the host is failing, otherwise run the block. Call
+        ``guard.record(response)`` so that 5xx responses count as failures. Exceptions in
+        ``ignore`` aren't the host's fault, and don't count"""
+        breaker = self.get(urlparse(str(url)).hostname)
+        breaker.before_request()
+        outcome = Outcome()
+        try:
+            yield outcome
+        except ignore:
+            breaker.abandon_trial()
+            raise
+        except Exception as e:
+            breaker.record_failure(e)
+            raise
+        if outcome.error is None:
+            breaker.record_success()
+        else:
+            breaker.record_failure(outcome.error)
+
+    def health(self):
+        with self._lock:
+            breakers = list(self.breakers.values())
+        return {breaker.host: breaker.status() for breaker in breakers}
+
+
+class Outcome:
+    def __init__(self):
+        self.error = None
+
+    def record(self, response):
+        if response.status_code >= 500:
+            self.error = f"HTTP {response.status_code}"
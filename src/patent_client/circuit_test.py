@@ -0,0 +1,59 @@
+import time
+
+import pytest
+from patent_client.util.test import make_response
+
+from .circuit import CLOSED
+from .circuit import HALF_OPEN
+from .circuit import OPEN
+from .circuit import CircuitBreakers
+from .circuit import CircuitOpenError
+
+
+def call(breakers, status=200, error=None):
+    with breakers.guard("https://example.com/a") as guard:
+        if error is not None:
+            raise error
+        guard.record(make_response(status))
+
+
+@pytest.fixture
+def breakers():
+    return CircuitBreakers(["example.com"], failure_threshold=3, reset_timeout=0.1, max_reset_timeout=1)
+
+
+def test_opens_after_consecutive_failures(breakers):
+    call(breakers, 500)
+    call(breakers, 200)
+    call(breakers, 500)
+    with pytest.raises(ConnectionError):
+        call(breakers, error=ConnectionError("refused"))
+    assert breakers.health()["example.com"]["state"] == CLOSED
+    call(breakers, 503)
+    assert breakers.health()["example.com"]["state"] == OPEN
+    with pytest.raises(CircuitOpenError):
+        call(breakers, 200)
+
+
+def test_client_errors_are_not_failures(breakers):
+    for _ in range(5):
+        call(breakers, 404)
+    assert breakers.health()["example.com"]["consecutive_failures"] == 0
+
+
+def test_half_opens_on_a_schedule(breakers):
+    for _ in range(3):
+        call(breakers, 500)
+    time.sleep(0.15)
+    breaker = breakers.get("example.com")
+    breaker.before_request()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    breaker.record_failure("HTTP 500")
+    assert breaker.state == OPEN and breaker.reset_timeout == 0.2
+    time.sleep(0.25)
+    call(breakers, 200)
+    status = breakers.health()["example.com"]
+    assert status["state"] == CLOSED and status["consecutive_failures"] == 0
+    assert breaker.reset_timeout == 0.1
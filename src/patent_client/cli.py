@@ -0,0 +1,43 @@
+"""The ``patent-client`` command
+
+    patent-client stats                     # cache size and request statistics, by source
+    patent-client stats --json              # the same, as JSON
+    patent-client stats --since "1 day"     # only requests made in the last day
+"""
+import argparse
+import json
+import time
+
+from patent_client.settings import parse_duration
+
+
+def stats(args):
+    from patent_client.stats import collect
+    from patent_client.stats import format_report
+
+    since = time.time() - parse_duration(args.since).total_seconds() if args.since else None
+    report = collect(args.cache, args.store, since)
+    print(json.dumps(report, indent=2) if args.json else format_report(report, args.top))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="patent-client", description="Patent Client tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser(
+        "stats",
+        help="cache size and request statistics, by source",
+        description="Report the cache's entries, size and age, and request counts, hit ratios and latency "
+        "percentiles from the metrics store (METRICS.STORE), for each source",
+    )
+    command.add_argument("--json", action="store_true", help="print the report as JSON")
+    command.add_argument("--since", help='only count requests made this long ago or later, e.g. "1 day" or "6 hours"')
+    command.add_argument("--top", type=int, default=10, help="how many of the slowest endpoints to list")
+    command.add_argument("--cache", help="cache file to read (default: CACHE.PATH under BASE_DIR)")
+    command.add_argument("--store", help="metrics store to read (default: METRICS.STORE under BASE_DIR)")
+    command.set_defaults(handler=stats)
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import json
+import time
+
+from .cli import main
+from .metrics import MetricsStore
+from .metrics import RequestEvent
+
+
+def test_stats_as_json(tmp_path, capsys):
+    store = MetricsStore(tmp_path / "metrics.sqlite")
+    event = RequestEvent("GET", "https://ped.uspto.gov/api/queries", "peds", "ped.uspto.gov/api/queries", 200, "hit")
+    event.started = time.time()
+    store(event)
+    store.flush()
+    main(["stats", "--json", "--since", "1 hour", "--cache", str(tmp_path / "none.sqlite"), "--store", str(store.path)])
+    report = json.loads(capsys.readouterr().out)
+    assert report["cache"]["sources"] == dict()
+    assert report["requests"]["sources"]["peds"]["hit_ratio"] == 1.0
@@ -0,0 +1,60 @@
+import threading
+from collections import Counter
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls that share a key into one call
+
+    The first thread to ask for a key (the leader) runs the function. Any thread that
+    asks for the same key while the leader is still running waits for it and gets the
+    leader's result - or its exception - instead of running the function again.
+
+    ``stats`` counts ``calls`` (functions actually run) and ``saved`` (calls avoided).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = dict()
+        self.stats = Counter(calls=0, saved=0)
+
+    def do(self, key, func, *args, wait_timeout=None, **kwargs):
+        """Run ``func(*args, **kwargs)`` unless a call for ``key`` is in flight.
+        Returns a tuple of (result, shared), where shared is True for waiters.
+        Waiters raise TimeoutError if the leader takes more than ``wait_timeout`` seconds"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(wait_timeout):
+                raise TimeoutError(f"Gave up waiting for a concurrent call after {wait_timeout:.1f}s")
+            with self._lock:
+                self.stats["saved"] += 1
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self.stats["calls"] += 1
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,58 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from .coalesce import SingleFlight
+
+
+def test_concurrent_calls_are_coalesced():
+    flight = SingleFlight()
+    calls = list()
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(flight.do, "key", fetch) for _ in range(8)]
+        while not calls:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert len(calls) == 1
+    assert all(r == "result" for r, _ in results)
+    assert sum(shared for _, shared in results) == 7
+    assert flight.stats == {"calls": 1, "saved": 7}
+
+
+def test_errors_are_shared():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "key", fail)
+        time.sleep(0.05)
+        waiter = pool.submit(flight.do, "key", fail)
+        time.sleep(0.05)
+        release.set()
+        for future in (leader, waiter):
+            with pytest.raises(ValueError):
+                future.result()
+    assert flight.in_flight() == 0
+
+
+def test_sequential_calls_are_not_coalesced():
+    flight = SingleFlight()
+    assert flight.do("key", lambda: 1) == (1, False)
+    assert flight.do("key", lambda: 2) == (2, False)
+    assert flight.stats["saved"] == 0
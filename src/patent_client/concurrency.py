@@ -0,0 +1,109 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Responses that mean the upstream is struggling
+OVERLOAD_STATUS_CODES = (429,)
+# Weight of the newest sample in the moving average of healthy latency
+LATENCY_ALPHA = 0.1
+
+
+class AIMDLimit:
+    """Additive-increase / multiplicative-decrease limit on in-flight requests to one host
+
+    Every healthy response grows the limit by ``1 / limit``, so a full window of healthy responses
+    adds one slot. A failure - an error, a 429 / 5xx, or a response more than ``latency_tolerance``
+    times slower than the moving average - multiplies the limit by ``backoff``, at most once per
+    round trip so that one burst of failures doesn't collapse it to the minimum.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=32, backoff=0.5, latency_tolerance=3.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.latency = None
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """Block until there's a free slot. Returns the seconds spent waiting, or raises
+        TimeoutError if none frees up within ``timeout`` seconds"""
+        start = time.monotonic()
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.in_flight < int(self.limit), timeout):
+                raise TimeoutError(f"No free slot within {timeout:.1f}s ({self.in_flight} requests in flight)")
+            self.in_flight += 1
+        return time.monotonic() - start
+
+    def release(self, latency, ok=True):
+        with self._condition:
+            self.in_flight -= 1
+            spike = self.latency is not None and latency > self.latency * self.latency_tolerance
+            if ok and not spike:
+                previous = latency if self.latency is None else self.latency
+                self.latency = previous + LATENCY_ALPHA * (latency - previous)
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif time.monotonic() - self.last_decrease > (self.latency or latency):
+                self.limit = max(self.minimum, self.limit * self.backoff)
+                self.last_decrease = time.monotonic()
+            self._condition.notify_all()
+
+
+class Slot:
+    def __init__(self):
+        self.ok = True
+
+    def record(self, response):
+        status = response.status_code
+        self.ok = status not in OVERLOAD_STATUS_CODES and status < 500
+
+
+class ConcurrencyLimiter:
+    """Per-host AIMD limits on concurrent requests, shared by every session"""
+
+    def __init__(self, initial=4, minimum=1, maximum=32, backoff=0.5, latency_tolerance=3.0):
+        self.settings = dict(
+            initial=initial, minimum=minimum, maximum=maximum, backoff=backoff, latency_tolerance=latency_tolerance
+        )
+        self.hosts = dict()
+        self._lock = threading.Lock()
+
+    def get(self, host):
+        with self._lock:
+            if host not in self.hosts:
+                self.hosts[host] = AIMDLimit(**self.settings)
+            return self.hosts[host]
+
+    @contextmanager
+    def slot(self, url, timeout=None):
+        """Hold one of the host's in-flight slots. Call ``slot.record(response)`` so
+        that errors and throttled responses count against the host. Raises TimeoutError
+        if no slot frees up within ``timeout`` seconds"""
+        host = urlparse(str(url)).hostname
+        limit = self.get(host)
+        waited = limit.acquire(timeout)
+        if waited > 0.01:
+            logger.debug("Waited %.2fs for a free slot on %s (limit %d)", waited, host, limit.limit)
+        slot = Slot()
+        start = time.monotonic()
+        try:
+            yield slot
+        except Exception:
+            slot.ok = False
+            raise
+        finally:
+            limit.release(time.monotonic() - start, slot.ok)
+            if not slot.ok:
+                logger.debug("Concurrency limit for %s is now %d", host, limit.limit)
+
+    def limits(self):
+        """Current concurrency limit for every host seen so far"""
+        with self._lock:
+            return {host: int(limit.limit) for host, limit in self.hosts.items()}
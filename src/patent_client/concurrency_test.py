@@ -0,0 +1,85 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from patent_client.util.test import make_response
+
+from .concurrency import AIMDLimit
+from .concurrency import ConcurrencyLimiter
+
+
+def test_additive_increase():
+    limit = AIMDLimit(initial=2, maximum=4)
+    for _ in range(10):
+        limit.acquire()
+        limit.release(0.01)
+    assert limit.limit == 4
+
+
+def test_multiplicative_decrease_once_per_round_trip():
+    limit = AIMDLimit(initial=8)
+    limit.acquire()
+    limit.release(0.05)
+    for _ in range(3):
+        limit.acquire()
+        limit.release(0.05, ok=False)
+    assert 4 <= limit.limit < 5
+    time.sleep(0.1)
+    limit.acquire()
+    limit.release(0.05, ok=False)
+    assert 2 <= limit.limit < 3
+
+
+def test_latency_spike_counts_as_failure():
+    limit = AIMDLimit(initial=8, latency_tolerance=3)
+    limit.acquire()
+    limit.release(0.01)
+    limit.acquire()
+    limit.release(1.0)
+    assert limit.limit < 5
+
+
+def test_limits_in_flight_requests():
+    limiter = ConcurrencyLimiter(initial=2, maximum=2)
+    in_flight = list()
+    peak = list()
+    lock = threading.Lock()
+
+    def fetch():
+        with limiter.slot("https://example.com/a") as slot:
+            with lock:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+            time.sleep(0.05)
+            with lock:
+                in_flight.pop()
+            slot.record(make_response(200))
+
+    with ThreadPoolExecutor(6) as pool:
+        list(pool.map(lambda _: fetch(), range(6)))
+    assert max(peak) == 2
+    assert limiter.limits() == {"example.com": 2}
+
+
+def test_errors_cut_the_limit():
+    limiter = ConcurrencyLimiter(initial=8)
+    with limiter.slot("https://example.com/a") as slot:
+        slot.record(make_response(503))
+    assert limiter.limits()["example.com"] == 4
+    with pytest.raises(ConnectionError):
+        with limiter.slot("https://other.example.com/a"):
+            raise ConnectionError()
+    assert limiter.limits()["other.example.com"] == 4
+
+
+def test_slot_wait_times_out():
+    limiter = ConcurrencyLimiter(initial=1, maximum=1)
+    with limiter.slot("https://example.com/a"):
+        start = time.monotonic()
+        with pytest.raises(TimeoutError):
+            with limiter.slot("https://example.com/a", timeout=0.05):
+                pass
+        assert time.monotonic() - start < 0.5
+    with limiter.slot("https://example.com/a", timeout=0.05):
+        pass
@@ -0,0 +1,58 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# time.monotonic() by which the current call has to finish, or None
+_deadline = ContextVar("patent_client_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the time budget set with ``patent_client.deadline`` runs out"""
+
+    pass
+
+
+@contextmanager
+def deadline(seconds):
+    """Give everything inside the block - including nested manager calls and related-object
+    fetches - a shared time budget of ``seconds``. Requests get whatever time is left as their
+    timeout, and DeadlineExceeded is raised once it runs out. A nested deadline can shorten the
+    budget, but never extend it.
+
+    >>> with deadline(seconds=5):
+    ...     remaining() <= 5
+    True
+    """
+    expires = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(expires if current is None else min(expires, current))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left before the current deadline, or None if there is none"""
+    expires = _deadline.get()
+    return None if expires is None else expires - time.monotonic()
+
+
+def check_deadline(what="Patent Client call"):
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"{what} ran past its deadline")
+
+
+def bounded_timeout(timeout):
+    """Shrink a requests-style timeout - a number, a (connect, read) tuple or None - to the time
+    left before the deadline"""
+    left = remaining()
+    if left is None:
+        return timeout
+    left = max(left, 0.001)
+    if timeout is None:
+        return left
+    if isinstance(timeout, tuple):
+        return tuple(left if t is None else min(t, left) for t in timeout)
+    return min(timeout, left)
@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+from .deadlines import DeadlineExceeded
+from .deadlines import bounded_timeout
+from .deadlines import check_deadline
+from .deadlines import deadline
+from .deadlines import remaining
+
+
+def test_no_deadline():
+    assert remaining() is None
+    assert bounded_timeout((10, 60)) == (10, 60)
+    check_deadline()
+
+
+def test_nested_deadlines_only_shorten():
+    with deadline(seconds=5):
+        with deadline(seconds=60):
+            assert remaining() <= 5
+        with deadline(seconds=1):
+            assert remaining() <= 1
+        assert 1 < remaining() <= 5
+    assert remaining() is None
+
+
+def test_bounded_timeout():
+    with deadline(seconds=2):
+        assert bounded_timeout(None) <= 2
+        assert bounded_timeout(1) == 1
+        connect, read = bounded_timeout((1, 60))
+        assert connect == 1 and read <= 2
+
+
+def test_check_deadline():
+    with deadline(seconds=0.05):
+        check_deadline()
+        time.sleep(0.06)
+        with pytest.raises(DeadlineExceeded):
+            check_deadline()
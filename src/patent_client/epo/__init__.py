@@ -0,0 +1,4 @@
+from patent_client import _setup
+
+# Settings, logging and yankee have to be set up before any schema is built
+_setup()
@@ -1,8 +1,28 @@
-from .family.model import Family
-from .legal.model import Legal
-from .published.model import Images
-from .published.model import Inpadoc
+import importlib
+
 from .session import session
 
 __api_name__ = "EPO Open Patent Services"
+
+# Public name -> module it's imported from on first use
+LAZY_EXPORTS = {
+    "Family": "patent_client.epo.ops.family.model",
+    "Legal": "patent_client.epo.ops.legal.model",
+    "Images": "patent_client.epo.ops.published.model",
+    "Inpadoc": "patent_client.epo.ops.published.model",
+}
+
+
+def __getattr__(name):
+    if name in LAZY_EXPORTS:
+        value = getattr(importlib.import_module(LAZY_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted({*globals(), *LAZY_EXPORTS})
+
+
 __all__ = ["Family", "Legal", "Images", "Inpadoc", "session"]
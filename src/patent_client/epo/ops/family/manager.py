@@ -1,3 +1,4 @@
+from patent_client.tracing import traced
 from patent_client.util import Manager
 
 from .api import FamilyApi
@@ -7,5 +8,6 @@ from .schema import FamilySchema
 class FamilyManager(Manager):
     __schema__ = FamilySchema
 
+    @traced("manager.get")
     def get(self, doc_number):
-        return self.__schema__.load(FamilyApi.get_family(doc_number, doc_type="publication", format="docdb"))
+        return self._load(FamilyApi.get_family(doc_number, doc_type="publication", format="docdb"))
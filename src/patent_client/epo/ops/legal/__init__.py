@@ -1,3 +1 @@
 from .national_codes import generate_legal_code_db
-
-generate_legal_code_db()
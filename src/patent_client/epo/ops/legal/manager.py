@@ -1,3 +1,4 @@
+from patent_client.tracing import traced
 from patent_client.util import Manager
 
 from .api import LegalApi
@@ -7,5 +8,6 @@ from .schema import LegalSchema
 class LegalManager(Manager):
     __schema__ = LegalSchema
 
+    @traced("manager.get")
     def get(self, doc_number, doc_type="publication", format="docdb"):
-        return self.__schema__.load(LegalApi.get_legal(doc_number, doc_type, format)).events
+        return self._load(LegalApi.get_legal(doc_number, doc_type, format)).events
@@ -2,19 +2,28 @@ import datetime
 import logging
 import re
 import sqlite3
+import threading
+from functools import lru_cache
 from pathlib import Path
 
 import lxml.etree as ET
-from openpyxl import load_workbook
 from patent_client import SETTINGS
 from patent_client.epo.ops.session import session
+from patent_client.extras import optional_import
 
-dir = Path(SETTINGS.DEFAULT.BASE_DIR).expanduser() / "epo"
-dir.mkdir(exist_ok=True, parents=True)
-db_location = dir / "legal_codes.sqlite"
+logger = logging.getLogger(__name__)
 
 
-logger = logging.getLogger(__name__)
+@lru_cache(maxsize=None)
+def code_dir():
+    """Where the legal code spreadsheet and database are kept. Created on first use"""
+    path = Path(SETTINGS.DEFAULT.BASE_DIR).expanduser() / "epo"
+    path.mkdir(exist_ok=True, parents=True)
+    return path
+
+
+def db_location():
+    return code_dir() / "legal_codes.sqlite"
 
 
 def current_date():
@@ -33,7 +42,7 @@ def generate_legal_code_db():
 
 
 def has_current_spreadsheet():
-    con = sqlite3.connect(db_location, timeout=30)
+    con = sqlite3.connect(db_location(), timeout=30)
     cur = con.cursor()
     try:
         fname = cur.execute("SELECT * FROM meta").fetchone()[0]
@@ -51,12 +60,12 @@ def has_current_spreadsheet():
 
 def get_spreadsheet():
     url = "https://www.epo.org/searching-for-patents/data/coverage/weekly.html"
-    response = session.get(url)
-    response.raise_for_status()
-    tree = ET.HTML(response.text)
     try:
+        response = session.get(url)
+        response.raise_for_status()
+        tree = ET.HTML(response.text)
         excel_url = tree.xpath('.//*[contains(@href, "legal_code_descriptions")][1]/@href')[0]
-        out_path = dir / excel_url.split("/")[-1]
+        out_path = code_dir() / excel_url.split("/")[-1]
         if out_path.exists():
             return out_path
         response = session.get(excel_url, stream=True)
@@ -70,7 +79,7 @@ def get_spreadsheet():
 
 
 def create_code_database(excel_path):
-    con = sqlite3.connect(db_location, timeout=30)
+    con = sqlite3.connect(db_location(), timeout=30)
     cur = con.cursor()
     try:
         meta = cur.execute("SELECT * FROM meta").fetchone()[0]
@@ -82,7 +91,7 @@ def create_code_database(excel_path):
 
     cur.execute("CREATE TABLE IF NOT EXISTS meta (file_name text)")
     cur.execute("INSERT INTO meta values (?)", (excel_path.name,))
-    wb = load_workbook(excel_path)
+    wb = optional_import("openpyxl").load_workbook(excel_path)
     data = list(tuple(i.strip() for i in r) for r in wb[wb.sheetnames[0]].iter_rows(values_only=True))
     rows = data[1:]
     cur.execute(
@@ -104,18 +113,28 @@ def create_code_database(excel_path):
 
 
 class LegalCodes:
+    """Descriptions of legal event codes. The database is brought up to date and opened the first
+    time a code is looked up, and then shared by every thread"""
+
     def __init__(self):
-        self.connection = sqlite3.connect(db_location, timeout=30)
-        self.connection.row_factory = sqlite3.Row
+        self.connection = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        if self.connection is None:
+            generate_legal_code_db()
+            connection = sqlite3.connect(db_location(), timeout=30, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            self.connection = connection
+        return self.connection
 
     def get_code_data(self, country_code, legal_code):
-        cur = self.connection.cursor()
-        try:
-            return dict(
-                cur.execute(
-                    "SELECT * FROM legal_codes WHERE country_code = ? AND event_code = ?",
-                    (country_code, legal_code),
-                ).fetchone()
-            )
-        except TypeError:
+        with self._lock:
+            cur = self.connect().cursor()
+            row = cur.execute(
+                "SELECT * FROM legal_codes WHERE country_code = ? AND event_code = ?",
+                (country_code, legal_code),
+            ).fetchone()
+        if row is None:
             raise Exception(f"No Event Data found for {country_code} - {legal_code}")
+        return dict(row)
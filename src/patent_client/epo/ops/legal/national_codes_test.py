@@ -1,4 +1,7 @@
 import datetime
+from pathlib import Path
+
+import pytest
 
 from patent_client.epo.ops.legal import national_codes
 
@@ -11,3 +14,18 @@ def test_legal_codes():
     dt = national_codes.current_date
     national_codes.current_date = stub_date
     national_codes.current_date = dt
+
+
+def test_database_is_built_on_first_lookup(tmp_path, monkeypatch):
+    monkeypatch.setattr(national_codes, "db_location", lambda: tmp_path / "legal_codes.sqlite")
+    monkeypatch.setattr(
+        national_codes,
+        "get_spreadsheet",
+        lambda: Path(national_codes.__file__).parent / "legal_code_descriptions_20221112.xlsx",
+    )
+    codes = national_codes.LegalCodes()
+    assert codes.connection is None
+    assert not (tmp_path / "legal_codes.sqlite").exists()
+    assert codes.get_code_data("AR", "FC")["description"] == "REFUSAL"
+    with pytest.raises(Exception):
+        codes.get_code_data("AR", "ZZ")
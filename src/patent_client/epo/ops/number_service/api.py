@@ -24,7 +24,7 @@ def convert_number(number, doc_type="publication", input_format="original", outp
 
     """
     response = session.get(
-        f"http://ops.epo.org/3.2/rest-services/number-service/{doc_type}/{input_format}/{number}/{output_format}"
+        f"https://ops.epo.org/3.2/rest-services/number-service/{doc_type}/{input_format}/{number}/{output_format}"
     )
     tree = ET.fromstring(response.text.encode())
     result = NumberServiceResultSchema().load(tree)
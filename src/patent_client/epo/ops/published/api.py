@@ -18,7 +18,7 @@ class PublishedBiblioApi:
         constituents: what data to retrieve. Can be combined. (biblio / abstract / full-cycle)
 
         """
-        base_url = f"http://ops.epo.org/3.2/rest-services/published-data/{doc_type}/{format}/{number}/"
+        base_url = f"https://ops.epo.org/3.2/rest-services/published-data/{doc_type}/{format}/{number}/"
         if isinstance(constituents, str):
             constituents = (constituents,)
         url = base_url + ",".join(constituents)
@@ -53,7 +53,7 @@ class PublishedFulltextApi:
         inquiry: what data to retrieve. Can be combined. (fulltext / description / claims)
 
         """
-        url = f"http://ops.epo.org/3.2/rest-services/published-data/{doc_type}/{format}/{number}/{inquiry}"
+        url = f"https://ops.epo.org/3.2/rest-services/published-data/{doc_type}/{format}/{number}/{inquiry}"
         if number[:2] not in cls.fulltext_jurisdictions:
             raise ValueError(
                 f"Fulltext Is Not Available For Country Code {number[:2]}. Fulltext is only available in {', '.join(cls.fulltext_jurisdictions)}"
@@ -74,9 +74,9 @@ class PublishedFulltextApi:
 class PublishedSearchApi:
     @classmethod
     def search(cls, query, start=1, end=100):
-        base_url = "http://ops.epo.org/3.2/rest-services/published-data/search"
+        base_url = "https://ops.epo.org/3.2/rest-services/published-data/search"
         range = f"{start}-{end}"
-        logger.debug(f"OPS Search Endpoint - Query: {query}\nRange: {start}-{end}")
+        logger.debug("OPS Search Endpoint - Query: %s\nRange: %s-%s", query, start, end)
         response = session.get(base_url, params={"Range": range, "q": query})
         if response.status_code == 404:
             return AttrDict.convert(
@@ -95,7 +95,7 @@ class PublishedSearchApi:
 class PublishedImagesApi:
     @classmethod
     def get_images(cls, number, doc_type="publication", format="docdb"):
-        base_url = f"http://ops.epo.org/3.2/rest-services/published-data/{doc_type}/{format}/{number}/images"
+        base_url = f"https://ops.epo.org/3.2/rest-services/published-data/{doc_type}/{format}/{number}/images"
         response = session.get(base_url)
         response.raise_for_status()
         return response.text
@@ -1,3 +1,4 @@
+from patent_client.tracing import traced
 from patent_client.util import Manager
 
 from .api import PublishedApi
@@ -25,7 +26,8 @@ class SearchManager(Manager):
             query = self.config.filter["cql_query"]
         else:
             query = generate_query(**self.config.filter)
-        return self.__schema__.load(PublishedApi.search.search(query, start, end))
+        with self._page((start - 1) // self.result_size):
+            return self._load(PublishedApi.search.search(query, start, end))
 
     def __len__(self):
         page = self._get_search_results_range(1, 100)
@@ -55,8 +57,9 @@ class SearchManager(Manager):
                 min(range[1] + self.result_size, max_position),
             )
 
+    @traced("manager.get")
     def get(self, number, doc_type="publication", format="docdb"):
-        result = self.__item_schema__.load(PublishedApi.biblio.get_biblio(number, doc_type, format))
+        result = self._load(PublishedApi.biblio.get_biblio(number, doc_type, format), self.__item_schema__)
         if len(result.documents) > 1:
             raise Exception("More than one result found! Try another query")
         return result.documents[0]
@@ -65,8 +68,9 @@ class SearchManager(Manager):
 class BiblioManager(Manager):
     __schema__ = BiblioResultSchema
 
+    @traced("manager.get")
     def get(self, doc_number):
-        result = self.__schema__.load(PublishedApi.biblio.get_biblio(doc_number))
+        result = self._load(PublishedApi.biblio.get_biblio(doc_number))
         if len(result.documents) > 1:
             raise ValueError(f"More than one result found for {doc_number}!")
         return result.documents[0]
@@ -75,19 +79,22 @@ class BiblioManager(Manager):
 class ClaimsManager(Manager):
     __schema__ = ClaimsSchema
 
+    @traced("manager.get")
     def get(self, doc_number):
-        return self.__schema__.load(PublishedApi.fulltext.get_claims(doc_number))
+        return self._load(PublishedApi.fulltext.get_claims(doc_number))
 
 
 class DescriptionManager(Manager):
     __schema__ = DescriptionSchema
 
+    @traced("manager.get")
     def get(self, doc_number):
-        return self.__schema__.load(PublishedApi.fulltext.get_description(doc_number))
+        return self._load(PublishedApi.fulltext.get_description(doc_number))
 
 
 class ImageManager(Manager):
     __schema__ = ImagesSchema
 
+    @traced("manager.get")
     def get(self, doc_number):
-        return self.__schema__.load(PublishedApi.images.get_images(doc_number))
+        return self._load(PublishedApi.images.get_images(doc_number))
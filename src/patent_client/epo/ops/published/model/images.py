@@ -4,9 +4,10 @@ from pathlib import Path
 from typing import List
 
 from patent_client.epo.ops.util import InpadocModel
+from patent_client.extras import optional_import
+from patent_client.tracing import span
+from patent_client.tracing import traced
 from patent_client.util import Model
-from PyPDF2 import PdfReader
-from PyPDF2 import PdfWriter
 
 
 @dataclass
@@ -24,23 +25,26 @@ class ImageDocument(Model):
     sections: List[Section] = field(default_factory=list)
     doc_number: str = None
 
+    @traced("download")
     def download(self, path="."):
         from ..api import PublishedImagesApi
 
+        PyPDF2 = optional_import("PyPDF2")
         out_file = Path(path) / f"{self.doc_number}.pdf"
-        writer = PdfWriter()
+        writer = PyPDF2.PdfWriter()
         for i in range(1, self.num_pages + 1):
             page_data = PublishedImagesApi.get_page_image_from_link(self.link, page_number=i)
-            page = PdfReader(page_data).pages[0]
+            page = PyPDF2.PdfReader(page_data).pages[0]
             if page["/Rotate"] == 90:
                 page.rotate_clockwise(-90)
             writer.add_page(page)
 
-        for section in self.sections:
-            writer.add_outline_item(section.name.capitalize(), section.start_page)
+        with span("pdf.merge", pages=self.num_pages):
+            for section in self.sections:
+                writer.add_outline_item(section.name.capitalize(), section.start_page)
 
-        with out_file.open("wb") as f:
-            writer.write(f)
+            with out_file.open("wb") as f:
+                writer.write(f)
 
 
 @dataclass
@@ -1,7 +1,20 @@
 import datetime as dt
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlparse
 
+from patent_client import BASE_DIR
 from patent_client import SETTINGS
+from patent_client.cache import parse_size
+from patent_client.session import CacheMissError
 from patent_client.session import PatentClientSession
+from patent_client.session import is_offline
+from patent_client.session import rate_limiter
 
 NS = {
     "http://ops.epo.org": None,
@@ -23,26 +36,144 @@ class OpsForbiddenError(Exception):
     pass
 
 
+# e.g. "busy (images=green:200, inpadoc=yellow:60, other=green:1000, retrieval=green:200, search=red:15)"
+THROTTLING_RE = re.compile(r"(?P<load>\w+)\s*\((?P<services>[^)]*)\)")
+SERVICE_RE = re.compile(r"(?P<service>\w+)=(?P<color>\w+):(?P<limit>\d+)")
+# How much of the advertised per-minute limit to use, by system load and by service traffic light
+SYSTEM_LOAD = {"idle": 1.0, "busy": 0.75, "overloaded": 0.5}
+TRAFFIC_LIGHTS = {"green": 1.0, "yellow": 0.9, "red": 0.5}
+# Slow down once this share of the hourly quota is used
+QUOTA_SOFT_LIMIT = 0.8
+
+
+def lock_file(fd):
+    """Block until this process holds an exclusive lock on the open file ``fd``"""
+    if os.name == "nt":
+        import msvcrt
+
+        # LK_LOCK only retries for 10 seconds before giving up
+        while True:
+            try:
+                return msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            except OSError:
+                pass
+    else:
+        import fcntl
+
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+
+class OpsThrottle:
+    """Rate limiter policy that follows the throttling signals OPS sends with every response
+
+    Each OPS service (search, retrieval, inpadoc, images, other) is paced separately at the per-minute
+    limit advertised in ``X-Throttling-Control``, scaled down when the system is busy or the service's
+    traffic light turns yellow / red, and paused for a minute when it turns black. Pacing also tightens
+    as ``X-IndividualQuotaPerHour-Used`` approaches ``hourly_quota``.
+    """
+
+    def __init__(self, hourly_quota=None):
+        self.hourly_quota = parse_size(hourly_quota)
+
+    def scope(self, url):
+        path = urlparse(url).path
+        if "/published-data/search" in path:
+            return "search"
+        if "/published-data/images" in path:
+            return "images"
+        if "/family/" in path or "/legal/" in path:
+            return "inpadoc"
+        if "/published-data/" in path:
+            return "retrieval"
+        return "other"
+
+    def quota_factor(self, response):
+        try:
+            used = int(response.headers["X-IndividualQuotaPerHour-Used"])
+        except (KeyError, ValueError):
+            return 1.0
+        if not self.hourly_quota:
+            return 1.0
+        remaining = 1 - used / self.hourly_quota
+        return min(max(remaining / (1 - QUOTA_SOFT_LIMIT), 0.05), 1.0)
+
+    def update(self, limiter, host, scope, response):
+        match = THROTTLING_RE.search(response.headers.get("X-Throttling-Control", ""))
+        if not match:
+            return
+        factor = SYSTEM_LOAD.get(match.group("load").lower(), 1.0) * self.quota_factor(response)
+        for service, color, limit in SERVICE_RE.findall(match.group("services")):
+            color = color.lower()
+            if color == "black":
+                limiter.pause(host, 60, scope=service)
+                continue
+            rate = int(limit) / 60 * TRAFFIC_LIGHTS.get(color, 1.0) * factor
+            limiter.set_rate(host, max(rate, 1 / 60), scope=service)
+
+
+AUTH_URL = "https://ops.epo.org/3.2/auth/accesstoken"
+# Tokens are refreshed this long before they expire
+TOKEN_REFRESH_MARGIN = dt.timedelta(seconds=60)
+
+
 class OpsSession(PatentClientSession):
-    def __init__(self, *args, key=None, secret=None, **kwargs):
+    """Session for EPO OPS. Safe to share between threads: the access token is held on the session
+    and only ever added to the outgoing request, never to the shared ``headers``, and a single thread
+    refreshes it while the others wait"""
+
+    def __init__(self, *args, key=None, secret=None, token_file=None, **kwargs):
         super(OpsSession, self).__init__(*args, **kwargs)
         self.key: str = key
         self.secret: str = secret
+        self.token_file = Path(token_file) if token_file else None
+        self.access_token: str = None
         self.expires: dt.datetime = dt.datetime.utcnow()
+        self._token_lock = threading.Lock()
 
     def request(self, *args, **kwargs):
         response = super(OpsSession, self).request(*args, **kwargs)
         if response.status_code in (403, 400):
-            auth_response = self.get_token()
+            self.refresh_token(stale=response.request.headers.get("Authorization"))
             response = super(OpsSession, self).request(*args, **kwargs)
         return response
 
+    def _send_and_cache(self, request, actions, cached_response=None, **kwargs):
+        # Only requests that actually go to OPS need a token, so cache hits never trigger a refresh.
+        # The header goes on this request only - self.headers is shared by every thread
+        if self.key and self.secret and request.url != AUTH_URL:
+            request.headers["Authorization"] = self.ensure_token()
+        return super(OpsSession, self)._send_and_cache(request, actions, cached_response, **kwargs)
+
+    def token_expiring(self):
+        return self.access_token is None or dt.datetime.utcnow() + TOKEN_REFRESH_MARGIN >= self.expires
+
+    def ensure_token(self):
+        """Returns a valid Authorization header, refreshing the token first if it's about to expire"""
+        if self.token_expiring():
+            with self._token_lock, self.token_file_lock():
+                # Another thread or process may have refreshed the token while we waited for the lock
+                if self.token_expiring() and not self.load_token_file():
+                    self.get_token()
+        return self.authorization
+
+    def refresh_token(self, stale=None):
+        """Replace a token that OPS rejected. If another thread or process already replaced it, do nothing"""
+        with self._token_lock, self.token_file_lock():
+            if stale is not None:
+                if self.authorization != stale and not self.token_expiring():
+                    return
+                # A process sharing the token file may have replaced it
+                if self.load_token_file() and self.authorization != stale:
+                    return
+            self.get_token()
+
     def get_token(self):
-        auth_url = "https://ops.epo.org/3.2/auth/accesstoken"
+        if is_offline():
+            raise CacheMissError("Patent Client is offline, so no EPO OPS access token can be fetched")
         with self.cache_disabled():
             response = super(OpsSession, self).request(
                 "post",
-                auth_url,
+                AUTH_URL,
                 auth=(self.key, self.secret),
                 data={"grant_type": "client_credentials"},
             )
@@ -57,11 +188,82 @@ class OpsSession(PatentClientSession):
         response.raise_for_status()
 
         data = response.json()
-        self.expires = dt.datetime.fromtimestamp(int(data["issued_at"]) / 1000) + dt.timedelta(
-            seconds=int(data["expires_in"])
-        )
-        self.headers["Authorization"] = f"Bearer {data['access_token']}"
+        # Timed from our own clock, so a skewed server clock can't make us use an expired token
+        self.set_token(data["access_token"], dt.datetime.utcnow() + dt.timedelta(seconds=int(data["expires_in"])))
+        self.save_token_file()
         return response
 
+    def set_token(self, access_token, expires):
+        self.access_token = access_token
+        self.expires = expires
+
+    @property
+    def authorization(self):
+        return f"Bearer {self.access_token}" if self.access_token else None
+
+    # The token file lets short-lived processes share one token instead of each authenticating
+
+    def key_id(self):
+        return hashlib.sha256(f"{self.key}:{self.secret}".encode()).hexdigest()[:16]
+
+    def load_token_file(self):
+        if self.token_file is None or not self.token_file.exists():
+            return False
+        try:
+            data = json.loads(self.token_file.read_text())
+            if data["key_id"] != self.key_id():
+                return False
+            self.set_token(data["access_token"], dt.datetime.utcfromtimestamp(data["expires"]))
+        except (OSError, ValueError, KeyError):
+            logger.debug("Ignoring unreadable token file %s", self.token_file)
+            return False
+        if self.token_expiring():
+            return False
+        logger.debug("Using EPO OPS token from %s", self.token_file)
+        return True
+
+    @contextmanager
+    def token_file_lock(self):
+        """Hold an exclusive lock on the token file, shared with other processes, so only one of them
+        authenticates when the token runs out"""
+        if self.token_file is None:
+            yield
+            return
+        try:
+            fd = os.open(self.token_file.with_name(f".{self.token_file.name}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError:
+            logger.warning("Couldn't open the lock for EPO OPS token file %s", self.token_file, exc_info=True)
+            yield
+            return
+        try:
+            lock_file(fd)
+            yield
+        finally:
+            # Closing the file releases the lock
+            os.close(fd)
+
+    def save_token_file(self):
+        if self.token_file is None:
+            return
+        data = {
+            "key_id": self.key_id(),
+            "access_token": self.access_token,
+            "expires": self.expires.replace(tzinfo=dt.timezone.utc).timestamp(),
+        }
+        # Write to a private temp file and move it into place, so readers never see half a file
+        tmp = self.token_file.with_name(f".{self.token_file.name}.{os.getpid()}.{threading.get_ident()}")
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.token_file)
+        except OSError:
+            logger.warning("Couldn't write EPO OPS token file %s", self.token_file, exc_info=True)
+
 
-session = OpsSession(key=SETTINGS.EPO.API_KEY, secret=SETTINGS.EPO.API_SECRET)
+rate_limiter.add_policy("ops.epo.org", OpsThrottle(SETTINGS.EPO.get("HOURLY_QUOTA")))
+session = OpsSession(
+    key=SETTINGS.EPO.API_KEY,
+    secret=SETTINGS.EPO.API_SECRET,
+    token_file=BASE_DIR / SETTINGS.EPO.TOKEN_FILE if SETTINGS.EPO.get("TOKEN_FILE") else None,
+)
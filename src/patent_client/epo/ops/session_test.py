@@ -0,0 +1,149 @@
+import datetime as dt
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import BaseAdapter
+
+from patent_client.cache import PatentClientCache
+from patent_client.circuit import CircuitBreakers
+from patent_client.ratelimit import RateLimiter
+from patent_client.util.test import make_response
+
+from .session import AUTH_URL
+from .session import OpsSession
+from .session import OpsThrottle
+
+OPS = "https://ops.epo.org/3.2/rest-services"
+THROTTLING = "busy (images=green:200, inpadoc=yellow:60, other=green:1000, retrieval=black:200, search=red:30)"
+
+
+def test_scope():
+    throttle = OpsThrottle()
+    assert throttle.scope(f"{OPS}/published-data/search/biblio") == "search"
+    assert throttle.scope(f"{OPS}/published-data/publication/epodoc/EP1000000/biblio") == "retrieval"
+    assert throttle.scope(f"{OPS}/published-data/images/EP/1000000/A1/fullimage") == "images"
+    assert throttle.scope(f"{OPS}/family/publication/docdb/EP.1000000.A1") == "inpadoc"
+    assert throttle.scope(f"{OPS}/number-service/application/original/US.123/docdb") == "other"
+
+
+def test_throttling_control():
+    limiter = RateLimiter()
+    throttle = OpsThrottle()
+    throttle.update(limiter, "ops.epo.org", "search", make_response(headers={"X-Throttling-Control": THROTTLING}))
+    rates = {scope: bucket.rate for (host, scope), bucket in limiter.buckets.items()}
+    assert rates["images"] == 200 / 60 * 0.75
+    assert rates["search"] == 30 / 60 * 0.75 * 0.5
+    assert limiter.buckets[("ops.epo.org", "retrieval")].paused_until > 0
+
+
+def test_hourly_quota_slows_down():
+    throttle = OpsThrottle(hourly_quota="100MB")
+    assert throttle.quota_factor(make_response(headers={"X-IndividualQuotaPerHour-Used": "1000"})) == 1.0
+    assert throttle.quota_factor(make_response(headers={"X-IndividualQuotaPerHour-Used": str(90 * 1024**2)})) < 0.6
+    assert throttle.quota_factor(make_response(headers={"X-IndividualQuotaPerHour-Used": str(200 * 1024**2)})) == 0.05
+
+
+class TokenAdapter(BaseAdapter):
+    """Hands out numbered tokens, and answers anything else with the Authorization header it got"""
+
+    def __init__(self, delay=0):
+        super().__init__()
+        self.tokens = 0
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        response.status_code = 200
+        if request.url == AUTH_URL:
+            time.sleep(self.delay)
+            with self.lock:
+                self.tokens += 1
+                token = self.tokens
+            response._content = json.dumps({"access_token": f"token-{token}", "expires_in": "1199"}).encode()
+        else:
+            response._content = request.headers.get("Authorization", "").encode()
+        return response
+
+    def close(self):
+        pass
+
+
+def make_session(tmp_path, token_file=None):
+    session = OpsSession(key="key", secret="secret", token_file=token_file)
+    session.cache = PatentClientCache(tmp_path / "cache.sqlite", sweep_interval=0)
+    session.rate_limiter = RateLimiter()
+    session.circuit_breakers = CircuitBreakers()
+    session.adapter = TokenAdapter()
+    session.mount("https://ops.epo.org", session.adapter)
+    return session
+
+
+def test_token_is_fetched_before_the_first_request(tmp_path):
+    session = make_session(tmp_path)
+    assert session.get("https://ops.epo.org/3.2/rest-services/a").text == "Bearer token-1"
+    assert session.get("https://ops.epo.org/3.2/rest-services/b").text == "Bearer token-1"
+    session.expires = dt.datetime.utcnow() + dt.timedelta(seconds=30)
+    assert session.get("https://ops.epo.org/3.2/rest-services/c").text == "Bearer token-2"
+    assert session.adapter.tokens == 2
+
+
+def test_one_thread_refreshes(tmp_path):
+    session = make_session(tmp_path)
+    session.adapter.delay = 0.1
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: session.get(f"https://ops.epo.org/3.2/rest-services/{i}"), range(8)))
+    assert session.adapter.tokens == 1
+
+
+def test_token_file_is_shared(tmp_path):
+    token_file = tmp_path / "epo_token.json"
+    first = make_session(tmp_path, token_file)
+    first.get("https://ops.epo.org/3.2/rest-services/a")
+    second = make_session(tmp_path, token_file)
+    assert second.get("https://ops.epo.org/3.2/rest-services/b").text == "Bearer token-1"
+    assert second.adapter.tokens == 0
+    other_key = make_session(tmp_path, token_file)
+    other_key.key = "other"
+    assert other_key.get("https://ops.epo.org/3.2/rest-services/c").text == "Bearer token-1"
+    assert other_key.adapter.tokens == 1
+
+
+def test_token_is_never_put_on_the_shared_headers(tmp_path):
+    session = make_session(tmp_path)
+    assert session.get("https://ops.epo.org/3.2/rest-services/a").text == "Bearer token-1"
+    assert "Authorization" not in session.headers
+    session.refresh_token(stale="Bearer token-1")
+    assert session.get("https://ops.epo.org/3.2/rest-services/b").text == "Bearer token-2"
+    session.refresh_token(stale="Bearer token-1")
+    assert session.adapter.tokens == 2
+
+
+def test_only_one_session_authenticates_on_a_cold_start(tmp_path):
+    # Sessions don't share their thread lock, like sessions in separate processes
+    token_file = tmp_path / "epo_token.json"
+    adapter = TokenAdapter(delay=0.2)
+    sessions = [make_session(tmp_path, token_file) for _ in range(4)]
+    for session in sessions:
+        session.mount("https://ops.epo.org", adapter)
+    with ThreadPoolExecutor(len(sessions)) as pool:
+        texts = list(pool.map(lambda s: s.get("https://ops.epo.org/3.2/rest-services/a").text, sessions))
+    assert texts == ["Bearer token-1"] * len(sessions)
+    assert adapter.tokens == 1
+
+
+def test_rejected_token_is_replaced_once_across_sessions(tmp_path):
+    token_file = tmp_path / "epo_token.json"
+    first, second = make_session(tmp_path, token_file), make_session(tmp_path, token_file)
+    second.mount("https://ops.epo.org", first.adapter)
+    first.get("https://ops.epo.org/3.2/rest-services/a")
+    second.get("https://ops.epo.org/3.2/rest-services/b")
+    first.refresh_token(stale="Bearer token-1")
+    second.refresh_token(stale="Bearer token-1")
+    assert first.authorization == second.authorization == "Bearer token-2"
+    assert first.adapter.tokens == 2
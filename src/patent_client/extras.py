@@ -0,0 +1,19 @@
+import importlib
+
+# Optional dependency -> the extra that installs it
+EXTRAS = {
+    "PyPDF2": "pdf",
+    "openpyxl": "legal",
+    "h2": "http2",
+    "opentelemetry": "otel",
+}
+
+
+def optional_import(name):
+    """Import an optional dependency when the feature that needs it is first used. If it isn't
+    installed, the ImportError says which extra to install"""
+    try:
+        return importlib.import_module(name)
+    except ImportError as e:
+        extra = EXTRAS.get(name.split(".")[0], "all")
+        raise ImportError(f"{name} is not installed. Install it with: pip install 'patent_client[{extra}]'") from e
@@ -0,0 +1,13 @@
+import pytest
+
+from .extras import optional_import
+
+
+def test_optional_import():
+    assert optional_import("json").dumps(1) == "1"
+
+
+def test_missing_dependency_names_the_extra(monkeypatch):
+    monkeypatch.setitem(__import__("sys").modules, "PyPDF2", None)
+    with pytest.raises(ImportError, match=r"patent_client\[pdf\]"):
+        optional_import("PyPDF2")
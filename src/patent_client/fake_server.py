@@ -0,0 +1,407 @@
+"""A local stand-in for the upstream APIs
+
+``FakeServer`` answers requests meant for PEDS, PTAB, Assignment, Public Search, Global Dossier and
+EPO OPS with the responses recorded in the test cassettes. Each response takes a latency drawn from a
+configurable distribution, a share of them can be failed (500s, Public Search's spurious 415s, OPS
+403s with throttling headers), and hosts can be rate limited - so prefetching, rate limiting, retries
+and concurrency can be exercised under load without the network:
+
+    from patent_client.fake_server import Behaviour
+    from patent_client.fake_server import FakeServer
+
+    behaviour = Behaviour(latency=0.2, jitter=0.5, distribution="lognormal", errors={500: 0.05})
+    with FakeServer(behaviour, hosts={"ops.epo.org": Behaviour(rate=1)}) as server:
+        apps = list(USApplication.objects.filter(first_named_applicant="Tesla").limit(68))
+    print(server.stats)
+
+Inside the block, every session's requests go to the server (see ``patent_client.transport.redirect``).
+To run it on its own and point another process at it:
+
+    python -m patent_client.fake_server --port 8765 --latency 0.2 --errors 500=0.05
+    PATENT_CLIENT_TRANSPORT__REDIRECT_TO=http://127.0.0.1:8765 python my_script.py
+
+Requests are matched to recordings on method, host and path, preferring one with the same query and
+body. OPS access tokens and Public Search sessions are always granted; anything else that wasn't
+recorded gets a 404. The cassettes are only part of a source checkout - elsewhere, pass ``cassettes``.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from collections import defaultdict
+from dataclasses import dataclass
+from dataclasses import field
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl
+from urllib.parse import urlsplit
+
+import yaml
+from patent_client.ratelimit import TokenBucket
+from patent_client.settings import parse_list
+from patent_client.settings import parse_rate
+from patent_client.transport import redirect
+
+# Where the test cassettes are kept, in a source checkout
+CASSETTE_DIR = Path(__file__).parent
+DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+# Recorded headers that describe the recorded connection rather than the response
+DROPPED_HEADERS = (
+    "connection",
+    "keep-alive",
+    "transfer-encoding",
+    "content-length",
+    "content-encoding",
+    "date",
+    "server",
+)
+# Per-minute limits OPS advertises for each service when it's idle
+OPS_LIMITS = {"images": 200, "inpadoc": 60, "other": 1000, "retrieval": 200, "search": 30}
+
+
+@dataclass
+class Behaviour:
+    """How the server treats requests to a host
+
+    ``latency`` is the typical response time in seconds. With the "fixed" distribution every response
+    takes exactly that long; "uniform" spreads them up to ``jitter`` seconds either side; "normal" uses
+    ``jitter`` as the standard deviation; "lognormal" makes ``latency`` the median and ``jitter`` the
+    sigma, for the long tail real APIs have; and "exponential" makes ``latency`` the mean.
+
+    ``errors`` maps status codes to the share of requests answered with them. Beyond ``rate`` requests
+    a second (after a burst of ``burst``), requests are turned away with a 429 - or from OPS, a 403
+    with the service's traffic light black.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    distribution: str = "fixed"
+    errors: dict = field(default_factory=dict)
+    rate: float = None
+    burst: int = 1
+
+    def __post_init__(self):
+        if self.distribution not in DISTRIBUTIONS:
+            raise ValueError(f"{self.distribution} is not a latency distribution! Use one of {list(DISTRIBUTIONS)}")
+        if sum(self.errors.values()) > 1:
+            raise ValueError(f"Error rates {self.errors} add up to more than 1")
+
+    @classmethod
+    def from_dict(cls, values):
+        """From settings-style values - ``rate`` like "5/second", ``errors`` like "500=0.05, 415=0.01" """
+        values = dict(values)
+        if "rate" in values:
+            values["rate"] = parse_rate(values["rate"])
+        if isinstance(values.get("errors"), str):
+            values["errors"] = parse_errors(values["errors"])
+        values["errors"] = {int(status): float(share) for status, share in values.get("errors", dict()).items()}
+        return cls(**values)
+
+    def sample(self, rng):
+        """A latency, in seconds"""
+        if self.distribution == "uniform":
+            latency = rng.uniform(self.latency - self.jitter, self.latency + self.jitter)
+        elif self.distribution == "normal":
+            latency = rng.gauss(self.latency, self.jitter)
+        elif self.distribution == "lognormal":
+            latency = self.latency * rng.lognormvariate(0, self.jitter)
+        elif self.distribution == "exponential":
+            latency = rng.expovariate(1 / self.latency) if self.latency else 0.0
+        else:
+            latency = self.latency
+        return max(latency, 0.0)
+
+
+def parse_errors(value):
+    """ "500=0.05, 415=0.01" -> {500: 0.05, 415: 0.01}"""
+    errors = dict()
+    for item in parse_list(value):
+        status, _, share = item.partition("=")
+        errors[int(status)] = float(share)
+    return errors
+
+
+def normalize_body(body):
+    """Request bodies compare equal if they're the same JSON, whatever the key order. Public Search's
+    case id is left out, as it is from the cache key"""
+    if isinstance(body, str):
+        body = body.encode()
+    try:
+        data = json.loads(body)
+    except (TypeError, ValueError):
+        return body or b""
+    if isinstance(data, dict) and isinstance(data.get("query"), dict):
+        data["query"].pop("caseId", None)
+    return json.dumps(data, sort_keys=True)
+
+
+@dataclass
+class Recording:
+    query: list
+    body: object
+    status: int
+    headers: list
+    content: bytes
+
+
+def load_cassettes(paths):
+    """Recordings from the VCR cassettes in ``paths`` (files, or directories searched for cassettes),
+    keyed by method, host and path. Both the requests and the httpx cassette formats are understood"""
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    recordings = defaultdict(list)
+    for path in map(Path, paths):
+        files = sorted(path.glob("**/*.yaml")) if path.is_dir() else [path]
+        for file in files:
+            data = yaml.load(file.read_text(), Loader=loader)
+            if not isinstance(data, dict):
+                continue
+            for interaction in data.get("interactions", ()):
+                request, response = interaction["request"], interaction["response"]
+                url = urlsplit(request["uri"])
+                if "body" in response:
+                    status, content = response["status"]["code"], response["body"].get("string")
+                else:
+                    status, content = response["status_code"], response.get("content")
+                headers = [
+                    (name, value)
+                    for name, values in response.get("headers", dict()).items()
+                    if name.lower() not in DROPPED_HEADERS
+                    for value in (values if isinstance(values, list) else [values])
+                ]
+                recordings[(request["method"].upper(), url.hostname, url.path)].append(
+                    Recording(
+                        query=sorted(parse_qsl(url.query, keep_blank_values=True)),
+                        body=normalize_body(request.get("body")),
+                        status=status,
+                        headers=headers,
+                        content=content.encode() if isinstance(content, str) else content or b"",
+                    )
+                )
+    return recordings
+
+
+def json_response(status, data, headers=()):
+    return status, [("Content-Type", "application/json"), *headers], json.dumps(data).encode()
+
+
+def ops_service(path):
+    """The OPS service a request counts against, as the client's OpsThrottle works it out"""
+    # Imported here, so that the client's OPS session - and its cache - are only loaded once OPS is faked
+    from patent_client.epo.ops.session import OpsThrottle
+
+    return OpsThrottle().scope(path)
+
+
+def ops_throttling(load="idle", black=None):
+    services = ", ".join(
+        f"{service}={'black:0' if service == black else f'green:{limit}'}" for service, limit in OPS_LIMITS.items()
+    )
+    return f"{load} ({services})"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def handle_request(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        delay, (status, headers, content) = self.server.fake.respond(self.command, self.path, body)
+        if delay:
+            time.sleep(delay)
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(content)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = do_OPTIONS = handle_request
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeServer:
+    """Serves recorded responses in place of the upstream APIs. See the module docstring
+
+    ``behaviour`` applies to every host not given its own in ``hosts``. ``cassettes`` are the cassette
+    files or directories to serve from - by default, every cassette in the package's source tree.
+    ``seed`` makes latencies and injected errors repeatable. Counts of requests, responses served,
+    injected errors, throttled and unmatched requests are kept per host in ``stats``.
+    """
+
+    def __init__(self, behaviour=None, hosts=None, cassettes=None, address="127.0.0.1", port=0, seed=None):
+        self.behaviour = behaviour or Behaviour()
+        self.hosts = dict(hosts or dict())
+        self.recordings = load_cassettes([CASSETTE_DIR] if cassettes is None else cassettes)
+        self.address = address
+        self.port = port
+        self.stats = Counter()
+        self.buckets = dict()
+        self.httpd = None
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._redirect = None
+
+    @property
+    def url(self):
+        return f"http://{self.address}:{self.port}"
+
+    def start(self):
+        self.httpd = ThreadingHTTPServer((self.address, self.port), Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self.port = self.httpd.server_port
+        threading.Thread(target=self.httpd.serve_forever, name="patent-client-fake-server", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def redirect(self):
+        """Context manager that sends every session's requests to this server"""
+        return redirect(self.url)
+
+    def __enter__(self):
+        self.start()
+        self._redirect = self.redirect()
+        self._redirect.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._redirect.__exit__(*exc_info)
+        self.stop()
+
+    def behaviour_for(self, host):
+        return self.hosts.get(host, self.behaviour)
+
+    def count(self, host, key):
+        with self._lock:
+            self.stats[f"{host}.{key}"] += 1
+
+    def respond(self, method, target, body=b""):
+        """How long to wait, and the status, headers and body to answer a request for ``target`` - the
+        original host followed by its path and query, as ``redirect_url`` builds it"""
+        host, _, rest = target.lstrip("/").partition("/")
+        url = urlsplit(f"/{rest}")
+        behaviour = self.behaviour_for(host)
+        with self._lock:
+            delay = behaviour.sample(self._rng)
+            roll = self._rng.random()
+        self.count(host, "requests")
+        if not self.admit(host, behaviour):
+            self.count(host, "throttled")
+            return delay, self.throttled(host, url.path)
+        for status, share in behaviour.errors.items():
+            if roll < share:
+                self.count(host, "errors")
+                return delay, self.error(status, host, url.path)
+            roll -= share
+        response = self.builtin(method, host, url.path) or self.recorded(method, host, url.path, url.query, body)
+        if response is None:
+            self.count(host, "missing")
+            return delay, json_response(404, {"error": f"Nothing recorded for {method} {host}{url.path}"})
+        self.count(host, "served")
+        status, headers, content = response
+        if host == "ops.epo.org" and not any(name.lower() == "x-throttling-control" for name, _ in headers):
+            headers = [*headers, ("X-Throttling-Control", ops_throttling())]
+        return delay, (status, headers, content)
+
+    def admit(self, host, behaviour):
+        if not behaviour.rate:
+            return True
+        with self._lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(behaviour.rate, behaviour.burst)
+        return bucket.try_reserve()
+
+    def throttled(self, host, path):
+        if host == "ops.epo.org":
+            service = ops_service(path)
+            return self.ops_fault(service, "CLIENT.RobotDetected", f"Too many {service} requests")
+        return json_response(429, {"error": "Too many requests"}, [("Retry-After", "1")])
+
+    def error(self, status, host, path):
+        if status == 403 and host == "ops.epo.org":
+            service = ops_service(path)
+            return self.ops_fault(service, "SERVER.LimitedServerResources", "Please request again later")
+        headers = [("Retry-After", "1")] if status in (429, 503) else list()
+        return json_response(status, {"error": f"Injected {status}"}, headers)
+
+    def ops_fault(self, service, code, message):
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            f'<fault xmlns="http://ops.epo.org"><code>{code}</code><message>{message}</message></fault>'
+        )
+        headers = [("Content-Type", "application/xml"), ("X-Throttling-Control", ops_throttling("overloaded", service))]
+        return 403, headers, body.encode()
+
+    def builtin(self, method, host, path):
+        """Stateful endpoints, answered whether or not they were recorded"""
+        if host == "ops.epo.org" and path.endswith("/auth/accesstoken"):
+            return json_response(200, {"access_token": "fake-token", "token_type": "BearerToken", "expires_in": "1199"})
+        if host == "ppubs.uspto.gov" and path.endswith("/users/me/session"):
+            return json_response(200, {"userCase": {"caseId": 1}, "userSettings": dict()})
+        return None
+
+    def recorded(self, method, host, path, query, body):
+        candidates = self.recordings.get((method, host, path))
+        if not candidates:
+            return None
+        query, body = sorted(parse_qsl(query, keep_blank_values=True)), normalize_body(body)
+        best = max(candidates, key=lambda r: (r.query == query, r.body == body))
+        return best.status, best.headers, best.content
+
+
+def main():
+    parser = argparse.ArgumentParser(description="A local stand-in for the APIs Patent Client uses")
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Typical response time, in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Spread of response times (see Behaviour)")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--errors", default="", help='Share of requests to fail, by status, e.g. "500=0.05,415=0.01"')
+    parser.add_argument("--rate", help='Requests allowed per host, e.g. "5/second"')
+    parser.add_argument("--burst", type=int, default=1)
+    parser.add_argument("--config", type=Path, help="YAML file of per-host behaviour, keyed by host name")
+    parser.add_argument("--cassettes", nargs="*", help="Cassette files or directories (default: the test cassettes)")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    behaviour = Behaviour.from_dict(
+        {
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "distribution": args.distribution,
+            "errors": args.errors,
+            "rate": args.rate,
+            "burst": args.burst,
+        }
+    )
+    hosts = dict()
+    if args.config:
+        hosts = {host: Behaviour.from_dict(values) for host, values in yaml.safe_load(args.config.read_text()).items()}
+    server = FakeServer(behaviour, hosts, args.cassettes, args.address, args.port, args.seed).start()
+    recorded = sum(len(r) for r in server.recordings.values())
+    print(f"Serving {recorded} recorded responses on {server.url}")
+    print(f"Point Patent Client at it with PATENT_CLIENT_TRANSPORT__REDIRECT_TO={server.url}")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(", ".join(f"{key}={value}" for key, value in sorted(server.stats.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import random
+import time
+
+import pytest
+import requests
+import yaml
+
+from .cache import PatentClientCache
+from .fake_server import Behaviour
+from .fake_server import FakeServer
+from .session import PatentClientSession
+from .transport import redirect_url
+
+INTERACTIONS = [
+    {
+        "request": {"method": "GET", "uri": "https://ped.uspto.gov/api/queries?b=2&a=1", "body": None},
+        "response": {
+            "status": {"code": 200, "message": "OK"},
+            "headers": {"Content-Type": ["application/json"], "Content-Length": ["14"]},
+            "body": {"string": '{"query": "a"}'},
+        },
+    },
+    {
+        "request": {"method": "GET", "uri": "https://ped.uspto.gov/api/queries?a=2", "body": None},
+        "response": {
+            "status": {"code": 200, "message": "OK"},
+            "headers": {"Content-Type": ["application/json"]},
+            "body": {"string": '{"query": "b"}'},
+        },
+    },
+    {
+        "request": {
+            "method": "POST",
+            "uri": "https://ppubs.uspto.gov/dirsearch-public/searches/counts",
+            "body": '{"q": 1}',
+        },
+        "response": {"status_code": 200, "http_version": "HTTP/2", "headers": {}, "content": "one"},
+    },
+    {
+        "request": {
+            "method": "POST",
+            "uri": "https://ppubs.uspto.gov/dirsearch-public/searches/counts",
+            "body": '{"q": 2, "query": {"caseId": 5}}',
+        },
+        "response": {"status_code": 200, "http_version": "HTTP/2", "headers": {}, "content": "two"},
+    },
+]
+
+
+@pytest.fixture
+def disable_recording():
+    # Everything here talks to a local server
+    return True
+
+
+@pytest.fixture
+def cassette(tmp_path):
+    path = tmp_path / "cassettes" / "example.yaml"
+    path.parent.mkdir()
+    path.write_text(yaml.safe_dump({"interactions": INTERACTIONS, "version": 1}))
+    return path.parent
+
+
+def serve(cassette, behaviour=None, **kwargs):
+    return FakeServer(behaviour, cassettes=[cassette], seed=1, **kwargs).start()
+
+
+def test_recorded_responses_are_served(cassette):
+    server = serve(cassette)
+    try:
+        response = requests.get(f"{server.url}/ped.uspto.gov/api/queries?a=1&b=2")
+        assert response.json() == {"query": "a"}
+        assert response.headers["Content-Length"] == "14"
+        assert requests.get(f"{server.url}/ped.uspto.gov/api/queries?a=2").json() == {"query": "b"}
+        # Bodies are compared as JSON, without Public Search's case id
+        url = f"{server.url}/ppubs.uspto.gov/dirsearch-public/searches/counts"
+        assert requests.post(url, json={"query": {"caseId": 9}, "q": 2}).text == "two"
+        assert requests.post(url, json={"q": 1}).text == "one"
+        assert requests.get(f"{server.url}/ped.uspto.gov/api/missing").status_code == 404
+    finally:
+        server.stop()
+    assert server.stats["ped.uspto.gov.served"] == 2
+    assert server.stats["ped.uspto.gov.missing"] == 1
+
+
+def test_sessions_are_redirected(cassette, tmp_path):
+    session = PatentClientSession()
+    session.cache = PatentClientCache(tmp_path / "cache.sqlite", sweep_interval=0)
+    with FakeServer(cassettes=[cassette]) as server:
+        assert redirect_url("https://ped.uspto.gov/api/queries?a=2") == f"{server.url}/ped.uspto.gov/api/queries?a=2"
+        response = session.get("https://ped.uspto.gov/api/queries?a=2")
+    assert redirect_url("https://ped.uspto.gov/api/queries") is None
+    assert response.json() == {"query": "b"}
+    # Only the wire is redirected
+    assert response.url == "https://ped.uspto.gov/api/queries?a=2"
+    assert server.stats["ped.uspto.gov.served"] == 1
+
+
+def test_public_search_is_redirected(cassette):
+    from patent_client.uspto.public_search.session import client
+
+    with FakeServer(cassettes=[cassette]) as server:
+        response = client.post("https://ppubs.uspto.gov/dirsearch-public/users/me/session", json=-1)
+    assert response.json()["userCase"]["caseId"] == 1
+    assert server.stats["ppubs.uspto.gov.served"] == 1
+
+
+def test_errors_are_injected(cassette):
+    server = serve(cassette, Behaviour(errors={500: 1.0}), hosts={"ops.epo.org": Behaviour(errors={403: 1.0})})
+    try:
+        assert requests.get(f"{server.url}/ped.uspto.gov/api/queries?a=2").status_code == 500
+        response = requests.get(f"{server.url}/ops.epo.org/3.2/rest-services/published-data/search?q=x")
+    finally:
+        server.stop()
+    assert response.status_code == 403
+    assert "search=black:0" in response.headers["X-Throttling-Control"]
+    assert server.stats["ped.uspto.gov.errors"] == 1
+
+
+def test_hosts_are_rate_limited(cassette):
+    server = serve(cassette, Behaviour(rate=0.1, burst=1))
+    try:
+        assert requests.get(f"{server.url}/ped.uspto.gov/api/queries?a=2").status_code == 200
+        response = requests.get(f"{server.url}/ped.uspto.gov/api/queries?a=2")
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+        requests.get(f"{server.url}/ops.epo.org/3.2/rest-services/family/publication/docdb/EP.1000000.A1")
+        response = requests.get(f"{server.url}/ops.epo.org/3.2/rest-services/family/publication/docdb/EP.1000000.A1")
+    finally:
+        server.stop()
+    assert response.status_code == 403
+    assert "inpadoc=black:0" in response.headers["X-Throttling-Control"]
+    assert server.stats["ped.uspto.gov.throttled"] == 1
+
+
+def test_latency_distributions():
+    rng = random.Random(1)
+    assert Behaviour(latency=0.2).sample(rng) == 0.2
+    assert all(0.1 <= Behaviour(0.2, 0.1, "uniform").sample(rng) <= 0.3 for _ in range(100))
+    assert all(Behaviour(0.1, 1, "normal").sample(rng) >= 0 for _ in range(100))
+    samples = sorted(Behaviour(0.2, 1, "lognormal").sample(rng) for _ in range(1001))
+    assert 0.1 < samples[500] < 0.4
+    assert samples[-1] > 1
+    with pytest.raises(ValueError):
+        Behaviour(distribution="pareto")
+    behaviour = Behaviour.from_dict({"latency": 0.1, "rate": "30/minute", "errors": "500=0.05, 415=0.01"})
+    assert behaviour.rate == 0.5
+    assert behaviour.errors == {500: 0.05, 415: 0.01}
+
+
+def test_responses_are_delayed(cassette):
+    server = serve(cassette, Behaviour(latency=0.2))
+    try:
+        start = time.monotonic()
+        requests.get(f"{server.url}/ped.uspto.gov/api/queries?a=2")
+    finally:
+        server.stop()
+    assert time.monotonic() - start >= 0.2
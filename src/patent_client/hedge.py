@@ -0,0 +1,123 @@
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from collections import defaultdict
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from contextvars import copy_context
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+def endpoint(url):
+    """Group URLs by endpoint - host and path, with path segments that contain ids replaced by *"""
+    parsed = urlparse(str(url))
+    path = "/".join("*" if any(c.isdigit() for c in segment) else segment for segment in parsed.path.split("/"))
+    return f"{parsed.hostname}{path}"
+
+
+class LatencyTracker:
+    """Keeps the last ``window`` latencies of successful responses for each endpoint"""
+
+    def __init__(self, window=200):
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            self.samples[endpoint].append(seconds)
+
+    def percentile(self, endpoint, percentile, min_samples=1):
+        with self._lock:
+            samples = sorted(self.samples.get(endpoint, ()))
+        if len(samples) < max(min_samples, 1):
+            return None
+        return samples[min(math.ceil(len(samples) * percentile / 100) - 1, len(samples) - 1)]
+
+
+def close_response(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class Hedger:
+    """Sends a duplicate of a slow request, and uses whichever response arrives first
+
+    Once an endpoint has ``min_samples`` latencies on record, a request to it that hasn't
+    finished by the endpoint's ``percentile`` latency is hedged - sent again - as long as no more
+    than ``max_ratio`` of requests have been hedged and the caller's budget allows another request.
+    The slower response is closed and thrown away.
+    """
+
+    def __init__(self, enabled=False, percentile=95, min_samples=20, max_ratio=0.1, workers=16):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.workers = workers
+        self.latency = LatencyTracker()
+        self.stats = Counter(requests=0, hedged=0, hedge_wins=0, over_budget=0)
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="patent-client-hedge")
+            return self._pool
+
+    def timed(self, endpoint, call):
+        start = time.monotonic()
+        response = call()
+        if response.status_code < 500:
+            self.latency.record(endpoint, time.monotonic() - start)
+        return response
+
+    def may_hedge(self, budget):
+        with self._lock:
+            if self.stats["hedged"] + 1 > self.stats["requests"] * self.max_ratio:
+                return False
+            if not budget():
+                self.stats["over_budget"] += 1
+                return False
+            self.stats["hedged"] += 1
+            return True
+
+    def run(self, url, primary, hedge, budget):
+        """Call ``primary()``, and ``hedge()`` too if it's slow and ``budget()`` allows it"""
+        key = endpoint(url)
+        if not self.enabled:
+            return primary()
+        with self._lock:
+            self.stats["requests"] += 1
+        delay = self.latency.percentile(key, self.percentile, self.min_samples)
+        if delay is None:
+            return self.timed(key, primary)
+
+        # Attempts run on the pool, but keep the caller's context - e.g. its deadline
+        futures = {self.pool().submit(copy_context().run, self.timed, key, primary): "primary"}
+        done, _ = wait(futures, timeout=delay)
+        if not done and self.may_hedge(budget):
+            logger.debug("Hedging request to %s after %.2fs", url, delay)
+            futures[self.pool().submit(copy_context().run, self.timed, key, hedge)] = "hedge"
+
+        pending, error = set(futures), None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                for other in futures:
+                    if other is not future:
+                        other.add_done_callback(close_response)
+                if futures[future] == "hedge":
+                    with self._lock:
+                        self.stats["hedge_wins"] += 1
+                return future.result()
+        raise error
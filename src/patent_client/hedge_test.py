@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from .hedge import Hedger
+from .hedge import LatencyTracker
+from .hedge import endpoint
+
+
+class Call:
+    """Returns a response after ``delay`` seconds, recording whether it was closed"""
+
+    def __init__(self, delay, status=200):
+        self.delay = delay
+        self.status = status
+        self.response = None
+
+    def __call__(self):
+        time.sleep(self.delay)
+        self.response = requests.Response()
+        self.response.status_code = self.status
+        self.response.closed = False
+        self.response.close = lambda: setattr(self.response, "closed", True)
+        return self.response
+
+
+def warm_up(hedger, url, seconds=0.01, n=20):
+    for _ in range(n):
+        hedger.latency.record(endpoint(url), seconds)
+
+
+def test_endpoint():
+    assert endpoint("https://ppubs.uspto.gov/dirsearch-public/patents/US-11000000-B2/highlight?x=1") == (
+        "ppubs.uspto.gov/dirsearch-public/patents/*/highlight"
+    )
+    assert endpoint("https://ped.uspto.gov/api/queries") == "ped.uspto.gov/api/queries"
+
+
+def test_percentile():
+    tracker = LatencyTracker()
+    for i in range(1, 101):
+        tracker.record("a", i)
+    assert tracker.percentile("a", 95) == 95
+    assert tracker.percentile("a", 50) == 50
+    assert tracker.percentile("b", 95) is None
+    assert tracker.percentile("a", 95, min_samples=101) is None
+
+
+def test_slow_request_is_hedged():
+    hedger = Hedger(enabled=True, max_ratio=1)
+    url = "https://example.com/search"
+    warm_up(hedger, url)
+    slow, fast = Call(0.5), Call(0.01)
+    response = hedger.run(url, slow, fast, lambda: True)
+    assert response is fast.response
+    assert hedger.stats["hedged"] == 1 and hedger.stats["hedge_wins"] == 1
+    time.sleep(0.6)
+    assert slow.response.closed
+
+
+def test_fast_request_is_not_hedged():
+    hedger = Hedger(enabled=True, max_ratio=1)
+    url = "https://example.com/search"
+    warm_up(hedger, url, seconds=0.2)
+    primary, hedge = Call(0.01), Call(0.01)
+    assert hedger.run(url, primary, hedge, lambda: True) is primary.response
+    assert hedge.response is None
+    assert hedger.stats["hedged"] == 0
+
+
+def test_hedging_respects_budget_and_ratio():
+    hedger = Hedger(enabled=True, max_ratio=1)
+    url = "https://example.com/search"
+    warm_up(hedger, url)
+    hedge = Call(0)
+    hedger.run(url, Call(0.1), hedge, lambda: False)
+    assert hedge.response is None
+    assert hedger.stats["over_budget"] == 1
+
+    hedger = Hedger(enabled=True, max_ratio=0.5)
+    warm_up(hedger, url, n=200)
+    hedges = [Call(0) for _ in range(4)]
+    for hedge in hedges:
+        hedger.run(url, Call(0.1), hedge, lambda: True)
+    assert hedger.stats["hedged"] == 2
+
+
+def test_failed_hedge_falls_back_to_primary():
+    hedger = Hedger(enabled=True, max_ratio=1)
+    url = "https://example.com/search"
+    warm_up(hedger, url)
+
+    def broken():
+        raise ConnectionError()
+
+    primary = Call(0.1)
+    assert hedger.run(url, primary, broken, lambda: True) is primary.response
+    with pytest.raises(ConnectionError):
+        hedger.run(url, broken, broken, lambda: True)
+
+
+def test_disabled_runs_primary_inline():
+    hedger = Hedger()
+    thread = list()
+    hedger.run("https://example.com/a", lambda: thread.append(threading.current_thread()) or Call(0)(), None, None)
+    assert thread == [threading.current_thread()]
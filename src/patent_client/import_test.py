@@ -0,0 +1,84 @@
+import os
+import subprocess
+import sys
+
+# Cumulative import time allowed for ``import patent_client``, in microseconds. It takes ~2ms; the
+# margin is for slow CI machines, not for new imports
+IMPORT_BUDGET_US = 50_000
+# Should only be imported once they're used
+HEAVY_MODULES = (
+    "requests",
+    "requests_cache",
+    "httpx",
+    "yankee",
+    "yaml",
+    "lxml",
+    "PyPDF2",
+    "openpyxl",
+    "patent_client.session",
+    "patent_client.epo",
+    "patent_client.uspto",
+)
+
+
+def import_times(code):
+    """Run ``code`` in a fresh interpreter with ``-X importtime``. Returns {module: cumulative microseconds}"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True
+    )
+    times = dict()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_import_is_cheap():
+    times = import_times("import patent_client")
+    assert [m for m in HEAVY_MODULES if m in times] == list()
+    assert times["patent_client"] < IMPORT_BUDGET_US
+
+
+def test_models_only_load_their_own_api():
+    times = import_times("from patent_client import USApplication")
+    assert "patent_client.uspto.peds.model" in times
+    assert "patent_client.epo" not in times
+    assert "patent_client.uspto.public_search" not in times
+
+
+def test_optional_dependencies_load_with_their_features():
+    times = import_times("from patent_client import USApplication, Inpadoc, PtabProceeding")
+    assert [m for m in ("PyPDF2", "openpyxl", "lxml.html", "httpx", "h2") if m in times] == list()
+
+
+def test_session_is_built_on_first_use():
+    code = "\n".join(
+        [
+            "import patent_client, patent_client.session",
+            "assert patent_client._session is None",
+            "from patent_client import session",
+            "assert type(session).__name__ == 'PatentClientSession', session",
+            "assert patent_client.session is session",
+        ]
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_subsystems_do_no_io_on_import(tmp_path):
+    code = "\n".join(
+        [
+            "from patent_client.epo.ops.legal.national_codes import code_dir",
+            "from patent_client.uspto.ptab import load_schema_doc",
+            "from patent_client.uspto.global_dossier.query import load_input_schema",
+            "from patent_client.uspto.public_search.query import load_config",
+            "import patent_client.epo.ops.legal.schema, patent_client.uspto.ptab.manager",
+            "import patent_client.uspto.global_dossier.manager, patent_client.uspto.public_search.manager",
+            "for loader in (code_dir, load_schema_doc, load_input_schema, load_config):",
+            "    assert loader.cache_info().currsize == 0, loader",
+        ]
+    )
+    env = {**os.environ, "PATENT_CLIENT_BASE_DIR": str(tmp_path)}
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
+    assert not (tmp_path / "epo").exists()
@@ -0,0 +1,82 @@
+"""Logging
+
+The log file is written without making the threads that log wait for the disk: records go onto a
+queue through a ``QueueHandler``, and a ``QueueListener`` thread writes them out. With
+``LOG_FORMAT: json`` every line is a JSON object, and at DEBUG each request is logged with its
+timings, cache status and response size as fields (see ``log_request``). ``LOG_TO_FILE: false``
+turns the file off - records still propagate to the root logger, for applications that set up
+their own handlers.
+"""
+import atexit
+import datetime
+import json
+import logging
+import queue
+from logging.handlers import QueueHandler
+from logging.handlers import QueueListener
+
+TEXT_FORMAT = "%(asctime)s:%(levelname)s:%(name)s:%(message)s"
+FORMATS = ("text", "json")
+# Attributes every LogRecord has - anything else was passed in ``extra``
+RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord(dict()))) | {"message", "asctime"}
+
+request_logger = logging.getLogger("patent_client.requests")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: its time, level, logger, thread and message, and any fields
+    passed in ``extra``"""
+
+    def format(self, record):
+        data = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        data.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        if record.exc_info:
+            data["message"] += "\n" + self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class LogListener(QueueListener):
+    """A QueueListener that can safely be stopped more than once"""
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+def setup_logging(logger, level, filename=None, format="text"):
+    """Set ``logger``'s level and write its records to ``filename`` from a background thread.
+    Returns the QueueListener doing the writing, or None without a ``filename``"""
+    if format not in FORMATS:
+        raise ValueError(f"{format} is not a log format! Use one of {list(FORMATS)}")
+    logger.setLevel(level)
+    if filename is None:
+        return None
+    handler = logging.FileHandler(filename)
+    handler.setFormatter(JsonFormatter() if format == "json" else logging.Formatter(TEXT_FORMAT))
+    records = queue.SimpleQueue()
+    listener = LogListener(records, handler, respect_handler_level=True)
+    logger.addHandler(QueueHandler(records))
+    listener.start()
+    # Write out whatever is still queued when the process exits
+    atexit.register(listener.stop)
+    return listener
+
+
+def log_request(event):
+    """Metrics subscriber that logs every request at DEBUG, with the fields of its RequestEvent"""
+    if request_logger.isEnabledFor(logging.DEBUG):
+        request_logger.debug(
+            "%s %s %s (%s) in %.3fs",
+            event.method,
+            event.url,
+            event.status or event.error,
+            event.cache or "none",
+            event.total or 0,
+            extra=event.to_dict(),
+        )
@@ -0,0 +1,78 @@
+import json
+import logging
+from logging.handlers import QueueHandler
+
+import pytest
+
+from .log import JsonFormatter
+from .log import log_request
+from .log import request_logger
+from .log import setup_logging
+from .metrics import RequestEvent
+
+
+@pytest.fixture
+def test_logger():
+    logger = logging.getLogger("patent_client_log_test")
+    logger.propagate = False
+    yield logger
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+
+def test_records_are_written_from_a_queue(test_logger, tmp_path):
+    path = tmp_path / "test.log"
+    listener = setup_logging(test_logger, "INFO", path)
+    test_logger.info("Fetched %s", "US6013599")
+    test_logger.debug("Not written")
+    listener.stop()
+    lines = path.read_text().splitlines()
+    assert len(lines) == 1
+    assert lines[0].endswith(":INFO:patent_client_log_test:Fetched US6013599")
+
+
+def test_file_logging_can_be_turned_off(test_logger):
+    assert setup_logging(test_logger, "DEBUG", None) is None
+    assert not any(isinstance(handler, QueueHandler) for handler in test_logger.handlers)
+    assert test_logger.level == logging.DEBUG
+    with pytest.raises(ValueError):
+        setup_logging(test_logger, "DEBUG", None, format="xml")
+
+
+def test_json_lines_carry_extra_fields(test_logger, tmp_path):
+    path = tmp_path / "test.log"
+    listener = setup_logging(test_logger, "INFO", path, format="json")
+    test_logger.info("Fetched %s", "US6013599", extra={"ttfb": 0.25, "cache": "miss"})
+    try:
+        raise KeyError("boom")
+    except KeyError:
+        test_logger.exception("Failed")
+    listener.stop()
+    first, second = [json.loads(line) for line in path.read_text().splitlines()]
+    assert first["message"] == "Fetched US6013599"
+    assert first["level"] == "INFO"
+    assert first["logger"] == "patent_client_log_test"
+    assert (first["ttfb"], first["cache"]) == (0.25, "miss")
+    assert "args" not in first
+    assert second["message"].startswith("Failed\nTraceback")
+
+
+def test_requests_are_logged_with_timings():
+    records = list()
+    handler = logging.Handler()
+    handler.emit = records.append
+    request_logger.addHandler(handler)
+    level = request_logger.level
+    event = RequestEvent("GET", "https://ped.uspto.gov/api/queries", status=200, cache="miss", ttfb=0.2, total=0.3)
+    try:
+        request_logger.setLevel(logging.DEBUG)
+        log_request(event)
+        request_logger.setLevel(logging.INFO)
+        log_request(event)
+    finally:
+        request_logger.setLevel(level)
+        request_logger.removeHandler(handler)
+    assert len(records) == 1
+    assert records[0].getMessage() == "GET https://ped.uspto.gov/api/queries 200 (miss) in 0.300s"
+    formatted = json.loads(JsonFormatter().format(records[0]))
+    assert (formatted["status"], formatted["ttfb"], formatted["total"]) == (200, 0.2, 0.3)
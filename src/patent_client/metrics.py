@@ -0,0 +1,400 @@
+"""Request metrics
+
+Every request a session handles - answered from the cache or sent upstream - produces a RequestEvent,
+which is passed to each subscriber of the session's ``metrics``. ``MetricsAggregator`` keeps running
+totals and recent latencies for each endpoint in memory, ``prometheus_text`` renders them in the
+Prometheus text format, and ``OpenTelemetryExporter`` records events with an OpenTelemetry meter.
+``MetricsStore`` keeps events in an SQLite file, so that ``patent-client stats`` can report on
+requests made by earlier processes.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import closing
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import fields
+from pathlib import Path
+from urllib.parse import urlparse
+
+from patent_client.extras import optional_import
+from patent_client.hedge import LatencyTracker
+from patent_client.hedge import endpoint
+
+logger = logging.getLogger(__name__)
+
+# Upstream host -> the source its requests are reported under
+SOURCES = {
+    "ped.uspto.gov": "peds",
+    "developer.uspto.gov": "ptab",
+    "ppubs.uspto.gov": "public_search",
+    "assignment-api.uspto.gov": "assignment",
+    "gd-api2.uspto.gov": "global_dossier",
+    "ops.epo.org": "epo_ops",
+}
+PERCENTILES = (50, 95, 99)
+
+# The event for the request being handled in this thread (or asyncio task)
+_current = ContextVar("patent_client_request_event", default=None)
+
+
+def source(url):
+    host = urlparse(str(url)).hostname
+    return SOURCES.get(host, host)
+
+
+def response_size(response):
+    """Body size in bytes - of the content if it's been read, otherwise from Content-Length"""
+    content = getattr(response, "_content", None)
+    if isinstance(content, bytes):
+        return len(content)
+    length = response.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+@dataclass
+class RequestEvent:
+    """One request, as seen by the caller
+
+    ``cache`` is "hit", "stale" (served expired), "revalidated" (confirmed upstream), "coalesced"
+    (shared with an identical concurrent request), "miss", or "bypass" if the cache wasn't used.
+    Timings are in seconds. ``connect`` includes the DNS lookup, and is only set - like ``tls`` - if
+    a new connection had to be opened. ``ttfb`` runs from sending the request to its response
+    headers, and is None if nothing went upstream. ``total`` covers everything, retries included.
+    """
+
+    method: str
+    url: str
+    source: str = None
+    endpoint: str = None
+    status: int = None
+    cache: str = None
+    bytes: int = None
+    retries: int = 0
+    error: str = None
+    started: float = None
+    connect: float = None
+    tls: float = None
+    ttfb: float = None
+    total: float = None
+
+    def record_response(self, response, cache):
+        self.status = response.status_code
+        self.cache = self.cache or cache
+        self.bytes = response_size(response)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def record(overwrite=True, **values):
+    """Set values on the current request's event, if there is one. With ``overwrite=False``, only
+    values that haven't been set yet"""
+    event = _current.get()
+    if event is not None:
+        for key, value in values.items():
+            if overwrite or getattr(event, key) is None:
+                setattr(event, key, value)
+
+
+def httpx_trace():
+    """An httpx ``trace`` extension that records connect, TLS and time to first byte on the current
+    request's event. None if no request is being tracked"""
+    event = _current.get()
+    if event is None:
+        return None
+    start, started = time.monotonic(), dict()
+
+    def trace(name, info):
+        now = time.monotonic()
+        step, _, stage = name.rpartition(".")
+        if stage == "started":
+            started[step] = now
+        elif stage == "complete":
+            if step == "connection.connect_tcp":
+                event.connect = now - started.get(step, now)
+            elif step == "connection.start_tls":
+                event.tls = now - started.get(step, now)
+            elif step.endswith("receive_response_headers"):
+                event.ttfb = now - start
+
+    return trace
+
+
+class Metrics:
+    """Hands each RequestEvent to every subscriber. Subscribers are called in the thread that made
+    the request, so they should be quick; one that raises is logged and otherwise ignored"""
+
+    def __init__(self):
+        self.subscribers = tuple()
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """Call ``callback(event)`` for every request. Returns ``callback``, so it works as a decorator"""
+        with self._lock:
+            self.subscribers = (*self.subscribers, callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self.subscribers = tuple(s for s in self.subscribers if s is not callback)
+
+    @contextmanager
+    def track(self, method, url):
+        """Time the block as one request. Yields its RequestEvent - or None if nobody is subscribed"""
+        if not self.subscribers:
+            yield None
+            return
+        event = RequestEvent(method, str(url), source(url), endpoint(url), started=time.time())
+        token = _current.set(event)
+        start = time.monotonic()
+        try:
+            yield event
+        except Exception as e:
+            event.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            event.total = time.monotonic() - start
+            self.emit(event)
+
+    def emit(self, event):
+        for subscriber in self.subscribers:
+            try:
+                subscriber(event)
+            except Exception:
+                logger.warning("Metrics subscriber %r failed", subscriber, exc_info=True)
+
+
+class MetricsAggregator:
+    """Subscriber that keeps request counts, cache and status breakdowns, bytes, retries and the
+    latencies of the last ``window`` requests for each endpoint"""
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.latency = LatencyTracker(window)
+        self.totals = dict()
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            totals = self.totals.get(event.endpoint)
+            if totals is None:
+                totals = self.totals[event.endpoint] = {
+                    "source": event.source,
+                    "counts": Counter(),
+                    "cache": Counter(),
+                    "status": Counter(),
+                }
+            counts = totals["counts"]
+            counts["requests"] += 1
+            counts["errors"] += event.error is not None
+            counts["retries"] += event.retries
+            counts["bytes"] += event.bytes or 0
+            counts["seconds"] += event.total or 0
+            totals["cache"][event.cache or "none"] += 1
+            totals["status"][str(event.status) if event.status else "error"] += 1
+        self.latency.record(event.endpoint, event.total or 0)
+
+    def summary(self):
+        """For each endpoint: its source, request / error / retry counts, bytes, total seconds, cache
+        and status breakdowns, and p50 / p95 / p99 latency in seconds"""
+        with self._lock:
+            totals = {
+                key: (value["source"], dict(value["counts"]), dict(value["cache"]), dict(value["status"]))
+                for key, value in self.totals.items()
+            }
+        summary = dict()
+        for key, (source, counts, cache, status) in totals.items():
+            summary[key] = {"source": source, **counts, "cache": cache, "status": status}
+            for percentile in PERCENTILES:
+                summary[key][f"p{percentile}"] = self.latency.percentile(key, percentile)
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self.totals = dict()
+            self.latency = LatencyTracker(self.window)
+
+
+class MetricsStore:
+    """Subscriber that keeps every request in an SQLite file, so the numbers outlive the process
+    and add up across processes
+
+    Events are buffered in memory and written by a background thread every ``flush_every``
+    requests, so request threads never wait on SQLite, and when ``flush`` is called - the session
+    module calls it at exit. Requests that started more than ``retention`` seconds ago are dropped as
+    new ones are written.
+    """
+
+    columns = tuple(field.name for field in fields(RequestEvent))
+
+    def __init__(self, path, retention=None, flush_every=100):
+        self.path = Path(path)
+        self.retention = retention
+        self.flush_every = flush_every
+        self._buffer = list()
+        self._lock = threading.Lock()
+        self._full = threading.Event()
+        self._writer = None
+
+    def connect(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        con.execute(f"CREATE TABLE IF NOT EXISTS requests ({', '.join(self.columns)})")
+        con.execute("CREATE INDEX IF NOT EXISTS requests_started ON requests (started)")
+        return con
+
+    def __call__(self, event):
+        with self._lock:
+            self._buffer.append(tuple(getattr(event, column) for column in self.columns))
+            full = len(self._buffer) >= self.flush_every
+            if full and (self._writer is None or not self._writer.is_alive()):
+                self._writer = threading.Thread(
+                    target=self._run_writer, name="patent-client-metrics-writer", daemon=True
+                )
+                self._writer.start()
+        if full:
+            self._full.set()
+
+    def _run_writer(self):
+        while True:
+            self._full.wait()
+            self._full.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, list()
+        if not rows:
+            return
+        marks = ", ".join("?" * len(self.columns))
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with closing(self.connect()) as con, con:
+                con.executemany(f"INSERT INTO requests ({', '.join(self.columns)}) VALUES ({marks})", rows)
+                if self.retention:
+                    con.execute("DELETE FROM requests WHERE started < ?", (time.time() - self.retention,))
+        except sqlite3.Error:
+            logger.warning("Could not write %s request metrics to %s", len(rows), self.path, exc_info=True)
+
+    def events(self, since=None):
+        """Stored RequestEvents, oldest first - only those started at or after ``since`` if it's given"""
+        self.flush()
+        if not self.path.exists():
+            return
+        with closing(self.connect()) as con:
+            rows = con.execute(
+                f"SELECT {', '.join(self.columns)} FROM requests WHERE started >= ? ORDER BY started",
+                (since or 0,),
+            )
+            for row in rows:
+                yield RequestEvent(**dict(zip(self.columns, row)))
+
+    def summary(self, since=None, by="endpoint"):
+        """``MetricsAggregator.summary`` over the stored requests, with latency percentiles over all
+        of them. ``by="source"`` groups them by source instead of endpoint"""
+        aggregator = MetricsAggregator(window=None)
+        for event in self.events(since):
+            if by == "source":
+                event.endpoint = event.source
+            aggregator(event)
+        return aggregator.summary()
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def labels(**values):
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in values.items()) + "}"
+
+
+def prometheus_text(aggregator):
+    """The aggregator's numbers in the Prometheus text exposition format"""
+    summary = aggregator.summary()
+    lines = list()
+
+    def metric(name, kind, help, samples):
+        lines.extend([f"# HELP {name} {help}", f"# TYPE {name} {kind}"])
+        lines.extend(f"{name}{labels(**label_values)} {value}" for label_values, value in samples)
+
+    def per_endpoint(key):
+        return [
+            ({"source": stats["source"], "endpoint": name}, stats[key])
+            for name, stats in sorted(summary.items())
+            if key in stats
+        ]
+
+    metric(
+        "patent_client_requests_total",
+        "counter",
+        "Requests handled, by cache status",
+        [
+            ({"source": stats["source"], "endpoint": name, "cache": cache}, count)
+            for name, stats in sorted(summary.items())
+            for cache, count in sorted(stats["cache"].items())
+        ],
+    )
+    metric(
+        "patent_client_responses_total",
+        "counter",
+        "Responses, by HTTP status",
+        [
+            ({"source": stats["source"], "endpoint": name, "status": status}, count)
+            for name, stats in sorted(summary.items())
+            for status, count in sorted(stats["status"].items())
+        ],
+    )
+    metric("patent_client_request_errors_total", "counter", "Requests that raised", per_endpoint("errors"))
+    metric("patent_client_request_retries_total", "counter", "Retried attempts", per_endpoint("retries"))
+    metric("patent_client_response_bytes_total", "counter", "Response body bytes", per_endpoint("bytes"))
+    lines.extend(
+        [
+            "# HELP patent_client_request_duration_seconds Request latency, over recent requests",
+            "# TYPE patent_client_request_duration_seconds summary",
+        ]
+    )
+    for name, stats in sorted(summary.items()):
+        for percentile in PERCENTILES:
+            value = stats[f"p{percentile}"]
+            if value is not None:
+                label_values = labels(source=stats["source"], endpoint=name, quantile=percentile / 100)
+                lines.append(f"patent_client_request_duration_seconds{label_values} {value}")
+        label_values = labels(source=stats["source"], endpoint=name)
+        lines.append(f"patent_client_request_duration_seconds_sum{label_values} {stats['seconds']}")
+        lines.append(f"patent_client_request_duration_seconds_count{label_values} {stats['requests']}")
+    return "\n".join(lines) + "\n"
+
+
+class OpenTelemetryExporter:
+    """Subscriber that records every request with an OpenTelemetry meter - a request counter, a
+    latency histogram and a response size counter. Without a ``meter``, the global meter provider's
+    is used, which needs the ``otel`` extra (opentelemetry-api)"""
+
+    def __init__(self, meter=None):
+        if meter is None:
+            from patent_client.version import __version__
+
+            meter = optional_import("opentelemetry.metrics").get_meter("patent_client", __version__)
+        self.requests = meter.create_counter("patent_client.requests", unit="1", description="Requests handled")
+        self.duration = meter.create_histogram(
+            "patent_client.request.duration", unit="s", description="Request latency"
+        )
+        self.size = meter.create_counter("patent_client.response.size", unit="By", description="Response body bytes")
+
+    def __call__(self, event):
+        attributes = {
+            "source": event.source,
+            "endpoint": event.endpoint,
+            "method": event.method,
+            "status": event.status or 0,
+            "cache": event.cache or "none",
+        }
+        self.requests.add(1, attributes)
+        self.duration.record(event.total or 0, attributes)
+        if event.bytes:
+            self.size.add(event.bytes, attributes)
@@ -0,0 +1,176 @@
+import time
+
+import pytest
+
+from .metrics import Metrics
+from .metrics import MetricsAggregator
+from .metrics import MetricsStore
+from .metrics import OpenTelemetryExporter
+from .metrics import RequestEvent
+from .metrics import prometheus_text
+from .metrics import record
+
+
+def event(url="https://ped.uspto.gov/api/queries", total=0.1, **kwargs):
+    metrics = Metrics()
+    events = list()
+    metrics.subscribe(events.append)
+    with metrics.track("GET", url) as e:
+        for key, value in kwargs.items():
+            setattr(e, key, value)
+    (e,) = events
+    e.total = total
+    return e
+
+
+def test_events_are_emitted_to_subscribers():
+    metrics = Metrics()
+    events = list()
+    metrics.subscribe(events.append)
+    with metrics.track("GET", "https://ped.uspto.gov/api/applications/16123456/documents") as e:
+        record(retries=2, ttfb=0.05)
+    assert events == [e]
+    assert e.source == "peds"
+    assert e.endpoint == "ped.uspto.gov/api/applications/*/documents"
+    assert e.retries == 2 and e.ttfb == 0.05
+    assert e.total >= 0
+
+
+def test_no_subscribers_no_event():
+    with Metrics().track("GET", "https://ops.epo.org/3.2") as e:
+        record(retries=1)
+    assert e is None
+
+
+def test_errors_are_recorded_and_raised():
+    metrics = Metrics()
+    events = list()
+    metrics.subscribe(events.append)
+    with pytest.raises(ValueError):
+        with metrics.track("GET", "https://ops.epo.org/3.2"):
+            raise ValueError("bad")
+    assert events[0].error == "ValueError: bad"
+
+
+def test_failing_subscriber_is_ignored():
+    metrics = Metrics()
+    events = list()
+
+    @metrics.subscribe
+    def broken(event):
+        raise RuntimeError
+
+    metrics.subscribe(events.append)
+    with metrics.track("GET", "https://ops.epo.org/3.2"):
+        pass
+    assert len(events) == 1
+    metrics.unsubscribe(broken)
+    assert metrics.subscribers == (events.append,)
+
+
+def test_record_without_overwrite():
+    metrics = Metrics()
+    metrics.subscribe(lambda e: None)
+    with metrics.track("GET", "https://ops.epo.org/3.2") as e:
+        record(ttfb=1.0)
+        record(overwrite=False, ttfb=2.0, connect=0.5)
+    assert e.ttfb == 1.0 and e.connect == 0.5
+
+
+def test_aggregator_percentiles():
+    aggregator = MetricsAggregator()
+    for i in range(1, 101):
+        aggregator(event(total=i / 100, cache="miss" if i % 4 else "hit", status=200, bytes=10))
+    aggregator(event(url="https://ops.epo.org/3.2/rest-services/family", error="ConnectionError: boom", total=5))
+    stats = aggregator.summary()["ped.uspto.gov/api/queries"]
+    assert stats["source"] == "peds"
+    assert stats["requests"] == 100
+    assert stats["bytes"] == 1000
+    assert stats["cache"] == {"miss": 75, "hit": 25}
+    assert stats["status"] == {"200": 100}
+    assert (stats["p50"], stats["p95"], stats["p99"]) == (0.5, 0.95, 0.99)
+    family = aggregator.summary()["ops.epo.org/*/rest-services/family"]
+    assert family["errors"] == 1 and family["status"] == {"error": 1}
+    aggregator.reset()
+    assert aggregator.summary() == {}
+
+
+def test_prometheus_text():
+    aggregator = MetricsAggregator()
+    aggregator(event(cache="hit", status=200, bytes=512, total=0.25))
+    text = prometheus_text(aggregator)
+    labels = 'source="peds",endpoint="ped.uspto.gov/api/queries"'
+    assert "# TYPE patent_client_requests_total counter" in text
+    assert f'patent_client_requests_total{{{labels},cache="hit"}} 1' in text
+    assert f'patent_client_responses_total{{{labels},status="200"}} 1' in text
+    assert f"patent_client_response_bytes_total{{{labels}}} 512" in text
+    assert f'patent_client_request_duration_seconds{{{labels},quantile="0.99"}} 0.25' in text
+    assert f"patent_client_request_duration_seconds_count{{{labels}}} 1" in text
+
+
+class FakeInstrument:
+    def __init__(self, name):
+        self.name = name
+        self.values = list()
+
+    def add(self, value, attributes):
+        self.values.append((value, attributes))
+
+    record = add
+
+
+class FakeMeter:
+    def __init__(self):
+        self.instruments = dict()
+
+    def create_counter(self, name, **kwargs):
+        return self.instruments.setdefault(name, FakeInstrument(name))
+
+    create_histogram = create_counter
+
+
+def test_opentelemetry_exporter():
+    meter = FakeMeter()
+    exporter = OpenTelemetryExporter(meter)
+    exporter(event(cache="miss", status=200, bytes=100, total=0.3))
+    attributes = {
+        "source": "peds",
+        "endpoint": "ped.uspto.gov/api/queries",
+        "method": "GET",
+        "status": 200,
+        "cache": "miss",
+    }
+    assert meter.instruments["patent_client.requests"].values == [(1, attributes)]
+    assert meter.instruments["patent_client.request.duration"].values == [(0.3, attributes)]
+    assert meter.instruments["patent_client.response.size"].values == [(100, attributes)]
+
+
+def test_event_as_dict():
+    assert RequestEvent("GET", "https://ops.epo.org").to_dict()["retries"] == 0
+
+
+def test_store_keeps_events_across_processes(tmp_path):
+    path = tmp_path / "metrics.sqlite"
+    store = MetricsStore(path, retention=3600, flush_every=3)
+    old = event(total=0.5, cache="miss")
+    old.started -= 7200
+    store(old)
+    assert not path.exists()
+    for total in (0.1, 0.2):
+        store(event(total=total, cache="hit"))
+    # The writer thread flushes once the buffer is full. A store in another process sees what was
+    # flushed - the old event was dropped on the way
+    deadline = time.monotonic() + 5
+    stored = list()
+    while not stored and time.monotonic() < deadline:
+        stored = [e.total for e in MetricsStore(path).events()]
+    assert stored == [0.1, 0.2]
+    store(event(total=0.3, cache="hit"))
+    store.flush()
+    summary = MetricsStore(path).summary()["ped.uspto.gov/api/queries"]
+    assert (summary["requests"], summary["cache"], summary["p50"], summary["p99"]) == (3, {"hit": 3}, 0.2, 0.3)
+    store(event("https://ped.uspto.gov/api/queries/other", total=0.4))
+    by_source = store.summary(by="source")
+    assert list(by_source) == ["peds"]
+    assert by_source["peds"]["requests"] == 4
+    assert store.summary(since=time.time() + 1) == dict()
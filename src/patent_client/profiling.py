@@ -0,0 +1,183 @@
+"""Parse profiling
+
+With ``PATENT_CLIENT_PROFILE=parse`` in the environment (or after ``parse_profiler.enable()``), every
+schema a Manager loads is instrumented the first time it's used: the schema, each of its fields, and
+the schemas nested inside them are timed on every load, along with the memory blocks they leave
+allocated. A report ranking them by time spent in each - not counting what's nested inside - is
+printed to stderr when the process exits, or available from ``parse_profiler.report()``:
+
+    PATENT_CLIENT_PROFILE=parse python my_script.py
+
+Allocations are the change in ``sys.getallocatedblocks()``, i.e. blocks allocated and not yet freed
+when the load returns. The cost of measuring them is taken out of the times, but instrumented loads
+are still slower than normal ones, so compare the numbers with each other rather than with a run
+that isn't profiled.
+"""
+import atexit
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+from patent_client.settings import parse_list
+
+# Names of the profilers to turn on, e.g. PATENT_CLIENT_PROFILE=parse
+PROFILE = parse_list(os.environ.get("PATENT_CLIENT_PROFILE", ""))
+
+
+@dataclass
+class LoadStats:
+    name: str
+    kind: str
+    calls: int = 0
+    seconds: float = 0.0
+    self_seconds: float = 0.0
+    blocks: int = 0
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "calls": self.calls,
+            "seconds": self.seconds,
+            "self_seconds": self.self_seconds,
+            "blocks": self.blocks,
+        }
+
+
+class Frame:
+    __slots__ = ("children", "overhead")
+
+    def __init__(self):
+        self.children = 0.0
+        self.overhead = 0.0
+
+
+class ParseProfiler:
+    """Times yankee schema and field loads. See the module docstring"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stats = dict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __deepcopy__(self, memo):
+        # Managers deep copy their schemas, and instrumented ones carry a reference to the profiler
+        return self
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.stats = dict()
+
+    def instrument(self, schema):
+        """Time ``schema``, its fields, and everything nested in them, from now on. Done once per
+        schema; does nothing unless the profiler is enabled"""
+        if not self.enabled or getattr(schema, "_profiled", None) is self:
+            return
+        with self._lock:
+            self._instrument(schema, type(schema).__name__, "schema", set())
+
+    def _instrument(self, deserializer, name, kind, seen):
+        from yankee.base.deserializer import Deserializer
+        from yankee.base.schema import Schema
+
+        if not isinstance(deserializer, Deserializer) or id(deserializer) in seen:
+            return
+        seen.add(id(deserializer))
+        if getattr(deserializer, "_profiled", None) is not self:
+            deserializer.load = self.timed(deserializer.load, name, kind)
+            deserializer._profiled = self
+        if isinstance(deserializer, Schema):
+            for field_name, field in deserializer.fields.items():
+                self._instrument(field, f"{name}.{field_name}", "field", seen)
+        # Nested schemas are reported under their own names; fields nested in fields (the items of a
+        # List, say) under the field they're part of
+        for attribute, suffix in (("_schema", ""), ("item_schema", "[]"), ("key", ".key"), ("value", ".value")):
+            nested = getattr(deserializer, attribute, None)
+            if isinstance(nested, Schema):
+                self._instrument(nested, type(nested).__name__, "schema", seen)
+            else:
+                self._instrument(nested, f"{name}{suffix}", "field", seen)
+        for nested in getattr(deserializer, "schemas", ()):
+            self._instrument(nested, type(nested).__name__, "schema", seen)
+
+    def timed(self, load, name, kind):
+        stack = self._local
+        allocated_blocks, clock = sys.getallocatedblocks, time.perf_counter
+
+        def profiled_load(obj):
+            if not self.enabled:
+                return load(obj)
+            frames = getattr(stack, "frames", None)
+            if frames is None:
+                frames = stack.frames = list()
+            before = clock()
+            blocks = allocated_blocks()
+            frame = Frame()
+            frames.append(frame)
+            start = clock()
+            try:
+                return load(obj)
+            finally:
+                end = clock()
+                blocks = allocated_blocks() - blocks
+                frames.pop()
+                seconds = end - start - frame.overhead
+                if frames:
+                    parent = frames[-1]
+                    parent.children += seconds
+                    parent.overhead += frame.overhead + (start - before) + (clock() - end)
+                self.record(name, kind, seconds, seconds - frame.children, blocks)
+
+        return profiled_load
+
+    def record(self, name, kind, seconds, self_seconds, blocks):
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = LoadStats(name, kind)
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.self_seconds += self_seconds
+            stats.blocks += blocks
+
+    def ranked(self):
+        """Stats for every schema and field, most time spent in itself first"""
+        with self._lock:
+            stats = [LoadStats(**s.to_dict()) for s in self.stats.values()]
+        return sorted(stats, key=lambda s: s.self_seconds, reverse=True)
+
+    def report(self, limit=40):
+        ranked = self.ranked()
+        if not ranked:
+            return "No schema loads were profiled"
+        total = sum(s.self_seconds for s in ranked)
+        lines = [
+            f"Parse profile: {total * 1000:.1f}ms in {len(ranked)} schemas and fields",
+            f"{'rank':>4} {'self ms':>9} {'%':>5} {'total ms':>9} {'calls':>7} {'us/call':>8} {'blocks':>9}  name",
+        ]
+        for rank, s in enumerate(ranked[:limit], 1):
+            share = s.self_seconds / total * 100 if total else 0
+            per_call = s.seconds / s.calls * 1e6
+            lines.append(
+                f"{rank:>4} {s.self_seconds * 1000:>9.1f} {share:>5.1f} {s.seconds * 1000:>9.1f} {s.calls:>7} "
+                f"{per_call:>8.0f} {s.blocks:>9}  {s.name}{'' if s.kind == 'field' else ' (schema)'}"
+            )
+        return "\n".join(lines)
+
+
+parse_profiler = ParseProfiler(enabled="parse" in PROFILE)
+
+
+@atexit.register
+def print_report():
+    if parse_profiler.stats:
+        print(parse_profiler.report(), file=sys.stderr)
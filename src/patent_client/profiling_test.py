@@ -0,0 +1,71 @@
+from yankee.json import Schema
+from yankee.json import fields as f
+
+from .profiling import ParseProfiler
+from .util.base.manager import Manager
+
+
+class PartSchema(Schema):
+    number = f.Integer("number")
+
+
+class WidgetSchema(Schema):
+    name = f.String("name")
+    parts = f.List(PartSchema, "parts")
+
+
+def test_fields_and_nested_schemas_are_timed():
+    profiler = ParseProfiler(enabled=True)
+    schema = WidgetSchema()
+    profiler.instrument(schema)
+    result = schema.load({"name": "gear", "parts": [{"number": 1}, {"number": 2}]})
+    assert result.name == "gear"
+    assert [p.number for p in result.parts] == [1, 2]
+    stats = {s.name: s for s in profiler.ranked()}
+    assert {"WidgetSchema", "WidgetSchema.name", "WidgetSchema.parts", "PartSchema", "PartSchema.number"} <= set(stats)
+    assert stats["WidgetSchema"].calls == 1 and stats["WidgetSchema"].kind == "schema"
+    assert stats["PartSchema"].calls == 2
+    assert stats["PartSchema.number"].calls == 2
+    widget, parts = stats["WidgetSchema"], stats["WidgetSchema.parts"]
+    # Time nested in a field isn't counted as the schema's own
+    assert widget.seconds >= parts.seconds
+    assert widget.self_seconds <= widget.seconds - parts.seconds + 1e-6
+
+
+def test_disabled_profiler_does_nothing():
+    profiler = ParseProfiler()
+    schema = WidgetSchema()
+    profiler.instrument(schema)
+    schema.load({"name": "gear"})
+    assert profiler.ranked() == []
+    assert profiler.report() == "No schema loads were profiled"
+
+
+def test_report_ranks_by_self_time():
+    profiler = ParseProfiler(enabled=True)
+    schema = WidgetSchema()
+    profiler.instrument(schema)
+    for i in range(20):
+        schema.load({"name": f"gear {i}", "parts": [{"number": n} for n in range(i)]})
+    ranked = profiler.ranked()
+    assert [s.self_seconds for s in ranked] == sorted((s.self_seconds for s in ranked), reverse=True)
+    report = profiler.report(limit=5).splitlines()
+    assert report[0].startswith("Parse profile: ")
+    assert len(report) == 2 + 5
+    assert report[2].split()[7] == ranked[0].name
+
+
+def test_managers_instrument_their_schemas(monkeypatch):
+    profiler = ParseProfiler(enabled=True)
+    monkeypatch.setattr("patent_client.util.base.manager.parse_profiler", profiler)
+
+    class WidgetManager(Manager):
+        __schema__ = WidgetSchema
+
+        def _get_results(self):
+            yield self._load({"name": "gear"})
+
+    manager = WidgetManager()
+    assert next(iter(manager)).name == "gear"
+    assert next(iter(manager.filter(name="gear"))).name == "gear"
+    assert {s.name: s.calls for s in profiler.ranked()}["WidgetSchema.name"] == 2
@@ -0,0 +1,175 @@
+import datetime
+import logging
+import threading
+import time
+from collections import Counter
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Status codes that mean "slow down", and how long to back off if the server doesn't say
+THROTTLED_STATUS_CODES = (429, 503)
+DEFAULT_BACKOFF = 1.0
+
+
+def parse_retry_after(value):
+    """Retry-After is either a number of seconds or an HTTP date. Returns seconds, or None"""
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((when - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0.0)
+
+
+class TokenBucket:
+    """Paces callers to ``rate`` requests per second, allowing bursts of up to ``burst`` requests
+
+    Tokens are reserved rather than waited for, so concurrent callers queue up behind each
+    other instead of all waking up at the same moment.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token. Returns the number of seconds the caller must wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def cancel(self):
+        """Give back a token taken with ``reserve`` that won't be used after all"""
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+    def try_reserve(self):
+        """Take a token only if one is available right now"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1 or self.paused_until > now:
+                return False
+            self.tokens -= 1
+            return True
+
+    def set_rate(self, rate):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.rate = rate
+
+    def pause(self, seconds):
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class RateLimiter:
+    """Per-host token buckets, shared by every session
+
+    ``limits`` maps host names to requests per second. Hosts without a limit are only paced
+    when they push back with a 429 / 503. A policy registered for a host (see ``add_policy``)
+    can split the host into separately limited scopes and adjust the rates from response headers.
+    """
+
+    def __init__(self, limits=None, burst=1):
+        self.limits = {host: rate for host, rate in (limits or dict()).items() if rate}
+        self.burst = burst
+        self.policies = dict()
+        self.buckets = dict()
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def add_policy(self, host, policy):
+        self.policies[host] = policy
+
+    def bucket(self, host, scope=None, rate=None):
+        key = (host, scope)
+        with self._lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                rate = rate or (self.limits.get(host) if scope is None else None)
+                if rate is None:
+                    return None
+                bucket = self.buckets[key] = TokenBucket(rate, self.burst)
+            return bucket
+
+    def scope(self, url):
+        host = urlparse(str(url)).hostname
+        policy = self.policies.get(host)
+        return host, (policy.scope(str(url)) if policy is not None else None)
+
+    def acquire(self, url, timeout=None):
+        """Block until a request to ``url`` may be sent. Returns the seconds spent waiting
+
+        Raises TimeoutError straight away, without using up a token, if that would take longer
+        than ``timeout`` seconds.
+        """
+        host, scope = self.scope(url)
+        buckets = [b for b in (self.bucket(host), self.bucket(host, scope) if scope else None) if b is not None]
+        wait = max([bucket.reserve() for bucket in buckets], default=0.0)
+        if timeout is not None and wait > timeout:
+            for bucket in buckets:
+                bucket.cancel()
+            raise TimeoutError(f"Rate limit for {host} needs a {wait:.1f}s wait, more than the {timeout:.1f}s allowed")
+        if wait > 0:
+            logger.debug("Rate limiting %s: waiting %.2fs", host, wait)
+            with self._lock:
+                self.stats[f"{host}.waits"] += 1
+                self.stats[f"{host}.wait_seconds"] += wait
+            time.sleep(wait)
+        return wait
+
+    def try_acquire(self, url):
+        """Take a token for ``url`` if that can be done without waiting. Returns False otherwise"""
+        host, scope = self.scope(url)
+        buckets = [b for b in (self.bucket(host), self.bucket(host, scope) if scope else None) if b is not None]
+        reserved = list()
+        for bucket in buckets:
+            if not bucket.try_reserve():
+                # Give back the tokens already taken - no request is sent with them
+                for taken in reserved:
+                    taken.cancel()
+                return False
+            reserved.append(bucket)
+        return True
+
+    def update(self, url, response):
+        """Feed a response back so the limiter can follow the server's throttling signals"""
+        host, scope = self.scope(url)
+        if response.status_code in THROTTLED_STATUS_CODES:
+            backoff = parse_retry_after(response.headers.get("Retry-After"))
+            self.pause(host, DEFAULT_BACKOFF if backoff is None else backoff)
+        policy = self.policies.get(host)
+        if policy is not None:
+            policy.update(self, host, scope, response)
+
+    def pause(self, host, seconds, scope=None):
+        logger.info("Throttled by %s%s, pausing for %.1fs", host, f" ({scope})" if scope else "", seconds)
+        with self._lock:
+            self.stats[f"{host}.throttled"] += 1
+        bucket = self.bucket(host, scope) or self.bucket(host, scope, rate=float("inf"))
+        bucket.pause(seconds)
+
+    def set_rate(self, host, rate, scope=None):
+        bucket = self.bucket(host, scope, rate=rate)
+        if bucket.rate != rate:
+            logger.debug("Rate limit for %s%s is now %.2f/s", host, f" ({scope})" if scope else "", rate)
+            bucket.set_rate(rate)
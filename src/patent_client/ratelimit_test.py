@@ -0,0 +1,92 @@
+import time
+
+import pytest
+from patent_client.util.test import make_response
+
+from .ratelimit import RateLimiter
+from .ratelimit import TokenBucket
+from .settings import parse_rate
+
+
+def test_parse_rate():
+    assert parse_rate(None) is None
+    assert parse_rate("") is None
+    assert parse_rate(2) == 2.0
+    assert parse_rate("5/second") == 5.0
+    assert parse_rate("30/minute") == 0.5
+    assert parse_rate("100/10 seconds") == 10.0
+
+
+def test_token_bucket_allows_burst_then_paces():
+    bucket = TokenBucket(rate=10, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+    waits = [bucket.reserve() for _ in range(3)]
+    assert 0.05 < waits[0] <= 0.1
+    assert waits[0] < waits[1] < waits[2] <= 0.3
+
+
+def test_limiter_paces_configured_hosts_only():
+    limiter = RateLimiter({"slow.example.com": 20})
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire("https://slow.example.com/a")
+        limiter.acquire("https://fast.example.com/a")
+    assert 0.15 < time.monotonic() - start < 0.5
+    assert limiter.stats["slow.example.com.waits"] == 4
+    assert "fast.example.com.waits" not in limiter.stats
+
+
+def test_acquire_gives_up_instead_of_waiting_past_the_timeout():
+    limiter = RateLimiter({"slow.example.com": 2})
+    limiter.acquire("https://slow.example.com/a")
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        limiter.acquire("https://slow.example.com/a", timeout=0.1)
+    assert time.monotonic() - start < 0.1
+    # The token wasn't used up, so the next caller waits no longer than it would have
+    assert limiter.acquire("https://slow.example.com/a", timeout=1) <= 0.5
+
+
+def test_retry_after_pauses_host():
+    limiter = RateLimiter()
+    limiter.update("https://busy.example.com/a", make_response(429, {"Retry-After": "0.2"}))
+    start = time.monotonic()
+    limiter.acquire("https://busy.example.com/b")
+    assert time.monotonic() - start >= 0.15
+    assert limiter.stats["busy.example.com.throttled"] == 1
+
+
+class HalfRate:
+    def scope(self, url):
+        return url.rsplit("/", 1)[-1]
+
+    def update(self, limiter, host, scope, response):
+        limiter.set_rate(host, float(response.headers["X-Rate"]), scope=scope)
+
+
+def test_policy_sets_scoped_rates():
+    limiter = RateLimiter()
+    limiter.add_policy("api.example.com", HalfRate())
+    limiter.update("https://api.example.com/search", make_response(headers={"X-Rate": "20"}))
+    assert limiter.buckets[("api.example.com", "search")].rate == 20
+    assert limiter.acquire("https://api.example.com/other") == 0
+
+
+def test_try_acquire_never_waits():
+    limiter = RateLimiter({"slow.example.com": 1}, burst=2)
+    assert limiter.try_acquire("https://slow.example.com/a")
+    assert limiter.try_acquire("https://slow.example.com/a")
+    assert not limiter.try_acquire("https://slow.example.com/a")
+    assert limiter.try_acquire("https://fast.example.com/a")
+
+
+def test_try_acquire_gives_back_tokens_when_a_scope_is_out():
+    limiter = RateLimiter({"api.example.com": 0.01}, burst=2)
+    limiter.add_policy("api.example.com", HalfRate())
+    limiter.set_rate("api.example.com", 0.01, scope="search")
+    limiter.pause("api.example.com", 10, scope="search")
+    assert not limiter.try_acquire("https://api.example.com/search")
+    # The host's token was handed back, since no request was sent with it
+    assert limiter.buckets[("api.example.com", None)].tokens == pytest.approx(2)
+    assert limiter.try_acquire("https://api.example.com/other")
+    assert limiter.try_acquire("https://api.example.com/other")
@@ -0,0 +1,105 @@
+import logging
+import random
+
+from patent_client.ratelimit import parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# URL prefixes of POST endpoints that are safe to send twice (searches, not jobs)
+IDEMPOTENT_POSTS = list()
+
+
+def idempotent_post(url_prefix):
+    """Mark POSTs to ``url_prefix`` as safe to retry - e.g. search endpoints that take
+    their query as a POST body, but not endpoints that start a job"""
+    IDEMPOTENT_POSTS.append(url_prefix)
+
+
+def parse_statuses(value):
+    if isinstance(value, str):
+        value = value.replace(",", " ").split()
+    return tuple(int(v) for v in value)
+
+
+class RetryPolicy:
+    """How requests to one source are timed out and retried
+
+    Failed attempts - connection errors, timeouts, and responses with a status in ``statuses`` - are
+    retried up to ``retries`` times if the request is idempotent. The wait between attempts is the
+    server's ``Retry-After`` if it sent one, and otherwise decorrelated jitter: a random time between
+    ``backoff`` and three times the previous wait, capped at ``max_backoff``. No retry starts once
+    ``deadline`` seconds have passed since the first attempt.
+    """
+
+    def __init__(
+        self,
+        retries=4,
+        connect_timeout=10,
+        read_timeout=60,
+        backoff=0.5,
+        max_backoff=30,
+        deadline=300,
+        statuses=RETRY_STATUS_CODES,
+    ):
+        self.retries = retries
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.statuses = tuple(statuses)
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            retries=int(settings["RETRIES"]),
+            connect_timeout=float(settings["CONNECT_TIMEOUT"]),
+            read_timeout=float(settings["READ_TIMEOUT"]),
+            backoff=float(settings["BACKOFF"]),
+            max_backoff=float(settings["MAX_BACKOFF"]),
+            deadline=float(settings["DEADLINE"]),
+            statuses=parse_statuses(settings["STATUSES"]),
+        )
+
+    @property
+    def timeout(self):
+        """(connect, read) timeout, as accepted by requests"""
+        return (self.connect_timeout, self.read_timeout)
+
+    def is_idempotent(self, method, url):
+        method = str(method).upper()
+        return method in IDEMPOTENT_METHODS or (method == "POST" and str(url).startswith(tuple(IDEMPOTENT_POSTS)))
+
+    def should_retry(self, method, url, response):
+        """True if the attempt failed in a way worth retrying. ``response`` is None for errors"""
+        if response is not None and response.status_code not in self.statuses:
+            return False
+        return self.is_idempotent(method, url)
+
+    def wait(self, response=None, previous=None):
+        """Seconds to wait before the next attempt"""
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(retry_after, self.deadline)
+        previous = previous or self.backoff
+        return min(self.max_backoff, random.uniform(self.backoff, previous * 3))
+
+
+class RetryPolicies:
+    """A RetryPolicy for every host. The top level of ``settings`` is the default policy,
+    and any nested section named after a host overrides it for that host"""
+
+    def __init__(self, settings):
+        defaults = {k: v for k, v in settings.items() if not isinstance(v, dict)}
+        self.default = RetryPolicy.from_settings(defaults)
+        self.hosts = {
+            host: RetryPolicy.from_settings({**defaults, **overrides})
+            for host, overrides in settings.items()
+            if isinstance(overrides, dict)
+        }
+
+    def get(self, host):
+        return self.hosts.get(host, self.default)
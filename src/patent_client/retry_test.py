@@ -0,0 +1,48 @@
+from patent_client.util.test import make_response
+
+from .retry import IDEMPOTENT_POSTS
+from .retry import RetryPolicies
+from .retry import RetryPolicy
+
+SETTINGS = {
+    "RETRIES": 4,
+    "CONNECT_TIMEOUT": 10,
+    "READ_TIMEOUT": 60,
+    "BACKOFF": 0.5,
+    "MAX_BACKOFF": 30,
+    "DEADLINE": 300,
+    "STATUSES": "429, 500, 502, 503, 504",
+    "slow.example.com": {"READ_TIMEOUT": 120, "STATUSES": "415, 503"},
+}
+
+
+def test_per_host_overrides():
+    policies = RetryPolicies(SETTINGS)
+    assert policies.get("example.com").timeout == (10.0, 60.0)
+    assert policies.get("slow.example.com").timeout == (10.0, 120.0)
+    assert policies.get("slow.example.com").statuses == (415, 503)
+
+
+def test_only_idempotent_requests_are_retried(monkeypatch):
+    monkeypatch.setattr("patent_client.retry.IDEMPOTENT_POSTS", IDEMPOTENT_POSTS + ["https://example.com/search"])
+    policy = RetryPolicy()
+    assert policy.should_retry("GET", "https://example.com/doc", None)
+    assert policy.should_retry("GET", "https://example.com/doc", make_response(503))
+    assert not policy.should_retry("GET", "https://example.com/doc", make_response(404))
+    assert policy.should_retry("POST", "https://example.com/search?q=1", make_response(500))
+    assert not policy.should_retry("POST", "https://example.com/print", make_response(500))
+
+
+def test_decorrelated_jitter():
+    policy = RetryPolicy(backoff=1, max_backoff=10)
+    wait = None
+    for _ in range(20):
+        previous = wait or 1
+        wait = policy.wait(previous=wait)
+        assert 1 <= wait <= min(10, previous * 3)
+
+
+def test_retry_after_wins():
+    policy = RetryPolicy(backoff=1)
+    assert policy.wait(make_response(429, {"Retry-After": "7"})) == 7
+    assert policy.wait(make_response(429, {"Retry-After": "7000"})) == policy.deadline
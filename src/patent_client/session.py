@@ -1,24 +1,191 @@
+import atexit
+import copy
 import datetime
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import partial
 from pathlib import Path
+from urllib.parse import urlparse
 
+import requests
 import requests_cache
 from patent_client import SETTINGS
+from patent_client.cache import NegativeCache
+from patent_client.cache import PatentClientCache
+from patent_client.circuit import CircuitBreakers
+from patent_client.coalesce import SingleFlight
+from patent_client.concurrency import ConcurrencyLimiter
+from patent_client.deadlines import bounded_timeout
+from patent_client.deadlines import check_deadline
+from patent_client.deadlines import DeadlineExceeded
+from patent_client.deadlines import remaining
+from patent_client.hedge import Hedger
+from patent_client.log import log_request
+from patent_client.metrics import Metrics
+from patent_client.metrics import MetricsAggregator
+from patent_client.metrics import MetricsStore
+from patent_client.metrics import record
+from patent_client.ratelimit import RateLimiter
+from patent_client.retry import RetryPolicies
+from patent_client.settings import parse_bool
+from patent_client.settings import parse_days
+from patent_client.settings import parse_duration
+from patent_client.settings import parse_list
+from patent_client.settings import parse_rate
+from patent_client.transport import HTTPXAdapter
+from patent_client.transport import PooledAdapter
+from patent_client.transport import PoolPolicies
+from patent_client.transport import set_redirect
 from patent_client.version import __version__
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from requests.hooks import dispatch_hook
 
-max_age = SETTINGS.CACHE.MAX_AGE
+logger = logging.getLogger(__name__)
 
-if isinstance(max_age, str) and "day" in max_age.lower():
-    max_age = int(max_age.split()[0])
+max_age = parse_days(SETTINGS.CACHE.MAX_AGE)
+stale_ttl = parse_days(SETTINGS.CACHE.STALE_TTL)
+negative_ttl = parse_duration(SETTINGS.CACHE.NEGATIVE_TTL)
+
+rate_limiter = RateLimiter(
+    {host: parse_rate(rate) for host, rate in SETTINGS.RATE_LIMIT.items() if host != "BURST"},
+    burst=int(SETTINGS.RATE_LIMIT.get("BURST") or 1),
+)
+concurrency_limiter = ConcurrencyLimiter(
+    initial=int(SETTINGS.CONCURRENCY.INITIAL),
+    minimum=int(SETTINGS.CONCURRENCY.MIN),
+    maximum=int(SETTINGS.CONCURRENCY.MAX),
+    latency_tolerance=float(SETTINGS.CONCURRENCY.LATENCY_TOLERANCE),
+)
+# Upstream APIs, so that health() reports on them before they're first used
+UPSTREAM_HOSTS = (
+    "ped.uspto.gov",
+    "developer.uspto.gov",
+    "ppubs.uspto.gov",
+    "assignment-api.uspto.gov",
+    "gd-api2.uspto.gov",
+    "ops.epo.org",
+)
+circuit_breakers = CircuitBreakers(
+    UPSTREAM_HOSTS,
+    failure_threshold=int(SETTINGS.CIRCUIT_BREAKER.FAILURE_THRESHOLD),
+    reset_timeout=float(SETTINGS.CIRCUIT_BREAKER.RESET_TIMEOUT),
+    max_reset_timeout=float(SETTINGS.CIRCUIT_BREAKER.MAX_RESET_TIMEOUT),
+)
+
+
+def health():
+    """Circuit breaker state for each upstream host - "closed" is healthy, "open" means
+    requests are failing fast, and "half-open" means a trial request is in flight"""
+    return circuit_breakers.health()
+
+
+retry_policies = RetryPolicies(SETTINGS.RETRY)
+hedger = Hedger(
+    enabled=parse_bool(SETTINGS.HEDGE.ENABLED),
+    percentile=float(SETTINGS.HEDGE.PERCENTILE),
+    min_samples=int(SETTINGS.HEDGE.MIN_SAMPLES),
+    max_ratio=float(SETTINGS.HEDGE.MAX_RATIO),
+)
+# Every session reports its requests here; the aggregator keeps the numbers behind request_stats
+request_metrics = Metrics()
+metrics_aggregator = MetricsAggregator(window=int(SETTINGS.METRICS.WINDOW))
+if parse_bool(SETTINGS.METRICS.ENABLED):
+    request_metrics.subscribe(metrics_aggregator)
+# ... and, with METRICS.STORE set, the store keeps them on disk for ``patent-client stats``
+metrics_store = None
+if SETTINGS.METRICS.get("STORE"):
+    metrics_store = MetricsStore(
+        Path(SETTINGS.DEFAULT.BASE_DIR).expanduser() / SETTINGS.METRICS.STORE,
+        retention=parse_duration(SETTINGS.METRICS.RETENTION).total_seconds(),
+    )
+    if parse_bool(SETTINGS.METRICS.ENABLED):
+        request_metrics.subscribe(metrics_store)
+        atexit.register(metrics_store.flush)
+# At DEBUG, every request is logged along with its timings. log_request checks the level on each
+# request, so it picks up a level set after import
+request_metrics.subscribe(log_request)
+pool_policies = PoolPolicies.from_settings(SETTINGS.TRANSPORT)
+# Hosts sent through httpx, so they can share multiplexed HTTP/2 connections
+HTTP2_HOSTS = parse_list(SETTINGS.TRANSPORT.HTTP2_HOSTS) if parse_bool(SETTINGS.TRANSPORT.HTTP2) else list()
+# Adapters, and so connection pools, are shared by every session
+http_adapter = PooledAdapter(pool_policies)
+http2_adapter = HTTPXAdapter(pool_policies) if HTTP2_HOSTS else None
+# With TRANSPORT.REDIRECT_TO set, everything goes there instead - e.g. to a local fake server
+set_redirect(SETTINGS.TRANSPORT.get("REDIRECT_TO") or None)
+# Errors that mean the attempt never got a response, and may be retried
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+NEGATIVE_STATUS_CODES = (404, 410)
+# URL prefix -> function that returns True if a 200 response is an empty result
+EMPTY_RESULT_CHECKS = dict()
+
+
+def empty_result_check(url_prefix):
+    """Register a function that decides whether a successful response from ``url_prefix``
+    is an empty result. Empty results are cached with CACHE.NEGATIVE_TTL like 404s.
+
+    >>> @empty_result_check("https://example.com/search")
+    ... def no_hits(response):
+    ...     return response.json()["total"] == 0
+    """
+
+    def decorator(func):
+        EMPTY_RESULT_CHECKS[url_prefix] = func
+        return func
+
+    return decorator
+
+
+class CacheMissError(Exception):
+    """Raised in offline mode when a request can't be answered from the cache"""
+
+    pass
+
+
+# Sessions whose cache is bypassed in the current thread - see PatentClientSession.cache_disabled
+_cache_disabled = ContextVar("patent_client_cache_disabled", default=frozenset())
+
+_offline_lock = threading.Lock()
+_offline_depth = 0
+OFFLINE = parse_bool(SETTINGS.DEFAULT.get("OFFLINE"))
+
+
+def is_offline():
+    return OFFLINE or _offline_depth > 0
+
+
+@contextmanager
+def offline():
+    """Answer every request from the cache, on every session, for the duration of the block.
+    Anything that isn't cached raises CacheMissError instead of going to the network.
+    Set PATENT_CLIENT_OFFLINE=1 to run the whole process offline."""
+    global _offline_depth
+    with _offline_lock:
+        _offline_depth += 1
+    try:
+        yield
+    finally:
+        with _offline_lock:
+            _offline_depth -= 1
 
 
 class PatentClientSession(requests_cache.CachedSession):
+    revalidate_workers = 4
+
     def __init__(self):
         super().__init__(
-            Path(SETTINGS.DEFAULT.BASE_DIR).expanduser() / SETTINGS.CACHE.PATH,
+            backend=PatentClientCache(
+                Path(SETTINGS.DEFAULT.BASE_DIR).expanduser() / SETTINGS.CACHE.PATH,
+                max_size=SETTINGS.CACHE.MAX_SIZE,
+                eviction=SETTINGS.CACHE.EVICTION,
+                sweep_interval=SETTINGS.CACHE.SWEEP_INTERVAL,
+                stale_ttl=datetime.timedelta(days=stale_ttl).total_seconds(),
+            ),
             expire_after=datetime.timedelta(days=max_age),
-            backend="sqlite",
             allowable_methods=("GET", "POST"),
             ignored_parameters=[
                 "Authorization",
@@ -27,7 +194,297 @@ class PatentClientSession(requests_cache.CachedSession):
         self.headers[
             "User-Agent"
         ] = f"Mozilla/5.0 Python Patent Clientbot/{__version__} (parkerhancock@users.noreply.github.com)"
-        # Install a default retry on the session using urrlib3
-        retry = Retry(total=5, backoff_factor=0.2)
-        self.mount("https://", HTTPAdapter(max_retries=retry))
-        self.mount("http://", HTTPAdapter(max_retries=retry))
+
+        self.stale_while_revalidate = parse_bool(SETTINGS.CACHE.STALE_WHILE_REVALIDATE)
+        self.stale_ttl = datetime.timedelta(days=stale_ttl)
+        self._revalidating = set()
+        self._revalidate_lock = threading.Lock()
+        self._revalidator = None
+        self.negative_expire_after = negative_ttl
+        self.negative_cache = NegativeCache()
+        self.single_flight = SingleFlight()
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.circuit_breakers = circuit_breakers
+        self.retry_policies = retry_policies
+        self.hedger = hedger
+        self.metrics = request_metrics
+        self.metrics_aggregator = metrics_aggregator
+        self.pool_policies = pool_policies
+        self.mount_transports()
+
+    def mount_transports(self):
+        """Send requests through the shared adapters, whose connection pools are set up per host
+        by the TRANSPORT settings. Requests to TRANSPORT.HTTP2_HOSTS go through the HTTP/2 adapter"""
+        self.mount("https://", http_adapter)
+        self.mount("http://", http_adapter)
+        for host in HTTP2_HOSTS:
+            self.mount(f"https://{host}/", http2_adapter)
+
+    @property
+    def _disabled(self):
+        return self._disabled_everywhere or id(self) in _cache_disabled.get()
+
+    @_disabled.setter
+    def _disabled(self, value):
+        self._disabled_everywhere = value
+
+    @contextmanager
+    def cache_disabled(self):
+        """Bypass the cache for requests made inside the block. Unlike requests_cache's version this
+        only affects the current thread - other threads sharing the session keep using the cache"""
+        token = _cache_disabled.set(_cache_disabled.get() | {id(self)})
+        try:
+            yield
+        finally:
+            _cache_disabled.reset(token)
+
+    def vacuum(self):
+        """Remove expired entries and compact the cache file. Returns bytes reclaimed"""
+        return self.cache.vacuum()
+
+    def send(self, request, **kwargs):
+        with self.metrics.track(request.method, request.url) as event:
+            response = self._send(request, **kwargs)
+            if event is not None:
+                event.record_response(response, self.cache_status(response, event))
+        return response
+
+    def cache_status(self, response, event):
+        """How the cache handled ``response`` - see ``patent_client.metrics.RequestEvent``"""
+        if getattr(response, "from_cache", False):
+            if event.ttfb is not None:
+                return "revalidated"
+            return "stale" if getattr(response, "is_expired", False) else "hit"
+        return "bypass" if self._disabled else "miss"
+
+    def _send(self, request, **kwargs):
+        cache_key = self.cache.create_key(request, **kwargs)
+        if not self._disabled:
+            response = self.negative_cache.get(cache_key, request)
+            if response is not None:
+                logger.debug("Known missing: %s", request.url)
+                return dispatch_hook("response", request.hooks, response, **kwargs)
+        if is_offline():
+            return self.send_offline(request, cache_key, **kwargs)
+        if kwargs.get("stream"):
+            # A streamed body can only be read once, so it can't be shared
+            response = super().send(request, **kwargs)
+        else:
+            try:
+                response, shared = self.single_flight.do(
+                    cache_key, super().send, request, wait_timeout=remaining(), **kwargs
+                )
+            except TimeoutError as e:
+                if isinstance(e, DeadlineExceeded):
+                    raise
+                raise DeadlineExceeded(f"Ran out of time waiting for a concurrent request to {request.url}") from e
+            if shared:
+                logger.debug("Coalesced concurrent request for %s", request.url)
+                record(cache="coalesced")
+                return copy.copy(response)
+        # Checking a streamed response for empty results would read the body the caller is about to stream
+        if not self._disabled and not kwargs.get("stream") and self.is_negative(response):
+            expires = response.expires if response.from_cache else self.negative_expires()
+            self.negative_cache.add(cache_key, response, expires)
+        return response
+
+    def offline(self):
+        """Context manager that puts all sessions in offline mode. See ``patent_client.session.offline``"""
+        return offline()
+
+    def send_offline(self, request, cache_key, **kwargs):
+        # Expired responses are still served - offline, the cache is the only source of truth
+        response = None if self._disabled else self.cache.get_response(cache_key)
+        if response is None:
+            raise CacheMissError(f"{request.method} {request.url} is not cached and Patent Client is offline")
+        logger.debug("Offline, serving from cache: %s", request.url)
+        return dispatch_hook("response", request.hooks, response, **kwargs)
+
+    @property
+    def coalescing_stats(self):
+        """Requests actually sent vs. requests saved by coalescing identical in-flight requests"""
+        return dict(self.single_flight.stats)
+
+    @property
+    def hedging_stats(self):
+        """Requests eligible for hedging, how many were hedged, how often the hedge won, and how
+        many weren't hedged because the host's rate limit had no room"""
+        return dict(self.hedger.stats)
+
+    @property
+    def request_stats(self):
+        """Requests, errors, retries, bytes, cache and status breakdowns, and p50 / p95 / p99 latency
+        for each endpoint - see ``patent_client.metrics.MetricsAggregator``"""
+        return self.metrics_aggregator.summary()
+
+    @property
+    def pool_stats(self):
+        """Connection pool utilization for each host - see ``patent_client.transport.PoolStats``"""
+        stats = dict()
+        for adapter in self.adapters.values():
+            if hasattr(adapter, "pool_stats"):
+                for host, counters in adapter.pool_stats().items():
+                    stats.setdefault(host, counters)
+        return stats
+
+    @property
+    def concurrency_limits(self):
+        """Current number of concurrent requests allowed to each host"""
+        return self.concurrency_limiter.limits()
+
+    def is_negative(self, response):
+        """True if the response says the thing we looked up doesn't exist"""
+        if response.status_code in NEGATIVE_STATUS_CODES:
+            return True
+        if response.status_code != 200:
+            return False
+        for url_prefix, check in EMPTY_RESULT_CHECKS.items():
+            if str(response.url).startswith(url_prefix):
+                try:
+                    return bool(check(response))
+                except Exception:
+                    return False
+        return False
+
+    def negative_expires(self):
+        return datetime.datetime.utcnow() + self.negative_expire_after
+
+    def _is_cacheable(self, response, actions):
+        # Negative responses are cached too, but only for CACHE.NEGATIVE_TTL
+        if self.is_negative(response):
+            actions.expire_after = self.negative_expire_after
+            return not (
+                self._disabled or str(response.request.method) not in self.allowable_methods or actions.skip_write
+            )
+        return super()._is_cacheable(response, actions)
+
+    def send_upstream(self, method, url, send, *args, retry_errors=RETRY_ERRORS, hedge=True, **kwargs):
+        """Call ``send(*args, **kwargs)`` to put a request to ``url`` on the wire, guarded by the
+        host's circuit breaker, rate limit and concurrency limit, and retried per its RetryPolicy.
+        Idempotent requests are hedged if hedging is on, unless ``hedge`` is False"""
+        policy = self.retry_policies.get(urlparse(str(url)).hostname)
+        hedge = hedge and policy.is_idempotent(method, url)
+        start = time.monotonic()
+        attempt, wait = 0, None
+        while True:
+            try:
+                if hedge:
+                    response = self.hedger.run(
+                        url,
+                        partial(self._send_attempt, url, send, args, kwargs),
+                        partial(self._send_attempt, url, send, args, kwargs, acquire=False),
+                        partial(self.rate_limiter.try_acquire, url),
+                    )
+                else:
+                    response = self._send_attempt(url, send, args, kwargs)
+                error = None
+            except retry_errors as e:
+                check_deadline(f"{method} {url}")
+                response, error = None, e
+            if attempt >= policy.retries or not policy.should_retry(method, url, response):
+                break
+            wait = policy.wait(response, wait)
+            if time.monotonic() - start + wait > policy.deadline:
+                break
+            left = remaining()
+            if left is not None and left < wait:
+                reason = error or response.status_code
+                raise DeadlineExceeded(f"{method} {url} failed ({reason}) and there's no time left to retry")
+            attempt += 1
+            record(retries=attempt)
+            logger.info(
+                "Retrying %s %s in %.1fs (attempt %d): %s", method, url, wait, attempt, error or response.status_code
+            )
+            if response is not None:
+                response.close()
+            time.sleep(wait)
+        if error is not None:
+            raise error
+        return response
+
+    def _send_attempt(self, url, send, args, kwargs, acquire=True):
+        check_deadline(str(url))
+        with self.circuit_breakers.guard(url, ignore=(DeadlineExceeded,)) as guard, ExitStack() as stack:
+            # Waiting on the limiters counts against the deadline too
+            try:
+                if acquire:
+                    self.rate_limiter.acquire(url, timeout=remaining())
+                    check_deadline(str(url))
+                slot = stack.enter_context(self.concurrency_limiter.slot(url, timeout=remaining()))
+            except TimeoutError as e:
+                if isinstance(e, DeadlineExceeded):
+                    raise
+                raise DeadlineExceeded(f"Ran out of time waiting to send a request to {url}: {e}") from e
+            start = time.monotonic()
+            response = send(*args, **kwargs)
+            # Adapters that can tell when the headers arrived have set this already
+            record(overwrite=False, ttfb=time.monotonic() - start)
+            slot.record(response)
+            guard.record(response)
+        self.rate_limiter.update(url, response)
+        return response
+
+    def _send_and_cache(self, request, actions, cached_response=None, **kwargs):
+        # Everything that actually goes upstream passes through here. This is requests_cache's
+        # _send_and_cache, except that the attempts - retries, and hedges racing the original - only
+        # send, each its own copy of the request, and only the response that wins is cached
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.retry_policies.get(urlparse(request.url).hostname).timeout
+        request.headers.update(actions.validation_headers)
+        upstream = super(requests_cache.CacheMixin, self).send
+
+        def send(request, timeout=None, **kwargs):
+            # Called once per attempt, so each retry only gets the time that's left
+            return upstream(request.copy(), timeout=bounded_timeout(timeout), **kwargs)
+
+        hedge = not kwargs.get("stream")
+        response = self.send_upstream(request.method, request.url, send, request, hedge=hedge, **kwargs)
+        actions.update_from_response(response)
+        if self._is_cacheable(response, actions):
+            self.cache.save_response(response, actions.cache_key, actions.expires)
+        elif cached_response is not None and response.status_code == 304:
+            return self._update_revalidated_response(actions, response, cached_response)
+        else:
+            logger.debug("Skipping cache write for %s", request.url)
+        return requests_cache.set_response_defaults(response, actions.cache_key)
+
+    def _resend(self, request, actions, cached_response, **kwargs):
+        # Called by requests_cache whenever the cached response has expired. The resent request
+        # carries If-None-Match / If-Modified-Since if the upstream gave us validators, so an
+        # unchanged response comes back as a cheap 304.
+        staleness = datetime.datetime.utcnow() - cached_response.expires
+        if self.is_negative(cached_response) or not self.stale_while_revalidate or staleness > self.stale_ttl:
+            return super()._resend(request, actions, cached_response, **kwargs)
+        self.revalidate_in_background(request, actions, cached_response, **kwargs)
+        return cached_response
+
+    def revalidate_in_background(self, request, actions, cached_response, **kwargs):
+        with self._revalidate_lock:
+            if actions.cache_key in self._revalidating:
+                return None
+            self._revalidating.add(actions.cache_key)
+            if self._revalidator is None:
+                self._revalidator = ThreadPoolExecutor(
+                    max_workers=self.revalidate_workers, thread_name_prefix="patent-client-revalidate"
+                )
+        logger.debug("Serving stale response for %s while revalidating", request.url)
+        return self._revalidator.submit(self._revalidate, request.copy(), actions, cached_response, kwargs)
+
+    def _revalidate(self, request, actions, cached_response, kwargs):
+        try:
+            response = self._send_and_cache(request, actions, cached_response, **kwargs)
+            if response is not cached_response:
+                response.close()
+        except Exception:
+            logger.warning("Background revalidation of %s failed", request.url, exc_info=True)
+        finally:
+            with self._revalidate_lock:
+                self._revalidating.discard(actions.cache_key)
+
+    def wait_for_revalidation(self):
+        """Block until all background revalidations have finished"""
+        with self._revalidate_lock:
+            revalidator, self._revalidator = self._revalidator, None
+        if revalidator is not None:
+            revalidator.shutdown(wait=True)
@@ -0,0 +1,418 @@
+import datetime as dt
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from .cache import PatentClientCache
+from .circuit import CircuitBreakers
+from .circuit import CircuitOpenError
+from .concurrency import ConcurrencyLimiter
+from .deadlines import DeadlineExceeded
+from .deadlines import deadline
+from .epo.ops.session import OpsSession
+from .hedge import Hedger
+from .hedge import endpoint
+from .log import request_logger
+from .metrics import Metrics
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
+from .session import EMPTY_RESULT_CHECKS
+from .session import CacheMissError
+from .session import PatentClientSession
+from .session import empty_result_check
+from .session import is_offline
+from .session import offline
+
+
+class FakeAdapter(BaseAdapter):
+    """Answers every request with the same body, honoring If-None-Match"""
+
+    def __init__(self, etag='"v1"', body=b"hello", status=200):
+        super().__init__()
+        self.etag = etag
+        self.body = body
+        self.status = status
+        self.requests = list()
+        self.statuses = list()
+        self.gate = None
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        if self.gate is not None:
+            self.gate.wait(5)
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        response.headers["ETag"] = self.etag
+        if request.headers.get("If-None-Match") == self.etag:
+            response.status_code = 304
+            response._content = b""
+        else:
+            response.status_code = self.statuses.pop(0) if self.statuses else self.status
+            response._content = self.body
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def session(tmp_path):
+    session = PatentClientSession()
+    session.cache = PatentClientCache(tmp_path / "cache.sqlite", sweep_interval=0, stale_ttl=3600)
+    session.adapter = FakeAdapter()
+    session.mount("https://example.com", session.adapter)
+    session.rate_limiter = RateLimiter()
+    session.concurrency_limiter = ConcurrencyLimiter()
+    session.circuit_breakers = CircuitBreakers()
+    yield session
+    session.wait_for_revalidation()
+
+
+def expire(session, response):
+    cached = session.cache.get_response(response.cache_key)
+    cached.expires = dt.datetime.utcnow() - dt.timedelta(seconds=1)
+    session.cache.responses[response.cache_key] = cached
+
+
+def test_conditional_revalidation(session):
+    url = "https://example.com/doc"
+    first = session.get(url)
+    assert first.text == "hello"
+    expire(session, first)
+    response = session.get(url)
+    assert response.text == "hello"
+    assert session.adapter.requests[-1].headers["If-None-Match"] == '"v1"'
+    assert session.get(url).from_cache
+    assert len(session.adapter.requests) == 2
+
+
+def test_stale_while_revalidate(session):
+    session.stale_while_revalidate = True
+    url = "https://example.com/doc"
+    expire(session, session.get(url))
+    session.adapter.etag = '"v2"'
+    session.adapter.body = b"updated"
+
+    stale = session.get(url)
+    assert stale.from_cache and stale.is_expired
+    assert stale.text == "hello"
+
+    session.wait_for_revalidation()
+    assert session.adapter.requests[-1].headers["If-None-Match"] == '"v1"'
+    fresh = session.get(url)
+    assert fresh.from_cache and not fresh.is_expired
+    assert fresh.text == "updated"
+
+
+def test_too_stale_is_refetched_synchronously(session):
+    session.stale_while_revalidate = True
+    session.stale_ttl = dt.timedelta(seconds=0)
+    url = "https://example.com/doc"
+    expire(session, session.get(url))
+    session.adapter.body = b"updated"
+    session.adapter.etag = '"v2"'
+    assert session.get(url).text == "updated"
+
+
+def test_not_found_is_cached_briefly(session):
+    session.adapter.status = 404
+    url = "https://example.com/missing"
+    assert session.get(url).status_code == 404
+    entry = session.cache.get_response(session.get(url).cache_key)
+    assert entry.expires - entry.created_at <= session.negative_expire_after
+    assert len(session.adapter.requests) == 1
+
+
+def test_known_missing_skips_sqlite(session, monkeypatch):
+    session.adapter.status = 404
+    session.adapter.body = b"Not here"
+    url = "https://example.com/missing"
+    session.get(url)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Should not touch sqlite")
+
+    monkeypatch.setattr(session.cache, "get_response", fail)
+    response = session.get(url)
+    assert response.status_code == 404 and response.text == "Not here"
+    assert response.from_cache and response.url == url
+    assert len(session.adapter.requests) == 1
+
+
+def test_known_missing_gets_its_own_copy(session):
+    session.adapter.status = 404
+    url = "https://example.com/missing"
+    session.get(url)
+    first = session.get(url)
+    first.headers["X-Changed"] = "yes"
+    second = session.get(url)
+    assert first is not second
+    assert second.status_code == 404 and "X-Changed" not in second.headers
+    assert len(session.adapter.requests) == 1
+
+
+def test_known_missing_expires(session):
+    session.adapter.status = 404
+    url = "https://example.com/missing"
+    key = session.get(url).cache_key
+    session.negative_cache.add(key, session.get(url), dt.datetime.utcnow() - dt.timedelta(seconds=1))
+    assert session.negative_cache.get(key) is None
+    assert key not in session.negative_cache
+
+
+def test_empty_results_are_negative(session, monkeypatch):
+    monkeypatch.setitem(EMPTY_RESULT_CHECKS, "https://example.com/search", lambda r: r.text == "[]")
+    session.adapter.body = b"[]"
+    response = session.get("https://example.com/search?q=nothing")
+    assert session.is_negative(response)
+    assert response.cache_key in session.negative_cache
+    session.adapter.body = b"[1]"
+    response = session.get("https://example.com/search?q=something")
+    assert not session.is_negative(response)
+    assert response.cache_key not in session.negative_cache
+    # Streamed responses aren't read to check
+    session.adapter.body = b"[]"
+    response = session.get("https://example.com/search?q=streamed", stream=True)
+    assert response.cache_key not in session.negative_cache
+
+
+def test_identical_concurrent_requests_are_coalesced(session):
+    session.adapter.gate = threading.Event()
+    url = "https://example.com/slow"
+    with ThreadPoolExecutor(6) as pool:
+        futures = [pool.submit(session.get, url) for _ in range(6)]
+        while not session.adapter.requests:
+            time.sleep(0.01)
+        time.sleep(0.2)
+        session.adapter.gate.set()
+        responses = [f.result() for f in futures]
+    assert len(session.adapter.requests) == 1
+    assert all(r.text == "hello" for r in responses)
+    assert session.coalescing_stats["saved"] == 5
+
+
+def test_cache_disabled_only_in_this_thread(session):
+    url = "https://example.com/doc"
+    session.get(url)
+    with session.cache_disabled():
+        assert not session.get(url).from_cache
+        with ThreadPoolExecutor(1) as pool:
+            assert pool.submit(session.get, url).result().from_cache
+    assert session.get(url).from_cache
+    assert len(session.adapter.requests) == 2
+
+
+@pytest.fixture
+def events(session):
+    events = list()
+    session.metrics = Metrics()
+    session.metrics.subscribe(events.append)
+    return events
+
+
+def test_requests_are_measured(session, events, fast_retries):
+    url = "https://example.com/doc/12345"
+    session.adapter.statuses = [503]
+    first = session.get(url)
+    expire(session, first)
+    session.get(url)
+    session.get(url)
+    with session.cache_disabled():
+        session.get(url)
+    assert [e.cache for e in events] == ["miss", "revalidated", "hit", "bypass"]
+    assert [e.status for e in events] == [200, 200, 200, 200]
+    miss = events[0]
+    assert miss.endpoint == "example.com/doc/*"
+    assert miss.source == "example.com"
+    assert miss.retries == 1
+    assert miss.bytes == len(b"hello")
+    assert miss.ttfb is not None and miss.total >= miss.ttfb
+    assert events[2].ttfb is None
+
+
+def test_coalesced_requests_are_measured(session, events):
+    session.adapter.gate = threading.Event()
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(session.get, "https://example.com/slow") for _ in range(3)]
+        while not session.adapter.requests:
+            time.sleep(0.01)
+        time.sleep(0.2)
+        session.adapter.gate.set()
+        [f.result() for f in futures]
+    assert sorted(e.cache for e in events) == ["coalesced", "coalesced", "miss"]
+
+
+def test_request_stats(session):
+    session.get("https://example.com/stats-doc")
+    stats = session.request_stats["example.com/stats-doc"]
+    assert stats["requests"] >= 1
+    assert stats["p50"] is not None
+
+
+def test_requests_are_logged_at_debug_set_after_import(session):
+    records = list()
+    handler = logging.Handler()
+    handler.emit = records.append
+    level = request_logger.level
+    request_logger.addHandler(handler)
+    try:
+        request_logger.setLevel(logging.DEBUG)
+        session.get("https://example.com/logged")
+    finally:
+        request_logger.setLevel(level)
+        request_logger.removeHandler(handler)
+    assert [(r.url, r.status) for r in records] == [("https://example.com/logged", 200)]
+
+
+def test_offline_serves_from_cache(session):
+    url = "https://example.com/doc"
+    expire(session, session.get(url))
+    with session.offline():
+        response = session.get(url)
+        assert response.from_cache and response.text == "hello"
+        with pytest.raises(CacheMissError):
+            session.get("https://example.com/other")
+    assert len(session.adapter.requests) == 1
+    assert not is_offline()
+
+
+def test_offline_token_fetch_fails_fast():
+    ops = OpsSession(key="key", secret="secret")
+    with offline(), pytest.raises(CacheMissError):
+        ops.get_token()
+
+
+def test_failing_host_fails_fast(session, monkeypatch):
+    monkeypatch.setattr(session, "circuit_breakers", CircuitBreakers(failure_threshold=2, reset_timeout=60))
+    monkeypatch.setattr(session.retry_policies, "default", RetryPolicy(retries=0))
+    session.adapter.status = 503
+    session.get("https://example.com/a")
+    session.get("https://example.com/b")
+    with pytest.raises(CircuitOpenError):
+        session.get("https://example.com/c")
+    assert len(session.adapter.requests) == 2
+    assert session.circuit_breakers.health()["example.com"]["state"] == "open"
+
+
+def test_health_lists_upstreams():
+    import patent_client
+
+    assert {"ped.uspto.gov", "ops.epo.org", "ppubs.uspto.gov"} <= set(patent_client.health())
+
+
+@pytest.fixture
+def fast_retries(session, monkeypatch):
+    monkeypatch.setattr("patent_client.ratelimit.DEFAULT_BACKOFF", 0.01)
+    monkeypatch.setattr(session.retry_policies, "default", RetryPolicy(backoff=0.01, max_backoff=0.02))
+
+
+def test_transient_errors_are_retried(session, fast_retries):
+    session.adapter.statuses = [503, 502]
+    response = session.get("https://example.com/flaky")
+    assert response.status_code == 200
+    assert len(session.adapter.requests) == 3
+
+
+def test_posts_are_not_retried_unless_idempotent(session, fast_retries, monkeypatch):
+    session.adapter.statuses = [503]
+    assert session.post("https://example.com/print", data="x").status_code == 503
+    monkeypatch.setattr("patent_client.retry.IDEMPOTENT_POSTS", ["https://example.com/search"])
+    session.adapter.statuses = [503]
+    assert session.post("https://example.com/search", data="x").status_code == 200
+    assert len(session.adapter.requests) == 3
+
+
+def test_retries_stop_at_the_deadline(session, monkeypatch):
+    monkeypatch.setattr(session.retry_policies, "default", RetryPolicy(backoff=0.2, max_backoff=0.2, deadline=0.3))
+    session.adapter.status = 503
+    assert session.get("https://example.com/down").status_code == 503
+    assert len(session.adapter.requests) == 2
+
+
+def test_default_timeouts(session):
+    timeouts = list()
+    send = session.adapter.send
+    session.adapter.send = lambda request, **kwargs: timeouts.append(kwargs["timeout"]) or send(request, **kwargs)
+    session.get("https://example.com/doc")
+    assert timeouts == [session.retry_policies.default.timeout]
+
+
+def test_deadline_bounds_timeouts(session):
+    timeouts = list()
+    send = session.adapter.send
+    session.adapter.send = lambda request, **kwargs: timeouts.append(kwargs["timeout"]) or send(request, **kwargs)
+    with deadline(seconds=2):
+        session.get("https://example.com/doc")
+    connect, read = timeouts[0]
+    assert connect <= 2 and read <= 2
+
+
+def test_deadline_stops_retries(session, monkeypatch):
+    monkeypatch.setattr(session.retry_policies, "default", RetryPolicy(backoff=1, max_backoff=1))
+    session.adapter.status = 503
+    start = time.monotonic()
+    with deadline(seconds=0.5), pytest.raises(DeadlineExceeded):
+        session.get("https://example.com/down")
+    assert time.monotonic() - start < 0.5
+    assert len(session.adapter.requests) == 1
+
+
+def test_deadline_bounds_the_rate_limit_wait(session):
+    session.rate_limiter = RateLimiter({"example.com": 0.5})
+    session.get("https://example.com/a")
+    start = time.monotonic()
+    with deadline(seconds=0.2), pytest.raises(DeadlineExceeded):
+        session.get("https://example.com/b")
+    assert time.monotonic() - start < 0.2
+    assert len(session.adapter.requests) == 1
+    assert session.circuit_breakers.health()["example.com"]["consecutive_failures"] == 0
+
+
+def test_deadline_bounds_the_concurrency_wait(session):
+    session.concurrency_limiter = ConcurrencyLimiter(initial=1, maximum=1)
+    session.adapter.gate = threading.Event()
+    with ThreadPoolExecutor(1) as pool:
+        first = pool.submit(session.get, "https://example.com/a")
+        while not session.adapter.requests:
+            time.sleep(0.01)
+        start = time.monotonic()
+        with deadline(seconds=0.1), pytest.raises(DeadlineExceeded):
+            session.get("https://example.com/b")
+        assert time.monotonic() - start < 0.5
+        session.adapter.gate.set()
+        assert first.result().status_code == 200
+    assert len(session.adapter.requests) == 1
+
+
+def test_deadline_exceeded_before_sending(session):
+    with deadline(seconds=0), pytest.raises(DeadlineExceeded):
+        session.get("https://example.com/doc")
+    assert not session.adapter.requests
+    assert "example.com" not in session.circuit_breakers.health()
+
+
+def test_hedged_attempts_send_their_own_requests_and_only_the_winner_is_cached(session, monkeypatch):
+    url = "https://example.com/slow"
+    session.hedger = Hedger(enabled=True, min_samples=1, max_ratio=1)
+    session.hedger.latency.record(endpoint(url), 0.01)
+    delays = [0.3, 0]
+    send = session.adapter.send
+    session.adapter.send = lambda request, **kwargs: time.sleep(delays.pop(0)) or send(request, **kwargs)
+    saved = list()
+    save_response = session.cache.save_response
+    monkeypatch.setattr(
+        session.cache, "save_response", lambda response, *args: saved.append(response) or save_response(response, *args)
+    )
+    session.get(url)
+    time.sleep(0.4)
+    assert session.hedger.stats["hedge_wins"] == 1
+    # The adapter sees the hedge first - the original attempt is still asleep
+    hedge, primary = session.adapter.requests
+    assert hedge is not primary
+    assert [response.request for response in saved] == [hedge]
@@ -1,3 +1,4 @@
+import datetime
 import os
 from collections import defaultdict
 from pathlib import Path
@@ -40,6 +41,55 @@ def merge_settings(*settings):
     return output
 
 
+def parse_bool(value):
+    """Settings from the environment arrive as strings, so "0" / "false" / "no" are falsy"""
+    if isinstance(value, str):
+        return value.strip().lower() not in ("", "0", "false", "no", "off", "none")
+    return bool(value)
+
+
+DURATION_UNITS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400, "week": 604800}
+
+
+def parse_duration(value, unit="day"):
+    """Accepts a number of ``unit``s, or a string like "3", "3 days" or "30 minutes". Returns a timedelta"""
+    if isinstance(value, str):
+        number, *rest = value.strip().split() or ["0"]
+        if rest:
+            unit = rest[0].lower().rstrip("s")
+            if unit not in DURATION_UNITS:
+                raise ValueError(f"{value} is not a valid duration! Use one of {list(DURATION_UNITS)}")
+        value = number
+    return datetime.timedelta(seconds=float(value or 0) * DURATION_UNITS[unit])
+
+
+def parse_days(value):
+    """Accepts a number of days as an int, or a string like "3" or "3 days" """
+    return parse_duration(value).total_seconds() / DURATION_UNITS["day"]
+
+
+def parse_rate(value):
+    """Accepts requests per second as a number, or a string like "5/second" or "30/minute".
+    Returns requests per second, or None if the value is blank or 0 (no limit)"""
+    if isinstance(value, str):
+        count, _, per = value.strip().partition("/")
+        if not count:
+            return None
+        per = per.strip() or "second"
+        seconds = parse_duration(per if per[0].isdigit() else f"1 {per}").total_seconds()
+        value = float(count) / seconds
+    return float(value) if value else None
+
+
+def parse_list(value):
+    """Accepts a list, or a string of values separated by commas and/or spaces"""
+    if value is None:
+        return list()
+    if isinstance(value, str):
+        return value.replace(",", " ").split()
+    return list(value)
+
+
 def load_settings():
     return AttrDict.convert(
         merge_settings(
@@ -0,0 +1,153 @@
+"""Cache and request statistics
+
+``collect`` gathers what ``patent-client stats`` reports. For each source it reports:
+
+- the responses in the cache: how many there are, their size, how many have expired, and how old they are
+  (responses the cache sweeper hasn't indexed yet are only counted);
+- the requests in the metrics store (METRICS.STORE): how many there were, how many failed, how many the cache
+  answered, and latency percentiles.
+
+The slowest endpoints are listed separately. ``format_report`` renders the report as text tables.
+"""
+import time
+from pathlib import Path
+
+from patent_client import SETTINGS
+from patent_client.cache import AGE_BUCKETS
+from patent_client.cache import cache_stats
+from patent_client.metrics import PERCENTILES
+from patent_client.metrics import MetricsStore
+
+# Cache statuses that mean a request was answered without downloading the response again
+CACHE_HITS = ("hit", "stale")
+SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
+
+
+def default_cache_path():
+    return Path(SETTINGS.DEFAULT.BASE_DIR).expanduser() / SETTINGS.CACHE.PATH
+
+
+def default_store_path():
+    store = SETTINGS.METRICS.get("STORE")
+    return Path(SETTINGS.DEFAULT.BASE_DIR).expanduser() / store if store else None
+
+
+def hit_ratio(stats):
+    """Share of requests answered from the cache, or None if there weren't any"""
+    if not stats["requests"]:
+        return None
+    return sum(stats["cache"].get(status, 0) for status in CACHE_HITS) / stats["requests"]
+
+
+def request_stats(path, since=None):
+    """Request summaries from the metrics store at ``path``, by source and by endpoint, with hit ratios"""
+    if path is None or not Path(path).exists():
+        return dict(), dict()
+    store = MetricsStore(path)
+    sources, endpoints = store.summary(since, by="source"), store.summary(since)
+    for stats in (*sources.values(), *endpoints.values()):
+        stats["hit_ratio"] = hit_ratio(stats)
+    return sources, endpoints
+
+
+def collect(cache_path=None, store_path=None, since=None):
+    """The full report, as a JSON-serializable dict. ``since`` is a POSIX timestamp - only requests
+    started at or after it are counted. Paths default to the ones in the settings"""
+    cache_path = cache_path or default_cache_path()
+    store_path = store_path or default_store_path()
+    sources, endpoints = request_stats(store_path, since)
+    return {
+        "generated": time.time(),
+        "cache": {"path": str(cache_path), **cache_stats(cache_path)},
+        "requests": {
+            "path": str(store_path) if store_path else None,
+            "since": since,
+            "sources": sources,
+            "endpoints": endpoints,
+        },
+    }
+
+
+def format_size(size):
+    for unit in SIZE_UNITS[:-1]:
+        if abs(size) < 1024:
+            break
+        size /= 1024
+    else:
+        unit = SIZE_UNITS[-1]
+    return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+
+
+def format_seconds(seconds):
+    return "-" if seconds is None else f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+
+def format_ratio(ratio):
+    return "-" if ratio is None else f"{ratio:.1%}"
+
+
+def table(headers, rows):
+    """Rows of values as text columns - the first left-aligned, the rest right-aligned"""
+    rows = [headers, *[[str(value) for value in row] for row in rows]]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(headers))]
+    lines = list()
+    for first, *rest in rows:
+        values = [first.ljust(widths[0]), *(value.rjust(width) for value, width in zip(rest, widths[1:]))]
+        lines.append("  ".join(values))
+    return lines
+
+
+def format_report(report, top=10):
+    """The report as text tables: cached responses by source, requests by source, and the ``top``
+    slowest endpoints by p95 latency"""
+    ages = [label for _, label in AGE_BUCKETS]
+    percentiles = [f"p{percentile}" for percentile in PERCENTILES]
+    cache = report["cache"]
+    lines = [f"Cache: {cache['path']}"]
+    if cache["sources"]:
+        sources = sorted(cache["sources"].items())
+        total = {
+            key: sum(stats[key] for _, stats in sources) for key in ("entries", "bytes", "expired", "hits")
+        }
+        total["ages"] = {label: sum(stats["ages"][label] for _, stats in sources) for label in ages}
+        rows = [
+            [name, stats["entries"], format_size(stats["bytes"]), stats["expired"], stats["hits"]]
+            + [stats["ages"][label] for label in ages]
+            for name, stats in [*sources, ("total", total)]
+        ]
+        lines.extend(table(["source", "entries", "size", "expired", "hits", *ages], rows))
+    elif not cache["untracked"]:
+        lines.append("No cached responses")
+    if cache["untracked"]:
+        lines.append(f"{cache['untracked']} responses not indexed yet - the cache sweeper will add them")
+
+    requests = report["requests"]
+    window = f"since {time.strftime('%Y-%m-%d %H:%M', time.localtime(requests['since']))}" if requests["since"] else ""
+    lines.extend(["", f"Requests: {requests['path'] or 'not stored (METRICS.STORE is blank)'} {window}".rstrip()])
+    if requests["sources"]:
+        lines.extend(
+            table(
+                ["source", "requests", "errors", "hit ratio", "size", *percentiles],
+                [
+                    [name, stats["requests"], stats["errors"], format_ratio(stats["hit_ratio"])]
+                    + [format_size(stats["bytes"])]
+                    + [format_seconds(stats[key]) for key in percentiles]
+                    for name, stats in sorted(requests["sources"].items())
+                ],
+            )
+        )
+        slowest = sorted(requests["endpoints"].items(), key=lambda item: item[1]["p95"] or 0, reverse=True)[:top]
+        lines.extend(["", "Slowest endpoints, by p95"])
+        lines.extend(
+            table(
+                ["endpoint", "source", "requests", "hit ratio", *percentiles],
+                [
+                    [name, stats["source"], stats["requests"], format_ratio(stats["hit_ratio"])]
+                    + [format_seconds(stats[key]) for key in percentiles]
+                    for name, stats in slowest
+                ],
+            )
+        )
+    else:
+        lines.append("No requests recorded")
+    return "\n".join(lines)
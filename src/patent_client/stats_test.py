@@ -0,0 +1,63 @@
+import time
+
+import pytest
+import requests
+
+from .cache import PatentClientCache
+from .metrics import Metrics
+from .metrics import MetricsStore
+from .stats import collect
+from .stats import format_report
+from .stats import format_size
+
+
+@pytest.fixture
+def paths(tmp_path):
+    cache = PatentClientCache(tmp_path / "cache.sqlite", sweep_interval=0)
+    for i, url in enumerate(["https://ped.uspto.gov/api/queries", "https://ops.epo.org/3.2/rest-services/search"]):
+        response = requests.Response()
+        response.status_code, response.url, response._content = 200, url, b"x" * 2048
+        response.request = requests.Request("GET", url).prepare()
+        cache.save_response(response, f"key-{i}", None)
+    cache.flush()
+    store = MetricsStore(tmp_path / "metrics.sqlite")
+    metrics = Metrics()
+    metrics.subscribe(store)
+    for url, cache_status in [
+        ("https://ped.uspto.gov/api/queries", "hit"),
+        ("https://ped.uspto.gov/api/queries", "miss"),
+        ("https://ops.epo.org/3.2/rest-services/search", "miss"),
+    ]:
+        with metrics.track("GET", url) as event:
+            event.cache, event.status = cache_status, 200
+    store.flush()
+    return cache.db_path, store.path
+
+
+def test_collect(paths):
+    report = collect(*paths)
+    assert report["cache"]["sources"]["peds"]["entries"] == 1
+    assert report["cache"]["sources"]["epo_ops"]["ages"]["<1h"] == 1
+    assert report["cache"]["untracked"] == 0
+    peds = report["requests"]["sources"]["peds"]
+    assert (peds["requests"], peds["hit_ratio"]) == (2, 0.5)
+    assert peds["p50"] is not None
+    assert report["requests"]["endpoints"]["ops.epo.org/*/rest-services/search"]["source"] == "epo_ops"
+    assert collect(*paths, since=time.time() + 60)["requests"]["sources"] == dict()
+
+
+def test_format_report(paths, tmp_path):
+    lines = format_report(collect(*paths)).splitlines()
+    assert lines[0] == f"Cache: {paths[0]}"
+    assert lines[1].split() == ["source", "entries", "size", "expired", "hits", "<1h", "<1d", "<7d", "<30d", ">=30d"]
+    assert lines[4].split()[:2] == ["total", "2"]
+    assert "50.0%" in [line for line in lines if line.startswith("peds ")][1]
+    assert "Slowest endpoints, by p95" in lines
+    empty = format_report(collect(tmp_path / "missing.sqlite", tmp_path / "missing.sqlite"))
+    assert "No cached responses" in empty and "No requests recorded" in empty
+
+
+def test_format_size():
+    assert format_size(512) == "512 B"
+    assert format_size(1536) == "1.5 KB"
+    assert format_size(3 * 1024**3) == "3.0 GB"
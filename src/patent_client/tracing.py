@@ -0,0 +1,231 @@
+"""Span tracing
+
+Spans time the steps behind a call - iterating a Manager, fetching a page of results, loading a
+schema, following a related object, downloading a document, merging PDFs, and every HTTP request -
+and nest, so a slow attribute access can be broken down into the requests and parsing behind it.
+Nothing is recorded unless a trace is:
+
+    from patent_client import tracing
+
+    with tracing.record() as trace:
+        app.expiration
+    print(trace)
+    trace.save("expiration.json")
+
+The saved file is in the Chrome trace format - open it in chrome://tracing, Perfetto or speedscope
+for a timeline / flame graph.
+"""
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from dataclasses import field
+
+# The innermost open span in this thread (or asyncio task)
+_current = ContextVar("patent_client_span", default=None)
+# Traces being recorded. Spans are only created while there is at least one
+_traces = tuple()
+_lock = threading.Lock()
+
+
+@dataclass(eq=False)
+class Span:
+    name: str
+    attributes: dict = field(default_factory=dict)
+    parent: "Span" = None
+    start: float = field(default_factory=time.time)
+    duration: float = None
+    thread: int = field(default_factory=threading.get_ident)
+    error: str = None
+    children: list = field(default_factory=list)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+class Trace:
+    """The spans recorded by ``record()``"""
+
+    def __init__(self):
+        self.spans = list()
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    @property
+    def roots(self):
+        """Spans whose parent isn't part of this trace"""
+        spans = set(self.spans)
+        return [s for s in self.spans if s.parent not in spans]
+
+    def to_chrome(self):
+        """The trace as a Chrome trace (Trace Event Format) dict"""
+        pid = os.getpid()
+        events = list()
+        for span in self.spans:
+            if span.duration is None:
+                continue
+            args = dict(span.attributes)
+            if span.error is not None:
+                args["error"] = span.error
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.name.split(".")[0],
+                    "ph": "X",
+                    "ts": span.start * 1e6,
+                    "dur": span.duration * 1e6,
+                    "pid": pid,
+                    "tid": span.thread,
+                    "args": args,
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self, path):
+        """Write the trace to ``path`` in the Chrome trace format"""
+        with open(path, "w") as f:
+            json.dump(self.to_chrome(), f, default=str)
+        return path
+
+    def __str__(self):
+        lines = list()
+
+        def add(span, depth):
+            duration = "running" if span.duration is None else f"{span.duration * 1000:.1f}ms"
+            attributes = " ".join(f"{k}={v}" for k, v in span.attributes.items())
+            lines.append(f"{'  ' * depth}{span.name} {duration} {attributes}".rstrip())
+            for child in span.children:
+                add(child, depth + 1)
+
+        for root in self.roots:
+            add(root, 0)
+        return "\n".join(lines)
+
+
+def is_recording():
+    return bool(_traces)
+
+
+def _open(name, attributes, parent=None, start=None):
+    span = Span(name, attributes, parent if parent is not None else _current.get())
+    if start is not None:
+        span.start = start
+    if span.parent is not None:
+        span.parent.children.append(span)
+    for trace in _traces:
+        trace.add(span)
+    return span
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time the block as a span, nested under the current one. Yields the Span, or None when no
+    trace is being recorded"""
+    if not _traces:
+        yield None
+        return
+    s = _open(name, attributes)
+    token = _current.set(s)
+    start = time.perf_counter()
+    try:
+        yield s
+    except Exception as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        s.duration = time.perf_counter() - start
+
+
+def traced(name, **attributes):
+    """Decorator that runs the function in a span"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, function=func.__qualname__, **attributes):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def traced_iter(name, iterable, **attributes):
+    """Iterate over ``iterable`` in a span that lasts until it's exhausted (or abandoned). The span is
+    only current while the iterable is producing the next item, so work done by the caller in between
+    isn't attributed to it"""
+    if not _traces:
+        yield from iterable
+        return
+    s = _open(name, attributes)
+    iterator = iter(iterable)
+    start, count = time.perf_counter(), 0
+    try:
+        while True:
+            token = _current.set(s)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            except Exception as e:
+                s.error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                _current.reset(token)
+            count += 1
+            yield item
+    finally:
+        s.set(items=count)
+        s.duration = time.perf_counter() - start
+
+
+def fingerprint(*parts):
+    """A short, stable id for a query, so spans for the same query can be matched up"""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:12]
+
+
+def request_span(event):
+    """Metrics subscriber that records each HTTP request as a span"""
+    if not _traces:
+        return
+    s = _open(
+        f"http.{event.method}",
+        {
+            "endpoint": event.endpoint,
+            "status": event.status,
+            "cache": event.cache,
+            "bytes": event.bytes,
+            "retries": event.retries,
+        },
+        start=event.started,
+    )
+    s.duration, s.error = event.total, event.error
+
+
+@contextmanager
+def record():
+    """Record a trace of everything done inside the block, in every thread"""
+    global _traces
+    from patent_client.session import request_metrics
+
+    trace = Trace()
+    with _lock:
+        if not _traces:
+            request_metrics.subscribe(request_span)
+        _traces = (*_traces, trace)
+    try:
+        yield trace
+    finally:
+        with _lock:
+            _traces = tuple(t for t in _traces if t is not trace)
+            if not _traces:
+                request_metrics.unsubscribe(request_span)
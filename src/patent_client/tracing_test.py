@@ -0,0 +1,152 @@
+import json
+
+import pytest
+
+from .metrics import RequestEvent
+from .session import request_metrics
+from .tracing import Span
+from .tracing import is_recording
+from .tracing import record
+from .tracing import span
+from .tracing import traced
+from .tracing import traced_iter
+from .util.base.manager import Manager
+
+
+class Schema:
+    def load(self, data):
+        with span("parse"):
+            return {"value": data}
+
+
+class NumberManager(Manager):
+    __schema__ = Schema
+
+    def _get_results(self):
+        for page in range(2):
+            with self._page(page):
+                items = [page * 2, page * 2 + 1]
+            for item in items:
+                yield self._load(item)
+
+
+def names(spans):
+    return [s.name for s in spans]
+
+
+def test_nothing_is_recorded_by_default():
+    with span("outside") as s:
+        pass
+    assert s is None
+    assert not is_recording()
+
+
+def test_spans_nest():
+    with record() as trace:
+        with span("outer", query="abc") as outer:
+            with span("inner"):
+                pass
+        with span("sibling"):
+            pass
+    assert names(trace.roots) == ["outer", "sibling"]
+    assert names(outer.children) == ["inner"]
+    assert outer.attributes == {"query": "abc"}
+    assert outer.duration >= outer.children[0].duration
+
+
+def test_errors_are_recorded():
+    with record() as trace, pytest.raises(ValueError):
+        with span("failing"):
+            raise ValueError("bad")
+    assert trace.spans[0].error == "ValueError: bad"
+
+
+def test_traced_decorator():
+    @traced("download", source="test")
+    def download(path):
+        return path
+
+    with record() as trace:
+        assert download("a.pdf") == "a.pdf"
+    (s,) = trace.spans
+    assert s.attributes == {"function": "test_traced_decorator.<locals>.download", "source": "test"}
+
+
+def test_iteration_span_only_covers_the_iterable():
+    def numbers():
+        for i in range(2):
+            with span("produce"):
+                yield i
+
+    with record() as trace:
+        for i in traced_iter("iterate", numbers()):
+            with span("consume"):
+                pass
+    iterate = trace.roots[0]
+    assert names(trace.roots) == ["iterate", "consume", "consume"]
+    assert names(iterate.children) == ["produce", "produce"]
+    assert iterate.attributes["items"] == 2
+
+
+def test_manager_iteration_is_traced():
+    manager = NumberManager().filter(number=1)
+    with record() as trace:
+        assert [r["value"] for r in manager] == [0, 1, 2, 3]
+    (iterate,) = trace.roots
+    assert iterate.name == "manager.iterate"
+    assert iterate.attributes["query"] == manager.config.fingerprint()
+    assert names(iterate.children) == ["manager.page", "schema.load", "schema.load"] * 2
+    assert [c.attributes["page"] for c in iterate.children if c.name == "manager.page"] == [0, 1]
+    assert iterate.children[1].attributes == {"schema": "Schema"}
+    assert names(iterate.children[1].children) == ["parse"]
+
+
+def test_fingerprint_identifies_the_query():
+    manager = NumberManager()
+    assert manager.filter(a=1).config.fingerprint() == manager.filter(a=1).config.fingerprint()
+    assert manager.filter(a=1).config.fingerprint() != manager.filter(a=2).config.fingerprint()
+
+
+def test_requests_become_spans():
+    event = RequestEvent("GET", "https://ped.uspto.gov/api/queries", endpoint="ped.uspto.gov/api/queries")
+    event.started, event.total, event.status, event.cache = 100.0, 0.5, 200, "miss"
+    with record() as trace:
+        with span("manager.page") as page:
+            request_metrics.emit(event)
+    (request,) = page.children
+    assert request.name == "http.GET"
+    assert request.attributes["endpoint"] == "ped.uspto.gov/api/queries"
+    assert request.attributes["cache"] == "miss"
+    assert (request.start, request.duration) == (100.0, 0.5)
+    assert request_span_unsubscribed()
+
+
+def request_span_unsubscribed():
+    from .tracing import request_span
+
+    return request_span not in request_metrics.subscribers
+
+
+def test_chrome_trace(tmp_path):
+    with record() as trace:
+        with span("outer", page=1):
+            pass
+    trace.add(Span("still running"))
+    path = trace.save(tmp_path / "trace.json")
+    events = json.loads(path.read_text())["traceEvents"]
+    outer = next(e for e in events if e["name"] == "outer")
+    assert outer["ph"] == "X"
+    assert outer["args"] == {"page": 1}
+    assert outer["dur"] >= 0
+    # Spans that never finished are left out
+    assert [e["name"] for e in events] == ["outer"]
+
+
+def test_trace_as_text():
+    with record() as trace:
+        with span("outer", page=1):
+            with span("inner"):
+                pass
+    lines = str(trace).splitlines()
+    assert lines[0].startswith("outer ") and lines[0].endswith(" page=1")
+    assert lines[1].startswith("  inner ")
@@ -0,0 +1,450 @@
+"""Transports for the requests-based sessions
+
+Sessions send through ``PooledAdapter`` - requests' own urllib3-based adapter, HTTP/1.1, one
+request per connection at a time, with connection pools sized and kept alive per host.
+``HTTPXAdapter`` is a drop-in replacement that sends through a pooled httpx client instead, so that
+concurrent requests to a host that speaks HTTP/2 are multiplexed over a handful of connections
+rather than each waiting for a free one. Responses come back as ordinary ``requests.Response``
+objects, so caching, retries and everything else work unchanged. httpx is only imported once
+HTTPXAdapter sends its first request.
+
+Both adapters - and the Public Search client's transport - send to ``redirect_url(url)`` instead of
+the real host while requests are redirected (see ``redirect``), e.g. to a local fake server.
+"""
+import functools
+import io
+import logging
+import threading
+import time
+from collections import Counter
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from urllib.parse import urlsplit
+
+import requests
+import urllib3
+from patent_client.deadlines import bounded_timeout
+from patent_client.extras import optional_import
+from patent_client.metrics import httpx_trace
+from patent_client.metrics import record
+from patent_client.settings import parse_bool
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+from urllib3._collections import HTTPHeaderDict
+from urllib3.exceptions import EmptyPoolError
+
+logger = logging.getLogger(__name__)
+
+# Connection-level headers belong to requests' HTTP/1.1 connections, and are illegal in HTTP/2.
+# httpx manages its own connections
+HOP_BY_HOP_HEADERS = ("connection", "keep-alive", "proxy-connection", "transfer-encoding", "upgrade")
+
+# Base URL that every request is sent to instead of its own host - see redirect()
+_redirect_to = None
+_redirect_lock = threading.Lock()
+
+
+def set_redirect(base_url):
+    """Send every session's requests to ``base_url`` (None to stop), with the host each was meant for as
+    the first segment of the path: https://ops.epo.org/3.2/rest-services/... is sent to
+    {base_url}/ops.epo.org/3.2/rest-services/... Only the wire is redirected - rate limits, circuit
+    breakers, caching and metrics still see the original URL, and so does the response.
+    TRANSPORT.REDIRECT_TO sets this for the whole process"""
+    global _redirect_to
+    with _redirect_lock:
+        previous, _redirect_to = _redirect_to, base_url.rstrip("/") if base_url else None
+    return previous
+
+
+@contextmanager
+def redirect(base_url):
+    """Redirect every session's requests to ``base_url`` for the duration of the block. See ``set_redirect``"""
+    previous = set_redirect(base_url)
+    try:
+        yield
+    finally:
+        set_redirect(previous)
+
+
+def redirect_url(url):
+    """Where a request to ``url`` is actually sent - None unless requests are being redirected"""
+    base_url = _redirect_to
+    if base_url is None:
+        return None
+    parts = urlsplit(str(url))
+    return f"{base_url}/{parts.netloc}{parts.path}{'?' + parts.query if parts.query else ''}"
+
+
+def to_httpx_timeout(timeout, pool=None):
+    """Convert a requests-style timeout - a number, a (connect, read) tuple or None"""
+    import httpx
+
+    connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+    return httpx.Timeout(connect=connect, read=read, write=read, pool=bounded_timeout(pool))
+
+
+class PoolPolicy:
+    """How connections to one host are pooled
+
+    Up to ``size`` connections are kept open for reuse, each for at most ``keepalive_expiry`` idle
+    seconds. When all of them are busy, a request either waits up to ``timeout`` seconds for one to
+    free up (``block``), or opens an extra connection that is closed once the request is done.
+    """
+
+    def __init__(self, size=10, block=False, timeout=30, keepalive_expiry=30):
+        self.size = size
+        self.block = block
+        self.timeout = timeout
+        self.keepalive_expiry = keepalive_expiry
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            size=int(settings["POOL_SIZE"]),
+            block=parse_bool(settings["POOL_BLOCK"]),
+            timeout=float(settings["POOL_TIMEOUT"]),
+            keepalive_expiry=float(settings["KEEPALIVE_EXPIRY"]),
+        )
+
+    def httpx_limits(self):
+        import httpx
+
+        return httpx.Limits(
+            max_connections=self.size if self.block else None,
+            max_keepalive_connections=self.size,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+class PoolPolicies:
+    """A PoolPolicy for every host. Like RetryPolicies, the top level of ``settings`` is the default,
+    and any nested section named after a host overrides it for that host"""
+
+    def __init__(self, default=None, hosts=None):
+        self.default = default or PoolPolicy()
+        self.hosts = hosts or dict()
+
+    @classmethod
+    def from_settings(cls, settings):
+        defaults = {k: v for k, v in settings.items() if not isinstance(v, dict)}
+        hosts = {
+            host: PoolPolicy.from_settings({**defaults, **overrides})
+            for host, overrides in settings.items()
+            if isinstance(overrides, dict)
+        }
+        return cls(PoolPolicy.from_settings(defaults), hosts)
+
+    def get(self, host):
+        return self.hosts.get(host, self.default)
+
+
+class PoolStats:
+    """Connection pool counters for each host
+
+    ``requests`` and ``in_use`` / ``peak_in_use`` count connections handed out; ``reused`` those that were
+    already open, and ``connections_opened`` new ones. ``expired`` connections sat idle too long and were
+    closed, ``discarded`` ones didn't fit back into a full pool, and ``waits`` / ``wait_seconds`` count
+    requests that had to wait for a free connection - ``pool_timeouts`` of them in vain.
+    """
+
+    def __init__(self):
+        self.counters = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def add(self, host, **counts):
+        with self._lock:
+            counter = self.counters[host]
+            counter.update(counts)
+            counter["peak_in_use"] = max(counter["peak_in_use"], counter["in_use"])
+
+    def snapshot(self):
+        with self._lock:
+            return {host: dict(counter) for host, counter in self.counters.items()}
+
+
+class ConnectTimer:
+    """Connection mixin that records how long connecting takes - and how much of that is the TLS
+    handshake - on the metrics event of the request that opens the connection. Only connections that
+    open their own socket are timed, so vcr's stubs, which hand connecting to a real connection
+    inside, are left alone"""
+
+    tls = False
+    _socket_seconds = None
+
+    def _new_conn(self):
+        start = time.monotonic()
+        try:
+            return super()._new_conn()
+        finally:
+            self._socket_seconds = time.monotonic() - start
+
+    def connect(self):
+        self._socket_seconds = None
+        start = time.monotonic()
+        super().connect()
+        socket = self._socket_seconds
+        if socket is not None:
+            record(connect=socket, tls=time.monotonic() - start - socket if self.tls else None)
+
+
+@functools.lru_cache(maxsize=64)
+def timed_connection_class(base, tls):
+    """``base``, with its connections timed by ConnectTimer"""
+    return type(f"Timed{base.__name__}", (ConnectTimer, base), {"tls": tls})
+
+
+class PoolMixin:
+    """Counts pool utilization, and closes connections that sat idle past the policy's keepalive_expiry"""
+
+    policy = PoolPolicy()
+    stats = None
+
+    @property
+    def ConnectionCls(self):
+        # Looked up on every new connection rather than fixed on the class, so that vcr's patched
+        # connection classes are still used under test
+        return timed_connection_class(super().ConnectionCls, self.scheme == "https")
+
+    def _new_conn(self):
+        self.stats.add(self.host, connections_opened=1)
+        return super()._new_conn()
+
+    def _get_conn(self, timeout=None):
+        start = time.monotonic()
+        exhausted = self.block and self.pool is not None and self.pool.empty()
+        try:
+            conn = super()._get_conn(timeout=bounded_timeout(self.policy.timeout) if timeout is None else timeout)
+        except EmptyPoolError:
+            self.stats.add(self.host, waits=1, wait_seconds=time.monotonic() - start, pool_timeouts=1)
+            raise
+        idle_since, conn.idle_since = getattr(conn, "idle_since", None), None
+        expired = idle_since is not None and time.monotonic() - idle_since > self.policy.keepalive_expiry
+        if expired:
+            conn.close()
+        self.stats.add(
+            self.host,
+            requests=1,
+            in_use=1,
+            reused=int(idle_since is not None and not expired and getattr(conn, "sock", None) is not None),
+            expired=int(expired),
+            waits=int(exhausted),
+            wait_seconds=time.monotonic() - start if exhausted else 0,
+        )
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn.idle_since = time.monotonic()
+        discarded = conn is not None and self.pool is not None and self.pool.full()
+        self.stats.add(self.host, in_use=-1, discarded=int(discarded))
+        super()._put_conn(conn)
+
+
+class HTTPConnectionPool(PoolMixin, urllib3.HTTPConnectionPool):
+    pass
+
+
+class HTTPSConnectionPool(PoolMixin, urllib3.HTTPSConnectionPool):
+    pass
+
+
+class HostPoolManager(urllib3.PoolManager):
+    """Creates each host's connection pool according to its PoolPolicy"""
+
+    def __init__(self, policies, stats, **kwargs):
+        super().__init__(**kwargs)
+        self.policies = policies
+        self.stats = stats
+        self.pool_classes_by_scheme = {"http": HTTPConnectionPool, "https": HTTPSConnectionPool}
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        policy = self.policies.get(host)
+        request_context = dict(self.connection_pool_kw if request_context is None else request_context)
+        request_context.update(maxsize=policy.size, block=policy.block)
+        pool = super()._new_pool(scheme, host, port, request_context)
+        pool.policy, pool.stats = policy, self.stats
+        return pool
+
+
+class PooledAdapter(HTTPAdapter):
+    """requests' HTTPAdapter, with each host's connection pool set up by its PoolPolicy in
+    ``policies``. Pool utilization is counted in ``stats`` - see ``pool_stats()``"""
+
+    def __init__(self, policies=None, num_pools=32):
+        self.policies = policies or PoolPolicies()
+        self.stats = PoolStats()
+        super().__init__(pool_connections=num_pools)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = HostPoolManager(
+            self.policies, self.stats, num_pools=connections, maxsize=maxsize, block=block, **pool_kwargs
+        )
+
+    def send(self, request, *args, **kwargs):
+        target = redirect_url(request.url)
+        outgoing = request
+        if target is not None:
+            outgoing = request.copy()
+            outgoing.url = target
+        start = time.monotonic()
+        try:
+            response = super().send(outgoing, *args, **kwargs)
+        except EmptyPoolError as e:
+            raise requests.ConnectTimeout(f"Timed out waiting for a free connection: {e}", request=request) from e
+        record(ttfb=time.monotonic() - start)
+        if outgoing is not request:
+            response.url, response.request = request.url, request
+        return response
+
+    def pool_stats(self):
+        return self.stats.snapshot()
+
+
+class RawStream(io.RawIOBase):
+    """The undecoded body of a streamed httpx response, as a file that urllib3 can read from"""
+
+    def __init__(self, response, on_close=None):
+        self.response = response
+        self.chunks = iter(response.stream)
+        self.buffer = b""
+        self.on_close = on_close
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        # urllib3 only translates socket errors, so httpx's are raised as their socket equivalents
+        import httpx
+
+        try:
+            while not self.buffer:
+                self.buffer = next(self.chunks, None)
+                if self.buffer is None:
+                    self.buffer = b""
+                    self.close()
+                    return 0
+        except httpx.TimeoutException as e:
+            raise TimeoutError(str(e)) from e
+        except httpx.TransportError as e:
+            raise OSError(str(e)) from e
+        size = min(len(b), len(self.buffer))
+        b[:size], self.buffer = self.buffer[:size], self.buffer[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.response.close()
+            if self.on_close is not None:
+                self.on_close()
+        super().close()
+
+
+class HTTPXAdapter(HTTPAdapter):
+    """A requests adapter that sends through httpx, over HTTP/2 where the server supports it
+
+    Each host's connections are pooled according to its PoolPolicy in ``policies``. Over HTTP/2 a
+    single connection carries many requests at once, so the pool rarely needs more than one. One
+    httpx client is kept per host and TLS configuration (``verify`` / ``cert``), and sessions that
+    mount the same adapter share them. Proxies are picked up from the environment by httpx, as
+    requests would. ``http1=False`` forces HTTP/2 even over plain http://, for servers that expect
+    it without negotiation.
+    """
+
+    def __init__(self, policies=None, http1=True, http2=True, transport=None):
+        super().__init__(pool_connections=1, pool_maxsize=1)
+        self.policies = policies or PoolPolicies()
+        self.http1 = http1
+        self.http2 = http2
+        self.transport = transport
+        self.stats = PoolStats()
+        self.clients = dict()
+        self._lock = threading.Lock()
+
+    def client(self, host, verify=True, cert=None):
+        import httpx
+
+        key = (host, verify, cert)
+        with self._lock:
+            if key not in self.clients:
+                if self.http2:
+                    optional_import("h2")
+                self.clients[key] = httpx.Client(
+                    http1=self.http1,
+                    http2=self.http2,
+                    verify=verify,
+                    cert=cert,
+                    limits=self.policies.get(host).httpx_limits(),
+                    transport=self.transport,
+                )
+            return self.clients[key]
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        import httpx
+
+        host = urlparse(request.url).hostname
+        client = self.client(host, verify, tuple(cert) if isinstance(cert, list) else cert)
+        body = request.body.encode("utf-8") if isinstance(request.body, str) else request.body
+        extensions = {"timeout": to_httpx_timeout(timeout, pool=self.policies.get(host).timeout).as_dict()}
+        trace = httpx_trace()
+        if trace is not None:
+            extensions["trace"] = trace
+        outgoing = httpx.Request(
+            request.method,
+            redirect_url(request.url) or request.url,
+            headers=[(k, v) for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS],
+            content=body,
+            extensions=extensions,
+        )
+        start = time.monotonic()
+        try:
+            response = client.send(outgoing, stream=True)
+        except httpx.PoolTimeout as e:
+            self.stats.add(host, waits=1, wait_seconds=time.monotonic() - start, pool_timeouts=1)
+            raise requests.ConnectTimeout(f"Timed out waiting for a free connection: {e}", request=request) from e
+        except httpx.ConnectTimeout as e:
+            raise requests.ConnectTimeout(e, request=request) from e
+        except httpx.TimeoutException as e:
+            raise requests.ReadTimeout(e, request=request) from e
+        except httpx.ProxyError as e:
+            raise requests.exceptions.ProxyError(e, request=request) from e
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(e, request=request) from e
+        except httpx.InvalidURL as e:
+            raise requests.exceptions.InvalidURL(e, request=request) from e
+        self.stats.add(host, requests=1, in_use=1)
+
+        raw = HTTPResponse(
+            body=RawStream(response, on_close=lambda: self.stats.add(host, in_use=-1)),
+            headers=HTTPHeaderDict(response.headers.multi_items()),
+            status=response.status_code,
+            version=20 if response.http_version == "HTTP/2" else 11,
+            reason=response.reason_phrase,
+            preload_content=False,
+            decode_content=False,
+            request_method=request.method,
+            request_url=request.url,
+        )
+        return self.build_response(request, raw)
+
+    def pool_stats(self):
+        """PoolStats counters, plus the connections each host has open right now"""
+        stats = self.stats.snapshot()
+        with self._lock:
+            clients = list(self.clients.items())
+        for (host, _, _), client in clients:
+            pool = getattr(client._transport, "_pool", None)
+            if pool is not None:
+                counters = stats.setdefault(host, dict())
+                counters["connections"] = counters.get("connections", 0) + len(pool.connections)
+        return stats
+
+    def close(self):
+        with self._lock:
+            clients, self.clients = list(self.clients.values()), dict()
+        for client in clients:
+            client.close()
+        super().close()
@@ -0,0 +1,259 @@
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import httpx
+import pytest
+import requests
+import vcr
+
+from .cache import PatentClientCache
+from .concurrency import ConcurrencyLimiter
+from .metrics import Metrics
+from .ratelimit import RateLimiter
+from .session import PatentClientSession
+from .transport import HTTPXAdapter
+from .transport import PooledAdapter
+from .transport import PoolPolicies
+from .transport import PoolPolicy
+
+URL = "http://localhost/doc"
+
+
+@pytest.fixture
+def disable_recording():
+    # Everything here talks to local servers, and VCR's stubbed connections never go back to the pool
+    return True
+
+
+def mock_session(handler):
+    session = requests.Session()
+    session.mount("http://localhost", HTTPXAdapter(transport=httpx.MockTransport(handler)))
+    return session
+
+
+def test_response_is_converted():
+    seen = list()
+
+    def handler(request):
+        seen.append(request)
+        body = gzip.compress(b"hello world")
+        return httpx.Response(200, headers={"Content-Encoding": "gzip", "ETag": '"v1"'}, content=body)
+
+    response = mock_session(handler).get(URL, timeout=(3, 7))
+    assert response.status_code == 200
+    assert response.text == "hello world"
+    assert response.headers["ETag"] == '"v1"'
+    assert response.url == URL
+    assert "connection" not in seen[0].headers
+    assert seen[0].extensions["timeout"] == {"connect": 3, "read": 7, "write": 7, "pool": 30}
+
+
+def test_request_body_is_sent():
+    def handler(request):
+        return httpx.Response(200, content=request.read())
+
+    response = mock_session(handler).post(URL, json={"query": "widgets"})
+    assert response.json() == {"query": "widgets"}
+
+
+def test_streamed_response():
+    def handler(request):
+        return httpx.Response(200, content=iter([b"a" * 1000, b"b" * 1000]))
+
+    response = mock_session(handler).get(URL, stream=True)
+    assert b"".join(response.iter_content(100)) == b"a" * 1000 + b"b" * 1000
+
+
+@pytest.mark.parametrize(
+    "error, expected",
+    [
+        (httpx.ConnectError, requests.ConnectionError),
+        (httpx.ConnectTimeout, requests.ConnectTimeout),
+        (httpx.ReadTimeout, requests.ReadTimeout),
+        (httpx.RemoteProtocolError, requests.ConnectionError),
+    ],
+)
+def test_errors_are_translated(error, expected):
+    def handler(request):
+        raise error("boom", request=request)
+
+    with pytest.raises(expected):
+        mock_session(handler).get(URL)
+
+
+def test_responses_are_cached(tmp_path):
+    calls = list()
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(200, headers={"Content-Encoding": "gzip"}, content=gzip.compress(b"cached"))
+
+    session = PatentClientSession()
+    session.cache = PatentClientCache(tmp_path / "cache.sqlite", sweep_interval=0)
+    session.rate_limiter = RateLimiter()
+    session.concurrency_limiter = ConcurrencyLimiter()
+    session.mount("http://localhost", HTTPXAdapter(transport=httpx.MockTransport(handler)))
+    first = session.get(URL)
+    second = session.get(URL)
+    assert len(calls) == 1
+    assert second.from_cache
+    assert first.text == second.text == "cached"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def pooled_session(adapter):
+    session = requests.Session()
+    session.mount("http://", adapter)
+    return session
+
+
+def test_connections_are_reused(server):
+    adapter = HTTPXAdapter(PoolPolicies(PoolPolicy(size=1)))
+    session = pooled_session(adapter)
+    try:
+        assert [session.get(f"{server}/{i}").text for i in range(3)] == ["/0", "/1", "/2"]
+        (client,) = adapter.clients.values()
+        assert len(client._transport._pool.connections) == 1
+        stats = adapter.pool_stats()["127.0.0.1"]
+        assert stats["requests"] == 3
+        assert stats["in_use"] == 0
+        assert stats["connections"] == 1
+    finally:
+        adapter.close()
+
+
+def test_pool_policies_from_settings():
+    policies = PoolPolicies.from_settings(
+        {
+            "POOL_SIZE": "16",
+            "POOL_BLOCK": "true",
+            "POOL_TIMEOUT": "30",
+            "KEEPALIVE_EXPIRY": "30",
+            "HTTP2": False,
+            "ppubs.uspto.gov": {"POOL_SIZE": 4},
+        }
+    )
+    assert policies.get("ops.epo.org").size == 16
+    assert policies.get("ppubs.uspto.gov").size == 4
+    assert policies.get("ppubs.uspto.gov").block is True
+    assert policies.get("ppubs.uspto.gov").httpx_limits().max_connections == 4
+
+
+def test_pooled_adapter_reuses_connections(server):
+    adapter = PooledAdapter(PoolPolicies(PoolPolicy(size=2, block=True)))
+    session = pooled_session(adapter)
+    assert [session.get(f"{server}/{i}").text for i in range(3)] == ["/0", "/1", "/2"]
+    pool = adapter.poolmanager.connection_from_url(server)
+    assert pool.pool.maxsize == 2
+    assert pool.block
+    stats = adapter.pool_stats()["127.0.0.1"]
+    assert stats["requests"] == 3
+    assert stats["connections_opened"] == 1
+    assert stats["reused"] == 2
+    assert stats["in_use"] == 0
+    assert stats["peak_in_use"] == 1
+
+
+def test_idle_connections_expire(server):
+    adapter = PooledAdapter(PoolPolicies(PoolPolicy(keepalive_expiry=0)))
+    session = pooled_session(adapter)
+    session.get(f"{server}/1")
+    session.get(f"{server}/2")
+    stats = adapter.pool_stats()["127.0.0.1"]
+    assert stats["expired"] == 1
+    assert stats["reused"] == 0
+
+
+def test_blocking_pool_times_out(server):
+    adapter = PooledAdapter(PoolPolicies(PoolPolicy(size=1, block=True, timeout=0.1)))
+    session = pooled_session(adapter)
+    held = session.get(f"{server}/held", stream=True)
+    with pytest.raises(requests.ConnectTimeout):
+        session.get(f"{server}/blocked")
+    held.close()
+    assert session.get(f"{server}/free").text == "/free"
+    stats = adapter.pool_stats()["127.0.0.1"]
+    assert stats["waits"] == 1
+    assert stats["pool_timeouts"] == 1
+    assert stats["in_use"] == 0
+
+
+def test_full_pool_discards_extra_connections(server):
+    adapter = PooledAdapter(PoolPolicies(PoolPolicy(size=1, block=False)))
+    session = pooled_session(adapter)
+    responses = [session.get(f"{server}/{i}", stream=True) for i in range(2)]
+    for response in responses:
+        response.content
+    stats = adapter.pool_stats()["127.0.0.1"]
+    assert stats["connections_opened"] == 2
+    assert stats["peak_in_use"] == 2
+    assert stats["discarded"] == 1
+
+
+def test_sessions_share_pools():
+    from .session import http_adapter
+
+    first, second = PatentClientSession(), PatentClientSession()
+    assert first.get_adapter("https://ped.uspto.gov/api") is http_adapter
+    assert second.get_adapter("https://ops.epo.org/3.2") is http_adapter
+    assert isinstance(first.pool_stats, dict)
+
+
+@pytest.mark.parametrize("adapter", [PooledAdapter(PoolPolicies()), HTTPXAdapter(PoolPolicies(), http2=False)])
+def test_connect_and_first_byte_are_timed(server, adapter):
+    session = pooled_session(adapter)
+    metrics = Metrics()
+    events = list()
+    metrics.subscribe(events.append)
+    try:
+        for path in ("/first", "/second"):
+            with metrics.track("GET", server + path):
+                session.get(server + path)
+    finally:
+        adapter.close()
+    first, second = events
+    assert first.connect is not None and first.tls is None
+    assert first.ttfb is not None
+    # The second request reuses the connection
+    assert second.connect is None and second.ttfb is not None
+
+
+def test_recording_and_replaying_through_vcr(server, tmp_path):
+    cassette = tmp_path / "cassette.yaml"
+    url = server.replace("127.0.0.1", "localhost") + "/recorded"
+    for record_mode in ("new_episodes", "none"):
+        adapter = PooledAdapter(PoolPolicies())
+        metrics = Metrics()
+        events = list()
+        metrics.subscribe(events.append)
+        try:
+            with vcr.use_cassette(str(cassette), record_mode=record_mode), metrics.track("GET", url):
+                assert pooled_session(adapter).get(url).text == "/recorded"
+        finally:
+            adapter.close()
+        assert events[0].ttfb is not None
+    assert cassette.exists()
@@ -1,8 +1,31 @@
-from .assignment import Assignment
-from .peds import USApplication
-from .ptab import PtabDecision
-from .ptab import PtabDocument
-from .ptab import PtabProceeding
+import importlib
+
+from patent_client import _setup
+
+# Settings, logging and yankee have to be set up before any schema is built
+_setup()
+
+# Public name -> module it's imported from on first use, so each API only loads when it's used
+LAZY_EXPORTS = {
+    "Assignment": "patent_client.uspto.assignment.model",
+    "USApplication": "patent_client.uspto.peds.model",
+    "PtabDecision": "patent_client.uspto.ptab.model",
+    "PtabDocument": "patent_client.uspto.ptab.model",
+    "PtabProceeding": "patent_client.uspto.ptab.model",
+}
+
+
+def __getattr__(name):
+    if name in LAZY_EXPORTS:
+        value = getattr(importlib.import_module(LAZY_EXPORTS[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted({*globals(), *LAZY_EXPORTS})
+
 
 __all__ = [
     "Assignment",
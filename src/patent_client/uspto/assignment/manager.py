@@ -6,6 +6,7 @@ import warnings
 from collections.abc import Sequence
 
 from patent_client import session
+from patent_client.session import empty_result_check
 from patent_client.util import Manager
 from urllib3.connectionpool import InsecureRequestWarning
 
@@ -16,11 +17,17 @@ warnings.filterwarnings("ignore", category=InsecureRequestWarning)
 
 NUMBER_CLEAN_RE = re.compile(r"[^\d]")
 clean_number = lambda x: NUMBER_CLEAN_RE.sub("", str(x))
+NO_RESULTS_RE = re.compile(r'<result name="response" numFound="0"')
 
 
 logger = logging.getLogger(__name__)
 
 
+@empty_result_check("https://assignment-api.uspto.gov/patent/lookup")
+def assignment_not_found(response):
+    return NO_RESULTS_RE.search(response.text) is not None
+
+
 class AssignmentManager(Manager[Assignment]):
     __schema__ = AssignmentPageSchema()
     fields = {
@@ -92,7 +99,7 @@ class AssignmentManager(Manager[Assignment]):
             "sort": " ".join(sort),
             "facet": False,
         }
-        logger.info(f"Assignment Manager executed query {query}")
+        logger.debug("Assignment Manager executed query %s", query)
         return query
 
     def __len__(self) -> int:
@@ -106,17 +113,18 @@ class AssignmentManager(Manager[Assignment]):
             return limit if limit < max_length else max_length
 
     def get_page(self, page_no):
-        params = self.get_query(page_no)
-        response = session.get(
-            self.url,
-            params=params,
-            verify=False,
-            headers={"Accept": "application/xml"},
-        )
-        text = response.text
-        result = self.__schema__.load(text)
-        self._len = result.num_found
-        return result.docs
+        with self._page(page_no):
+            params = self.get_query(page_no)
+            response = session.get(
+                self.url,
+                params=params,
+                verify=False,
+                headers={"Accept": "application/xml"},
+            )
+            text = response.text
+            result = self._load(text)
+            self._len = result.num_found
+            return result.docs
 
     @property
     def query_fields(self):
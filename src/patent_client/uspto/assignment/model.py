@@ -7,6 +7,7 @@ from dataclasses import field
 from typing import *
 
 from patent_client import session
+from patent_client.tracing import traced
 from patent_client.util import Model
 from patent_client.util.base.related import get_model
 from yankee.data import ListCollection
@@ -43,6 +44,7 @@ class Assignment(Model):
         frame = frame.rjust(4, "0")
         return f"http://legacy-assignments.uspto.gov/assignments/assignment-pat-{reel}-{frame}.pdf"
 
+    @traced("download")
     def download(self):
         """downloads the PDF associated with the assignment to the current working directory"""
         response = session.get(self.image_url, stream=True)
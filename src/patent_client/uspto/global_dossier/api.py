@@ -1,3 +1,5 @@
+from patent_client.tracing import traced
+
 from . import session
 
 
@@ -15,6 +17,7 @@ class GlobalDossierApi:
         response.raise_for_status()
         return response.json()
 
+    @traced("download")
     def get_document(self, country, doc_number, document_id, out_path):
         if out_path.exists():
             return out_path
@@ -1,3 +1,4 @@
+from patent_client.tracing import traced
 from patent_client.util.base.manager import Manager
 
 from .api import GlobalDossierApi
@@ -27,18 +28,20 @@ class GlobalDossierBaseManager(Manager):
 class GlobalDossierManager(GlobalDossierBaseManager):
     __schema__ = GlobalDossierSchema
 
+    @traced("manager.get")
     def get(self, *args, **kwargs):
         data = global_dossier_api.get_file(**query_builder.build_query(*args, **kwargs))
-        return self.__schema__.load(data)
+        return self._load(data)
 
 
 class GlobalDossierApplicationManager(GlobalDossierBaseManager):
     __schema__ = GlobalDossierSchema
 
+    @traced("manager.get")
     def get(self, *args, **kwargs):
         query = query_builder.build_query(*args, **kwargs)
         data = global_dossier_api.get_file(**query)
-        gd_file = self.__schema__.load(data)
+        gd_file = self._load(data)
         if query["type_code"] == "application":
             return next(a for a in gd_file.applications if a.app_num in query["doc_number"])
         elif query["type_code"] == "publication":
@@ -48,6 +51,7 @@ class GlobalDossierApplicationManager(GlobalDossierBaseManager):
 class GlobalDossierDocument(GlobalDossierBaseManager):
     __schema__ = DocumentListSchema
 
+    @traced("manager.get")
     def get(self, country, doc_number, kind_code):
         data = global_dossier_api.get_doc_list(country, doc_number, kind_code)
-        return self.__schema__.load(data)
+        return self._load(data)
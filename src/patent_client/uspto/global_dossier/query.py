@@ -1,6 +1,7 @@
 import csv
 import re
 from collections import defaultdict
+from functools import lru_cache
 from pathlib import Path
 
 
@@ -8,20 +9,31 @@ class QueryException(Exception):
     pass
 
 
+@lru_cache(maxsize=None)
+def load_input_schema():
+    """The number formats of each office and document type, read from gd_input.csv on first use"""
+    input_file = Path(__file__).parent / "gd_input.csv"
+    with input_file.open() as f:
+        input_schema = list(csv.DictReader(f))
+    pattern_index = defaultdict(dict)
+    for row in input_schema:
+        row["pattern"] = re.compile(row["pattern"])
+        pattern_index[row["office_code"]][row["type_code"]] = row["pattern"]
+    return input_schema, pattern_index
+
+
 class QueryBuilder:
     def __init__(self):
-        input_file = Path(__file__).parent / "gd_input.csv"
-        with input_file.open() as f:
-            reader = csv.DictReader(f)
-            self.input_schema = list(reader)
-        for row in self.input_schema:
-            row["pattern"] = re.compile(row["pattern"])
-        self.pattern_index = defaultdict(dict)
-        for row in self.input_schema:
-            self.pattern_index[row["office_code"]][row["type_code"]] = row["pattern"]
-
         self.country_codes = ["US", "CN", "EP", "KR", "JP", "AU"]
 
+    @property
+    def input_schema(self):
+        return load_input_schema()[0]
+
+    @property
+    def pattern_index(self):
+        return load_input_schema()[1]
+
     def validate_query(self, query):
         pattern = self.pattern_index[query["office_code"]][query["type_code"]]
         if not pattern.fullmatch(query["doc_number"]):
@@ -8,8 +8,12 @@ from typing import Iterator
 
 import inflection
 from patent_client import session
+from patent_client.extras import optional_import
+from patent_client.retry import idempotent_post
+from patent_client.session import empty_result_check
+from patent_client.tracing import span
+from patent_client.tracing import traced
 from patent_client.util.base.manager import Manager
-from PyPDF2 import PdfFileMerger
 
 from .model import USApplication
 from .schema import DocumentSchema
@@ -29,6 +33,18 @@ class NotAvailableException(Exception):
 QUERY_FIELDS = "appEarlyPubNumber applId appLocation appType appStatus_txt appConfrNumber appCustNumber appGrpArtNumber appCls appSubCls appEntityStatus_txt patentNumber patentTitle primaryInventor firstNamedApplicant appExamName appExamPrefrdName appAttrDockNumber appPCTNumber appIntlPubNumber wipoEarlyPubNumber pctAppType firstInventorFile appClsSubCls rankAndInventorsList"
 
 
+idempotent_post("https://ped.uspto.gov/api/queries")
+
+
+@empty_result_check("https://ped.uspto.gov/api/queries")
+def peds_not_found(response):
+    data = response.json()
+    if isinstance(data, list):
+        # Document listings for an unknown application come back empty
+        return not data
+    return data["queryResults"]["searchResponse"]["response"]["numFound"] == 0
+
+
 class USApplicationManager(Manager[USApplication]):
     primary_key = "appl_id"
     query_url = "https://ped.uspto.gov/api/queries"
@@ -55,7 +71,7 @@ class USApplicationManager(Manager[USApplication]):
             page_data = self.get_page(page_num)
             for item in page_data["docs"]:
                 if not self.config.limit or counter < self.config.limit:
-                    yield self.__schema__.load(item)
+                    yield self._load(item)
                 counter += 1
             page_num += 1
 
@@ -64,15 +80,16 @@ class USApplicationManager(Manager[USApplication]):
 
     def get_page(self, page_number):
         if page_number not in self.pages:
-            query_params = self.query_params(page_number)
-            response = session.post(self.query_url, json=query_params, timeout=10)
-            if not response.ok:
-                if self.is_online():
-                    raise HttpException(
-                        f"{response.status_code}\n{response.text}\n{response.headers}\n{json.dumps(query_params)}"
-                    )
-            data = response.json()
-            self.pages[page_number] = data["queryResults"]["searchResponse"]["response"]
+            with self._page(page_number):
+                query_params = self.query_params(page_number)
+                response = session.post(self.query_url, json=query_params)
+                if not response.ok:
+                    if self.is_online():
+                        raise HttpException(
+                            f"{response.status_code}\n{response.text}\n{response.headers}\n{json.dumps(query_params)}"
+                        )
+                data = response.json()
+                self.pages[page_number] = data["queryResults"]["searchResponse"]["response"]
         return self.pages[page_number]
 
     def query_params(self, page_no):
@@ -181,8 +198,9 @@ class DocumentManager(Manager):
         url = self.query_url + self.config.filter["appl_id"]
         response = session.get(url)
         for item in response.json():
-            yield self.__schema__.load(item)
+            yield self._load(item)
 
+    @traced("download")
     def download(self, docs, path="."):
         if str(path)[-4:].lower() == ".pdf":
             # If we've been given a specific filename, use it
@@ -197,14 +215,15 @@ class DocumentManager(Manager):
                     if doc.access_level_category == "PUBLIC":
                         files.append((doc.download(tmpdir), doc))
 
-                out_pdf = PdfFileMerger()
-                page = 0
-                for f, doc in files:
-                    bookmark = f"{doc.mail_room_date} - {doc.code} - {doc.description}"
-                    out_pdf.append(str(f), bookmark=bookmark, import_bookmarks=False)
-                    page += doc.page_count
+                with span("pdf.merge", files=len(files)):
+                    out_pdf = optional_import("PyPDF2").PdfFileMerger()
+                    page = 0
+                    for f, doc in files:
+                        bookmark = f"{doc.mail_room_date} - {doc.code} - {doc.description}"
+                        out_pdf.append(str(f), bookmark=bookmark, import_bookmarks=False)
+                        page += doc.page_count
 
-                out_pdf.write(str(out_file))
+                    out_pdf.write(str(out_file))
         except (PermissionError, NotADirectoryError):
             # This is needed due to a bug in Windows that prevents cleanup of the tmpdir
             pass
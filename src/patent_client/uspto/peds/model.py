@@ -10,6 +10,7 @@ from typing import Optional
 
 from dateutil.relativedelta import relativedelta
 from patent_client import session
+from patent_client.tracing import traced
 from patent_client.util import Model
 from patent_client.util.base.related import get_model
 from yankee.data import ListCollection
@@ -440,6 +441,7 @@ class Document(Model):
     def __repr__(self):
         return f"Document(appl_id={self.appl_id}, mail_room_date={self.mail_room_date}, description={self.description})"
 
+    @traced("download")
     def download(self, path=".", include_appl_id=True):
         if str(path)[-4:].lower() == ".pdf":
             # If we've been given a specific filename, use it
@@ -37,7 +37,8 @@ class InventorAddressField(f.Combine):
 
     def combine_func(self, obj):
         return clean_whitespace(
-            f'{obj.street_one or ""}\n{obj.street_two or ""}\n{obj.city or ""}, {obj.geo_code or ""} {obj.postal_code or ""} {obj.country or ""}',
+            f'{obj.get("street_one") or ""}\n{obj.get("street_two") or ""}\n{obj.get("city") or ""}, '
+            f'{obj.get("geo_code") or ""} {obj.get("postal_code") or ""} {obj.get("country") or ""}',
             preserve_newlines=True,
         )
 
@@ -1,10 +1,23 @@
 import json
+from functools import lru_cache
 from pathlib import Path
 
 __api_name__ = "PTAB API v2"
 base_dir = Path(__file__).parent
 schema_path = base_dir / "ptabApiV2.json"
-schema_doc = json.loads(schema_path.read_text())
+
+
+@lru_cache(maxsize=None)
+def load_schema_doc():
+    """The PTAB API's OpenAPI document, parsed on first use"""
+    return json.loads(schema_path.read_text())
+
+
+def __getattr__(name):
+    if name == "schema_doc":
+        return load_schema_doc()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 from .session import PtabSession
 
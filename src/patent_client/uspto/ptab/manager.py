@@ -2,10 +2,11 @@ import math
 from typing import Generic
 
 import inflection
+from patent_client.session import empty_result_check
 from patent_client.util import Manager
 from patent_client.util import ModelType
 
-from . import schema_doc
+from . import load_schema_doc
 from . import session
 from .model import PtabDecision
 from .model import PtabDocument
@@ -16,6 +17,11 @@ from .schema import PtabProceedingSchema
 from .util import peds_to_ptab
 
 
+@empty_result_check("https://developer.uspto.gov/ptab-api")
+def ptab_not_found(response):
+    return response.json()["recordTotalQuantity"] == 0
+
+
 class PtabManager(Manager, Generic[ModelType]):
     url = "https://developer.uspto.gov/ptab-api"
     page_size = 25
@@ -39,16 +45,17 @@ class PtabManager(Manager, Generic[ModelType]):
         for p in range(*page_range):
             for item in self.get_page(p):
                 if item_range[0] <= counter < item_range[1]:
-                    yield self.__schema__.load(item)
+                    yield self._load(item)
                 counter += 1
                 if counter >= max_item:
                     return StopIteration
 
     def get_page(self, page_no):
-        query = self.query()
-        query["recordStartNumber"] = page_no * self.page_size
-        response = session.get(self.url + self.path, params=query)
-        return response.json()["results"]
+        with self._page(page_no):
+            query = self.query()
+            query["recordStartNumber"] = page_no * self.page_size
+            response = session.get(self.url + self.path, params=query)
+            return response.json()["results"]
 
     def __len__(self):
         length = self._len() - self.config.offset
@@ -78,7 +85,7 @@ class PtabManager(Manager, Generic[ModelType]):
         return query
 
     def allowed_filters(self):
-        params = schema_doc["paths"][self.path]["get"]["parameters"]
+        params = load_schema_doc()["paths"][self.path]["get"]["parameters"]
         return {inflection.underscore(p["name"]): p["description"] for p in params}
 
 
@@ -7,6 +7,7 @@ from pathlib import Path
 from typing import *
 
 from patent_client import session
+from patent_client.tracing import traced
 from patent_client.util import Model
 from yankee.data import ListCollection
 
@@ -148,6 +149,7 @@ class PtabDocument(Model):
             proceeding_number=self.proceeding_number
         )
 
+    @traced("download")
     def download(self, path="."):
         name, ext = self.document_name.rsplit(".", 1)
         name = name[:100] + "." + ext
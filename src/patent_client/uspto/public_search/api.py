@@ -1,6 +1,11 @@
+import threading
 import time
 from pathlib import Path
 
+import httpx
+from patent_client.session import is_offline
+from patent_client.tracing import traced
+
 from .session import client
 
 
@@ -17,9 +22,32 @@ def force_list(obj):
 
 
 class PublicSearchApi:
+    """Client for the Public Search (ppubs) API. One instance is shared by every thread, so they
+    also share its ppubs session (``case_id``); ``ensure_session`` and ``renew_session`` make sure
+    only one thread at a time starts a new one"""
+
     def __init__(self):
         self.session = dict()
         self.case_id = None
+        self._session_lock = threading.Lock()
+
+    def ensure_session(self):
+        """Returns the current case id, starting a ppubs session first if there isn't one"""
+        case_id = self.case_id
+        if case_id is None:
+            with self._session_lock:
+                # Another thread may have started a session while we waited for the lock
+                if self.case_id is None:
+                    self.get_session()
+                case_id = self.case_id
+        return case_id
+
+    def renew_session(self, stale=None):
+        """Replace a session that ppubs rejected. If another thread already replaced it, do nothing"""
+        with self._session_lock:
+            if stale is None or self.case_id == stale:
+                self.get_session()
+            return self.case_id
 
     def run_query(
         self,
@@ -32,8 +60,8 @@ class PublicSearchApi:
         expand_plurals=True,
         british_equivalents=True,
     ):
-        if self.case_id is None:
-            self.get_session()
+        # Offline, the cached results don't depend on the case id, so there's no need for a session
+        case_id = self.case_id if is_offline() else self.ensure_session()
         url = "https://ppubs.uspto.gov/dirsearch-public/searches/searchWithBeFamily"
         data = {
             "start": start,
@@ -49,7 +77,7 @@ class PublicSearchApi:
             "queryId": 0,
             "tagDocSearch": False,
             "query": {
-                "caseId": self.case_id,
+                "caseId": case_id,
                 "hl_snippets": "2",
                 "op": default_operator,
                 "q": query,
@@ -69,9 +97,6 @@ class PublicSearchApi:
         for s in force_list(sources):
             data["query"]["databaseFilters"].append({"databaseName": s, "countryCodes": []})
         query_response = client.post(url, json=data)
-        if query_response.status_code in (500, 415):
-            time.sleep(5)
-            query_response = client.post(url, json=data)
         query_response.raise_for_status()
         result = query_response.json()
         if result.get("error", None) is not None:
@@ -93,16 +118,16 @@ class PublicSearchApi:
     def get_session(self):
         url = "https://ppubs.uspto.gov/dirsearch-public/users/me/session"
         response = client.post(url, json=-1)  # json=str(random.randint(10000, 99999)))
-        self.session = response.json()
-        self.case_id = self.session["userCase"]["caseId"]
-        return self.session
+        session = response.json()
+        self.session, self.case_id = session, session["userCase"]["caseId"]
+        return session
 
-    def _request_save(self, obj):
+    def _request_save(self, obj, case_id):
         page_keys = [f"{obj.image_location}/{i:0>8}.tif" for i in range(1, obj.document_structure.page_count + 1)]
         response = client.post(
             "https://ppubs.uspto.gov/dirsearch-public/print/imageviewer",
             json={
-                "caseId": self.case_id,
+                "caseId": case_id,
                 "pageKeys": page_keys,
                 "patentGuid": obj.guid,
                 "saveOrPrint": "save",
@@ -112,17 +137,16 @@ class PublicSearchApi:
         response.raise_for_status()
         return response.text
 
+    @traced("download")
     def download_image(self, obj, path="."):
         out_path = Path(path).expanduser() / f"{obj.guid}.pdf"
         if out_path.exists():
             return out_path
-        if self.case_id is None:
-            self.get_session()
+        case_id = self.ensure_session()
         try:
-            print_job_id = self._request_save(obj)
-        except requests.exceptions.HTTPError:
-            self.get_session()
-            print_job_id = self._request_save(obj)
+            print_job_id = self._request_save(obj, case_id)
+        except httpx.HTTPStatusError:
+            print_job_id = self._request_save(obj, self.renew_session(stale=case_id))
         while True:
             response = client.post(
                 "https://ppubs.uspto.gov/dirsearch-public/print/print-process",
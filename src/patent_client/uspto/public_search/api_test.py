@@ -0,0 +1,55 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from . import api
+from .api import PublicSearchApi
+
+
+class FakeClient:
+    """Starts numbered ppubs sessions, slowly enough for threads to pile up"""
+
+    def __init__(self):
+        self.sessions = 0
+        self.lock = threading.Lock()
+
+    def post(self, url, json=None):
+        time.sleep(0.05)
+        with self.lock:
+            self.sessions += 1
+            case_id = self.sessions
+        return FakeResponse({"userCase": {"caseId": case_id}})
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(api, "client", client)
+    return client
+
+
+def test_one_thread_starts_the_session(client):
+    search = PublicSearchApi()
+    with ThreadPoolExecutor(16) as pool:
+        case_ids = list(pool.map(lambda i: search.ensure_session(), range(16)))
+    assert case_ids == [1] * 16
+    assert client.sessions == 1
+
+
+def test_stale_session_is_renewed_once(client):
+    search = PublicSearchApi()
+    stale = search.ensure_session()
+    with ThreadPoolExecutor(8) as pool:
+        case_ids = list(pool.map(lambda i: search.renew_session(stale=stale), range(8)))
+    assert case_ids == [2] * 8
+    assert client.sessions == 2
@@ -28,14 +28,19 @@ class PublicSearchManager(Manager):
         obj_counter = 0
         try:
             while True:
-                page = public_search_api.run_query(
-                    query=query, start=page_no * self.page_size, limit=self.page_size, sort=order_by, sources=sources
-                )
+                with self._page(page_no):
+                    page = public_search_api.run_query(
+                        query=query,
+                        start=page_no * self.page_size,
+                        limit=self.page_size,
+                        sort=order_by,
+                        sources=sources,
+                    )
                 for obj in page["patents"]:
                     if self.config.limit and obj_counter >= self.config.limit + self.config.offset:
                         raise FinishedException()
                     if obj_counter >= self.config.offset:
-                        yield self.__schema__.load(obj)
+                        yield self._load(obj)
                     obj_counter += 1
                 page_no += 1
                 if len(page["patents"]) < self.page_size:
@@ -88,7 +93,7 @@ class PublicSearchDocumentManager(PublicSearchManager):
 
         for obj in super()._get_results():
             doc = public_search_api.get_document(obj)
-            yield self.__doc_schema__.load(doc)
+            yield self._load(doc, self.__doc_schema__)
 
 
 class PatentBiblioManager(PublicSearchManager):
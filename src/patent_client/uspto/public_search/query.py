@@ -1,6 +1,7 @@
 import csv
 import datetime
 from collections.abc import Sequence
+from functools import lru_cache
 from pathlib import Path
 
 from dateutil.parser import parse as parse_dt
@@ -11,15 +12,31 @@ class QueryException(Exception):
     pass
 
 
+@lru_cache(maxsize=None)
+def load_config():
+    """The searchable, sortable and date fields, read from query_config.csv on first use"""
+    config_file = Path(__file__).parent / "query_config.csv"
+    with config_file.open(encoding="utf-8-sig") as csvfile:
+        config = list(csv.DictReader(csvfile))
+    return {
+        "search_keywords": {r["keyword"]: r["query_field"] for r in config if r["query_field"]},
+        "order_by_keywords": {r["keyword"]: r["order_by_field"] for r in config if r["order_by_field"]},
+        "date_fields": [r["keyword"] for r in config if r["is_date"] == "X"],
+    }
+
+
 class QueryBuilder:
-    def __init__(self):
-        config_file = Path(__file__).parent / "query_config.csv"
-        with config_file.open(encoding="utf-8-sig") as csvfile:
-            reader = csv.DictReader(csvfile)
-            config = list(reader)
-        self.search_keywords = {r["keyword"]: r["query_field"] for r in config if r["query_field"]}
-        self.order_by_keywords = {r["keyword"]: r["order_by_field"] for r in config if r["order_by_field"]}
-        self.date_fields = [r["keyword"] for r in config if r["is_date"] == "X"]
+    @property
+    def search_keywords(self):
+        return load_config()["search_keywords"]
+
+    @property
+    def order_by_keywords(self):
+        return load_config()["order_by_keywords"]
+
+    @property
+    def date_fields(self):
+        return load_config()["date_fields"]
 
     def convert_date(self, date):
         if isinstance(date, str):
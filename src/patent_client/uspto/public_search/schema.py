@@ -2,7 +2,6 @@ import datetime
 import re
 from collections.abc import Sequence
 
-import lxml.html as ETH
 from yankee.json.schema import fields as f
 from yankee.json.schema import RegexSchema
 from yankee.json.schema import Schema
@@ -13,6 +12,9 @@ bad_break_re = re.compile(r"<br />\s+")
 
 
 def html_to_text(html):
+    # lxml.html is only needed to parse full text, so it's imported the first time a document is
+    import lxml.html as ETH
+
     html = newline_re.sub("\n\n", html)
     # html = bad_break_re.sub(" ", html)
     return "".join(ETH.fromstring(html).itertext())
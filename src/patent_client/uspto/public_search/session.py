@@ -1,4 +1,139 @@
+import datetime
+import hashlib
+import json
+import logging
+from importlib.util import find_spec
+
+import requests
+from httpx import BaseTransport
 from httpx import Client
+from httpx import HTTPTransport
+from httpx import Request
+from httpx import Response
+from httpx import Timeout
+from httpx import TransportError
+from patent_client import session as cached_session
+from patent_client.deadlines import remaining
+from patent_client.metrics import httpx_trace
+from patent_client.retry import idempotent_post
+from patent_client.session import CacheMissError
+from patent_client.session import is_offline
+from patent_client.transport import redirect_url
+
+logger = logging.getLogger(__name__)
+
+# Searches and documents are cached. Sessions and print jobs are stateful, so they always go upstream
+CACHED_URLS = (
+    "https://ppubs.uspto.gov/dirsearch-public/searches/",
+    "https://ppubs.uspto.gov/dirsearch-public/patents/",
+)
+idempotent_post("https://ppubs.uspto.gov/dirsearch-public/searches/")
+# The body is stored decoded, so these no longer describe it
+STRIPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+def create_key(request):
+    body = request.read()
+    try:
+        data = json.loads(body)
+    except ValueError:
+        data = body.decode("utf-8", errors="replace")
+    # The case id is minted per session and doesn't change the results
+    if isinstance(data, dict) and isinstance(data.get("query"), dict):
+        data["query"].pop("caseId", None)
+    key = f"{request.method} {request.url} {json.dumps(data, sort_keys=True)}"
+    return "ppubs:" + hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
+def to_requests_response(request, response):
+    """Convert an httpx response into something the requests_cache backend can store"""
+    converted = requests.Response()
+    converted.status_code = response.status_code
+    converted.reason = response.reason_phrase
+    converted.url = str(request.url)
+    converted.headers.update({k: v for k, v in response.headers.items() if k.lower() not in STRIPPED_HEADERS})
+    converted._content = response.content
+    converted.request = requests.Request(
+        request.method, str(request.url), headers=dict(request.headers), data=request.read()
+    ).prepare()
+    return converted
+
+
+def to_httpx_response(request, cached):
+    return Response(
+        status_code=cached.status_code,
+        headers=[(k, v) for k, v in cached.headers.items() if k.lower() not in STRIPPED_HEADERS],
+        content=cached.content,
+        request=request,
+        extensions={"from_cache": True},
+    )
+
+
+class CachedTransport(BaseTransport):
+    """Serves Public Search results from the same response cache the requests-based sessions use"""
+
+    def __init__(self, transport, session):
+        self.transport = transport
+        self.session = session
+
+    def handle_request(self, request):
+        with self.session.metrics.track(request.method, request.url) as event:
+            response, cache = self._handle_request(request)
+            if event is not None:
+                event.record_response(response, cache)
+        return response
+
+    def _handle_request(self, request):
+        if not str(request.url).startswith(CACHED_URLS):
+            if is_offline():
+                raise CacheMissError(f"{request.method} {request.url} is never cached and Patent Client is offline")
+            return self.send(request), "bypass"
+        key = create_key(request)
+        cached = None if self.session._disabled else self.session.cache.get_response(key)
+        if cached is not None and (is_offline() or not cached.is_expired):
+            logger.debug("Serving from cache: %s", request.url)
+            return to_httpx_response(request, cached), "stale" if cached.is_expired else "hit"
+        if is_offline():
+            raise CacheMissError(f"{request.method} {request.url} is not cached and Patent Client is offline")
+        response = self.send(request)
+        if response.status_code == 200 and not self.session._disabled:
+            response.read()
+            expires = datetime.datetime.utcnow() + self.session.expire_after
+            self.session.cache.save_response(to_requests_response(request, response), key, expires)
+        return response, "bypass" if self.session._disabled else "miss"
+
+    def handle_upstream(self, request):
+        # Called once per attempt, so each retry only gets the time that's left before the deadline.
+        # A hedge can run alongside the original attempt, so each one sends a request of its own
+        extensions = dict(request.extensions)
+        left = remaining()
+        if left is not None:
+            left = max(left, 0.001)
+            timeouts = extensions.get("timeout", dict())
+            extensions["timeout"] = {
+                key: left if timeouts.get(key) is None else min(timeouts[key], left)
+                for key in ("connect", "read", "write", "pool")
+            }
+        trace = httpx_trace()
+        if trace is not None:
+            extensions["trace"] = trace
+        url = redirect_url(request.url) or request.url
+        request = Request(request.method, url, headers=request.headers, content=request.read(), extensions=extensions)
+        return self.transport.handle_request(request)
+
+    def send(self, request):
+        # Only searches and documents are hedged - not PDF downloads
+        return self.session.send_upstream(
+            request.method,
+            request.url,
+            self.handle_upstream,
+            request,
+            retry_errors=(TransportError,),
+            hedge=str(request.url).startswith(CACHED_URLS),
+        )
+
+    def close(self):
+        self.transport.close()
 
 
 class PublicSearchClient(Client):
@@ -10,4 +145,13 @@ class PublicSearchClient(Client):
         ] = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36"
 
 
-client = PublicSearchClient(http2=True)
+retry_policy = cached_session.retry_policies.get("ppubs.uspto.gov")
+# HTTP/2 needs the http2 extra (h2) - without it, ppubs is searched over HTTP/1.1
+HTTP2 = find_spec("h2") is not None
+client = PublicSearchClient(
+    timeout=Timeout(retry_policy.read_timeout, connect=retry_policy.connect_timeout),
+    transport=CachedTransport(
+        HTTPTransport(http2=HTTP2, limits=cached_session.pool_policies.get("ppubs.uspto.gov").httpx_limits()),
+        cached_session,
+    ),
+)
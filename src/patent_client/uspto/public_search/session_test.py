@@ -0,0 +1,101 @@
+import sys
+
+import httpx
+import pytest
+
+from patent_client import SETTINGS
+from patent_client.cache import NegativeCache
+from patent_client.cache import PatentClientCache
+from patent_client.circuit import CircuitBreakers
+from patent_client.concurrency import ConcurrencyLimiter
+from patent_client.hedge import Hedger
+from patent_client.metrics import Metrics
+from patent_client.ratelimit import RateLimiter
+from patent_client.retry import RetryPolicies
+from patent_client.retry import RetryPolicy
+from patent_client.session import CacheMissError
+from patent_client.session import PatentClientSession
+from patent_client.session import offline
+
+from .session import CachedTransport
+from .session import PublicSearchClient
+
+SEARCH_URL = "https://ppubs.uspto.gov/dirsearch-public/searches/searchWithBeFamily"
+
+
+@pytest.fixture
+def disable_recording():
+    # Everything here goes to httpx's MockTransport
+    return True
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    # Sessions share their limiters, breakers, policies and metrics, and whatever earlier tests left in
+    # them would carry over - so this one gets its own. So does the offline switch, which lives in the
+    # session module (patent_client.session itself is the default session)
+    session_module = sys.modules[PatentClientSession.__module__]
+    monkeypatch.setattr(session_module, "OFFLINE", False)
+    monkeypatch.setattr(session_module, "_offline_depth", 0)
+    session = PatentClientSession()
+    session.cache = PatentClientCache(tmp_path / "cache.sqlite", sweep_interval=0)
+    session.negative_cache = NegativeCache()
+    session.rate_limiter = RateLimiter()
+    session.concurrency_limiter = ConcurrencyLimiter()
+    session.circuit_breakers = CircuitBreakers()
+    session.retry_policies = RetryPolicies(SETTINGS.RETRY)
+    session.retry_policies.hosts["ppubs.uspto.gov"] = RetryPolicy(backoff=0.01, max_backoff=0.01)
+    session.hedger = Hedger()
+    session.metrics = Metrics()
+    return session
+
+
+def mock_client(session, handler):
+    return PublicSearchClient(transport=CachedTransport(httpx.MockTransport(handler), session))
+
+
+@pytest.fixture
+def requests_seen():
+    return list()
+
+
+@pytest.fixture
+def client(session, requests_seen):
+    def handler(request):
+        requests_seen.append(request)
+        return httpx.Response(200, json={"numFound": 1}, headers={"Content-Encoding": "identity"})
+
+    return mock_client(session, handler)
+
+
+def test_searches_are_cached_regardless_of_case_id(client, requests_seen):
+    first = client.post(SEARCH_URL, json={"query": {"q": "widget", "caseId": 1}})
+    second = client.post(SEARCH_URL, json={"query": {"q": "widget", "caseId": 2}})
+    assert first.json() == second.json() == {"numFound": 1}
+    assert second.extensions.get("from_cache")
+    assert len(requests_seen) == 1
+    client.post(SEARCH_URL, json={"query": {"q": "gadget", "caseId": 2}})
+    assert len(requests_seen) == 2
+
+
+def test_offline(client, requests_seen):
+    client.post(SEARCH_URL, json={"query": {"q": "widget"}})
+    with offline():
+        assert client.post(SEARCH_URL, json={"query": {"q": "widget"}}).json() == {"numFound": 1}
+        with pytest.raises(CacheMissError):
+            client.post(SEARCH_URL, json={"query": {"q": "gadget"}})
+        with pytest.raises(CacheMissError):
+            client.post("https://ppubs.uspto.gov/dirsearch-public/print/print-process", json=[1])
+    assert len(requests_seen) == 1
+
+
+def test_searches_are_retried_but_print_jobs_are_not(session):
+    statuses = [500, 200, 500]
+
+    def handler(request):
+        return httpx.Response(statuses.pop(0), json=[])
+
+    client = mock_client(session, handler)
+    assert client.post(SEARCH_URL, json={"query": {"q": "widget"}}).status_code == 200
+    assert client.post("https://ppubs.uspto.gov/dirsearch-public/print/print-process", json=[1]).status_code == 500
+    assert not statuses
@@ -8,6 +8,11 @@ from typing import Iterator
 from typing import TypeVar
 from typing import Union
 
+from patent_client.deadlines import check_deadline
+from patent_client.profiling import parse_profiler
+from patent_client.tracing import fingerprint
+from patent_client.tracing import span
+from patent_client.tracing import traced_iter
 from yankee.data import Collection
 
 ModelType = TypeVar("ModelType")
@@ -38,6 +43,12 @@ class ManagerConfig:
             and self.annotations == other.annotations
         )
 
+    def fingerprint(self):
+        """Short id of the query this configuration describes"""
+        return fingerprint(
+            list(self.filter.items()), self.order_by, self.options, self.limit, self.offset, self.annotations
+        )
+
 
 class Manager(Collection, Generic[ModelType]):
     """
@@ -60,12 +71,25 @@ class Manager(Collection, Generic[ModelType]):
     # Manager Iteration / Slicing
 
     def __iter__(self) -> Iterator[ModelType]:
-        for item in self._get_results():
+        name = self.__class__.__name__
+        for item in traced_iter("manager.iterate", self._get_results(), manager=name, query=self.config.fingerprint()):
+            check_deadline(f"{name} iteration")
             yield item
 
     def _get_results(self) -> Iterator[ModelType]:
         raise NotImplementedError("Must be implemented by subclass")
 
+    def _load(self, data, schema=None):
+        """Load ``data`` with ``schema`` - by default, the manager's __schema__"""
+        schema = self.__schema__ if schema is None else schema
+        parse_profiler.instrument(schema)
+        with span("schema.load", schema=schema.__class__.__name__):
+            return schema.load(data)
+
+    def _page(self, page):
+        """Span for fetching one page of results"""
+        return span("manager.page", manager=self.__class__.__name__, query=self.config.fingerprint(), page=page)
+
     def __getitem__(self, key: Union[slice, int]) -> Union[Manager[ModelType], ModelType]:
         if isinstance(key, slice):
             if key.step != None:
@@ -133,11 +157,12 @@ class Manager(Collection, Generic[ModelType]):
     def get(self, *args, **kwargs) -> ModelType:
         """If the critera results in a single record, return it, else raise an exception"""
         mger = self.filter(*args, **kwargs)
-        if len(mger) > 1:
-            raise ValueError("More than one document found!")
-        if len(mger) == 0:
-            raise ValueError("No documents found!")
-        return mger[0]  # type: ignore
+        with span("manager.get", manager=self.__class__.__name__, query=mger.config.fingerprint()):
+            if len(mger) > 1:
+                raise ValueError("More than one document found!")
+            if len(mger) == 0:
+                raise ValueError("No documents found!")
+            return mger[0]  # type: ignore
 
     # Basic Manager Fetching
 
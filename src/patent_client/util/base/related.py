@@ -1,6 +1,8 @@
 import importlib
 import logging
 
+from patent_client.tracing import span
+
 from .util import resolve
 
 logger = logging.getLogger(__name__)
@@ -22,7 +24,8 @@ class OneToOne:
         module_name, class_name = self.related_class_name.rsplit(".", 1)
         related_class = getattr(importlib.import_module(module_name), class_name)
         filter_obj = {k: getattr(self, v) for (k, v) in self.mapping.items()}
-        return resolve(related_class.objects.get(**filter_obj), self.attribute)
+        with span("related", model=class_name, filter=filter_obj):
+            return resolve(related_class.objects.get(**filter_obj), self.attribute)
 
 
 class OneToMany:
@@ -46,9 +49,9 @@ def one_to_one(related_class_name, attribute=None, **mapping):
     def get(self):
         klass = getattr(importlib.import_module(module_name), class_name)
         filter_obj = {k: getattr(self, v) for (k, v) in mapping.items()}
-        logger.debug(f"Fetching related {klass} using filter {filter_obj}")
-        result = resolve(klass.objects.get(**filter_obj), attribute)
-        return result
+        logger.debug("Fetching related %s using filter %s", klass, filter_obj)
+        with span("related", model=class_name, filter=filter_obj):
+            return resolve(klass.objects.get(**filter_obj), attribute)
 
     return get
 
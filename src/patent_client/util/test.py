@@ -1,11 +1,24 @@
 import random
 from collections import abc
 
+import requests
 from patent_client.util import Model
 
 random.seed(1)
 
 
+def make_response(status=200, headers=None, url=None, content=b""):
+    """A requests Response built in memory, for tests that don't need a server"""
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or dict())
+    response._content = content
+    if url is not None:
+        response.url = url
+        response.request = requests.Request("GET", url).prepare()
+    return response
+
+
 def compare_lists(list_1, list_2, key=""):
     for i, item in enumerate(list_1):
         if isinstance(item, list) and not isinstance(item, str):